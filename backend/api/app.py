@@ -1,3 +1,4 @@
+import asyncio
 import traceback
 import logging
 from fastapi import FastAPI, HTTPException, Depends, Body
@@ -5,7 +6,7 @@ from fastapi.middleware.cors import CORSMiddleware  # Add this import
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from backend.services.repository_service import repository_service
-from backend.config.settings import get_session, settings
+from backend.config.settings import async_session, get_session, settings
 from backend.db.database import init_db
 from backend.services.elasticsearch.searcher import Searcher
 from backend.config.elasticsearch import get_elasticsearch_client
@@ -14,10 +15,14 @@ from datetime import datetime
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.interval import IntervalTrigger
 from backend.utils.logger import get_logger
-from backend.services.vector_store import VectorStore
 from backend.services.summary_service import summary_service
-from backend.db.database import get_repository_by_owner_and_name, get_commits_by_ids
+from backend.db.database import (
+    get_repository_by_owner_and_name, get_commits_by_ids, record_repository_query, request_repository_summaries,
+    get_llm_usage_rollup, get_recently_queried_repository_ids
+)
 from backend.services.gemini_service import gemini_service
+from backend.services.llm_cache import llm_cache
+from backend.services.llm_usage import llm_usage
 
 logger = get_logger(__name__)
 logger.setLevel(logging.DEBUG)
@@ -45,11 +50,25 @@ app.add_middleware(
 scheduler = AsyncIOScheduler()
 
 
+async def warm_up_vector_store():
+    """Load the vector store and the shards of recently searched repositories off the request path"""
+    try:
+        async with async_session() as session:
+            repo_ids = await get_recently_queried_repository_ids(session, settings.VECTOR_STORE_WARM_UP_SHARDS)
+        start = datetime.now()
+        loaded = await asyncio.to_thread(lambda: summary_service.vector_store.warm_up(repo_ids))
+        log_info("Vector store warmed up with %s shards in %s", loaded, datetime.now() - start)
+    except Exception as e:
+        log_error("Vector store warm-up failed: %s", e)
+
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize the database and services on app startup."""
     
     await init_db()
+    # The app answers requests meanwhile, a search before it finishes loads what it needs itself
+    app.state.vector_store_warm_up = asyncio.create_task(warm_up_vector_store())
     
     if settings.use_scheduler:
         scheduler.add_job(
@@ -60,6 +79,14 @@ async def startup_event():
             replace_existing=True,
             max_instances=1
         )
+        scheduler.add_job(
+            llm_usage.flush,
+            trigger=IntervalTrigger(seconds=settings.LLM_USAGE_FLUSH_INTERVAL_SECONDS),
+            id='llm_usage_flush',
+            name='Store LLM call records',
+            replace_existing=True,
+            max_instances=1
+        )
         
         scheduler.start()
 
@@ -68,6 +95,9 @@ async def shutdown_event():
     """Shut down services when the app stops."""
     if settings.use_scheduler and scheduler.running:
         scheduler.shutdown(wait=False)
+    await llm_usage.flush()
+    if summary_service.vector_store_loaded:
+        summary_service.vector_store.checkpoint()
 
 class RepositoryInit(BaseModel):
     owner: str
@@ -129,6 +159,11 @@ class FAISSSimilarityQuery(BaseModel):
     k: Optional[int] = 5
     owner: str
     name: str
+    # Summarize matching commits that are not in the vector store yet before searching
+    summarize_missing: bool = False
+    # Search breadth overrides for HNSW and IVF-PQ indexes, higher finds more of the true neighbours
+    ef_search: Optional[int] = None
+    nprobe: Optional[int] = None
 
 class FAISSSimilarityResult(BaseModel):
     summary: str
@@ -367,17 +402,25 @@ async def search_faiss_similar(
                 status_code=404,
                 detail=f"Repository {query.owner}/{query.name} not found"
             )
+        await record_repository_query(session, repository)
+        await session.commit()
+
+        if query.summarize_missing:
+            await summary_service.summarize_for_query(repository.id, query.query)
 
         import time
         start = time.time()
-        vector_store = VectorStore()
+        # Waits on the store's init lock while the startup warm-up holds it, so keep it off the event loop
+        vector_store = await asyncio.to_thread(lambda: summary_service.vector_store)
         loaded_in = time.time() - start
             
         start = time.time()
-        results = vector_store.search_similar(
+        results = await vector_store.search_similar(
             query.query, 
             k=query.k,
-            filter={"repo_id": repository.id}
+            filter={"repo_id": repository.id},
+            ef_search=query.ef_search,
+            nprobe=query.nprobe,
         )
         search_time = time.time() - start
         if not results:
@@ -411,6 +454,39 @@ async def search_faiss_similar(
         log_error(f"FAISS search error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/repos/prioritize")
+async def prioritize_repository_summaries(
+    repo_init: RepositoryInit,
+    session: AsyncSession = Depends(get_session)
+):
+    """Summarize the repository's latest commits ahead of the regular backlog for a while."""
+    async with session.begin():
+        repository = await get_repository_by_owner_and_name(session, repo_init.owner, repo_init.repo)
+        if not repository:
+            raise HTTPException(
+                status_code=404,
+                detail=f"Repository {repo_init.owner}/{repo_init.repo} not found"
+            )
+        repository = await request_repository_summaries(session, repository)
+        return {"owner": repository.owner, "name": repository.name, "requested_until": repository.summary_requested_until}
+
+@app.get("/llm/cache/stats")
+async def llm_cache_stats():
+    """Hit/miss counters and size of the persistent LLM response cache."""
+    return llm_cache.stats()
+
+@app.get("/llm/usage")
+async def llm_usage_rollup(
+    group_by: str = "day",
+    since: Optional[datetime] = None,
+    session: AsyncSession = Depends(get_session)
+):
+    """LLM calls, tokens, latency and cost per day or per repository."""
+    if group_by not in ("day", "repository"):
+        raise HTTPException(status_code=400, detail="group_by must be 'day' or 'repository'")
+    await llm_usage.flush()
+    return await get_llm_usage_rollup(session, group_by=group_by, since=since)
+
 @app.get("/repos/list", response_model=List[ListRepositoryResponse])
 async def list_repositories(
     session: AsyncSession = Depends(get_session)
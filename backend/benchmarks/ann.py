@@ -0,0 +1,134 @@
+"""
+Recall, latency and memory of the vector store index types and encodings against exact search.
+
+Vectors are synthetic: points scattered around random cluster centres, which is closer to real
+summary embeddings than uniform noise. Every index is built with the same settings the vector
+store uses (VECTOR_STORE_HNSW_*, VECTOR_STORE_IVF_*, VECTOR_STORE_PQ_*). Compact encodings are
+measured with and without re-ranking the top --rerank candidates on the float32 vectors:
+
+    python -m backend.benchmarks.ann --sizes 10000,100000,1000000 --dimension 256 --ef-search 32,64,128 --nprobe 8,16,64
+"""
+import argparse
+import statistics
+import time
+from dataclasses import dataclass
+from typing import List
+import faiss
+import numpy as np
+from backend.services.vector_index import build_index, search_parameters
+
+
+@dataclass
+class IndexResult:
+    size: int
+    index: str
+    setting: str
+    build_seconds: float
+    bytes_per_vector: float
+    recall: float
+    latencies: List[float]
+
+    def row(self) -> str:
+        latencies = sorted(self.latencies)
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        return (
+            f"{self.size:>9} {self.index:<14} {self.setting:<22} {self.build_seconds:>8.1f}s {self.bytes_per_vector:>8.0f}B "
+            f"{self.recall:>8.3f} {statistics.median(latencies) * 1000:>8.3f}ms {p99 * 1000:>8.3f}ms"
+        )
+
+
+def make_vectors(rng: np.random.Generator, count: int, dimension: int, clusters: int = 256) -> np.ndarray:
+    centres = rng.standard_normal((clusters, dimension), dtype=np.float32)
+    vectors = centres[rng.integers(0, clusters, count)] + 0.5 * rng.standard_normal((count, dimension), dtype=np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def measure(index, data: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int, params=None, rerank: int = 0):
+    latencies, hits = [], 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        _, found = index.search(query.reshape(1, -1), max(k, rerank), params=params)
+        found = found[0][found[0] >= 0]
+        if rerank:
+            # What VectorShard.search does with the full vectors it reads back from disk
+            found = found[np.argsort(((data[found] - query) ** 2).sum(axis=1))]
+        latencies.append(time.perf_counter() - start)
+        hits += len(set(found[:k]) & set(expected))
+    return hits / truth.size, latencies
+
+
+def run_benchmark(
+    sizes: List[int],
+    dimension: int = 256,
+    queries: int = 200,
+    k: int = 10,
+    ef_search: List[int] = (64,),
+    nprobe: List[int] = (16,),
+    encodings: List[str] = ("float32",),
+    rerank: int = 0,
+    seed: int = 0,
+) -> List[IndexResult]:
+    rng = np.random.default_rng(seed)
+    results = []
+    for size in sizes:
+        vectors = make_vectors(rng, size + queries, dimension)
+        data, query_vectors = vectors[:size], vectors[size:]
+
+        start = time.perf_counter()
+        flat = build_index("flat", dimension, data, encoding="float32")
+        flat_build = time.perf_counter() - start
+        _, truth = flat.search(query_vectors, k)
+
+        configurations = [("flat", encoding, [None], "") for encoding in encodings]
+        configurations += [("hnsw", encoding, ef_search, "efSearch") for encoding in encodings]
+        configurations += [("ivfpq", "pq", nprobe, "nprobe")]
+        for kind, encoding, values, name in configurations:
+            if kind == "flat" and encoding == "float32":
+                index, build_seconds = flat, flat_build
+            else:
+                start = time.perf_counter()
+                index = build_index(kind, dimension, data, encoding=encoding)
+                build_seconds = time.perf_counter() - start
+            bytes_per_vector = len(faiss.serialize_index(index)) / size
+            for value in values:
+                params = search_parameters(index, ef_search=value, nprobe=value)
+                setting = f"{name}={value}" if value else "exact scan"
+                for candidates in ([0, rerank] if rerank and encoding != "float32" else [0]):
+                    recall, latencies = measure(index, data, query_vectors, truth, k, params, candidates)
+                    results.append(IndexResult(
+                        size, f"{kind}/{encoding}", setting + (f" rerank={candidates}" if candidates else ""),
+                        build_seconds, bytes_per_vector, recall, latencies,
+                    ))
+            del index
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vector index recall, latency and memory benchmark")
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--dimension", type=int, default=256)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--ef-search", default="32,64,128")
+    parser.add_argument("--nprobe", default="8,16,64")
+    parser.add_argument("--encodings", default="float32,float16,sq8,pq")
+    parser.add_argument("--rerank", type=int, default=50, help="candidates re-ranked for compact encodings, 0 to skip")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(
+        f"{'vectors':>9} {'index':<14} {'setting':<22} {'build':>9} {'memory':>9} "
+        f"{f'recall@{args.k}':>8} {'p50':>10} {'p99':>10}"
+    )
+    for result in run_benchmark(
+        sizes=[int(size) for size in args.sizes.split(",")],
+        dimension=args.dimension,
+        queries=args.queries,
+        k=args.k,
+        ef_search=[int(value) for value in args.ef_search.split(",")],
+        nprobe=[int(value) for value in args.nprobe.split(",")],
+        encodings=args.encodings.split(","),
+        rerank=args.rerank,
+        seed=args.seed,
+    ):
+        print(result.row())
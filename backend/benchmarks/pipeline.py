@@ -0,0 +1,221 @@
+"""
+End-to-end throughput benchmark of the summarization pipeline on the fake LLM and embedding backends.
+
+Runs offline: PR discussions and commits are synthetic, every LLM call goes to FakeBackend and the
+vector store lives in a temporary directory. Latency and failure rate come from the LLM_FAKE_* settings:
+
+    LLM_FAKE_LATENCY_SECONDS=0.2 python -m backend.benchmarks.pipeline --commits 200 --concurrency 8
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+from backend.config.settings import settings
+from backend.models.repository import (
+    Commit, CommitDiff, Issue, IssueComment, PullRequestSummary, ReadmeSummary, Repository, RepositoryLanguage
+)
+
+WORDS = (
+    "fix add remove refactor cache parser token request response handler config retry index query "
+    "summary commit branch merge test docs async worker queue limit timeout schema migration model"
+).split()
+
+
+@dataclass
+class SyntheticCommit:
+    commit: Commit
+    diffs: List[CommitDiff]
+    pr: Optional[Issue]
+
+
+@dataclass
+class BenchmarkResult:
+    commits: int
+    prs: int
+    seconds: float
+    llm_calls: int
+    prompt_tokens: int
+    response_tokens: int
+    commit_latencies: List[float]
+    failed: int
+    embedding_requests: int = 0
+
+    def report(self) -> str:
+        latencies = sorted(self.commit_latencies) or [0.0]
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        return "\n".join([
+            f"commits summarized:   {self.commits - self.failed}/{self.commits} (+{self.prs} PR discussions)",
+            f"wall time:            {self.seconds:.2f}s",
+            f"summaries/min:        {(self.commits - self.failed) / self.seconds * 60:.1f}",
+            f"LLM calls per commit: {self.llm_calls / max(1, self.commits):.2f}",
+            f"tokens per commit:    {(self.prompt_tokens + self.response_tokens) / max(1, self.commits):.0f} "
+            f"({self.prompt_tokens} prompt, {self.response_tokens} response in total)",
+            f"embedding requests:   {self.embedding_requests}",
+            f"commit latency p50:   {statistics.median(latencies):.3f}s",
+            f"commit latency p99:   {p99:.3f}s",
+        ])
+
+
+def _sentence(rng: random.Random, length: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def _diff(rng: random.Random, lines: int) -> str:
+    body = [f"@@ -{i * 10},6 +{i * 10},7 @@" if i % 20 == 0 else f"+    {_sentence(rng, 6)}" for i in range(lines)]
+    return "\n".join(body)
+
+
+def make_repository() -> Tuple[Repository, List[RepositoryLanguage], ReadmeSummary]:
+    repository = Repository(id=1, owner="bench", name="synthetic", gitattributes_content=None)
+    languages = [
+        RepositoryLanguage(language="Python", bytes_count=80_000),
+        RepositoryLanguage(language="TypeScript", bytes_count=20_000),
+    ]
+    readme_summary = ReadmeSummary(repository_id=1, summarization="A synthetic repository used for benchmarking.")
+    return repository, languages, readme_summary
+
+
+def make_prs(rng: random.Random, count: int, comments: int) -> List[Tuple[Issue, List[IssueComment]]]:
+    now = datetime.now(timezone.utc)
+    prs = []
+    for number in range(1, count + 1):
+        issue = Issue(
+            id=number, number=number, repository_id=1, title=_sentence(rng, 5), body=_sentence(rng, 40),
+            state="closed", is_pull_request=True, created_at=now, updated_at=now, author_login="dev", labels="",
+        )
+        issue_comments = [
+            IssueComment(
+                id=number * 1000 + i, issue_id=number, body=_sentence(rng, rng.randint(10, 120)),
+                author_login=f"dev{i % 3}", created_at=now + timedelta(minutes=i),
+            )
+            for i in range(comments)
+        ]
+        prs.append((issue, issue_comments))
+    return prs
+
+
+def make_commits(rng: random.Random, count: int, prs: List[Issue], files: int, lines: int) -> List[SyntheticCommit]:
+    now = datetime.now(timezone.utc)
+    commits = []
+    for commit_id in range(1, count + 1):
+        pr = rng.choice(prs) if prs and rng.random() < 0.5 else None
+        commit = Commit(
+            id=commit_id, github_sha=f"{commit_id:040x}", message=_sentence(rng, 8), repository_id=1,
+            committed_date=now - timedelta(minutes=commit_id), pull_request_number=pr.number if pr else None,
+        )
+        diffs = [
+            CommitDiff(
+                commit_id=commit_id,
+                file_path=f"src/{rng.choice(WORDS)}/{rng.choice(WORDS)}_{i}.py",
+                diff_content=_diff(rng, rng.randint(lines // 2, lines * 2)),
+            )
+            for i in range(rng.randint(1, files))
+        ]
+        commits.append(SyntheticCommit(commit, diffs, pr))
+    return commits
+
+
+async def run_benchmark(
+    commits: int = 100,
+    prs: int = 10,
+    comments_per_pr: int = 30,
+    files_per_commit: int = 6,
+    lines_per_file: int = 80,
+    concurrency: int = 4,
+    seed: int = 0,
+) -> BenchmarkResult:
+    settings.LLM_USE = "fake"
+    settings.LLM_CACHE_ENABLED = False
+    settings.VECTOR_STORE_PATH = os.path.join(tempfile.mkdtemp(prefix="bench_"), "vector_store")
+
+    # Imported after the settings above so the vector store picks up the fake embeddings
+    from backend.services.commit_summarizer import LLMSummarizer
+    from backend.services.llm_usage import usage_target
+    from backend.services.pr_summarizer import PullRequestDiscussionSummarizer
+    from backend.services.vector_store import VectorStore
+
+    rng = random.Random(seed)
+    repository, languages, readme_summary = make_repository()
+    synthetic_prs = make_prs(rng, prs, comments_per_pr)
+    synthetic_commits = make_commits(rng, commits, [issue for issue, _ in synthetic_prs], files_per_commit, lines_per_file)
+    vector_store = VectorStore()
+    embedding_requests = vector_store.batcher.requests
+    semaphore = asyncio.Semaphore(concurrency)
+    start = time.perf_counter()
+
+    async def summarize_pr(issue: Issue, comments: List[IssueComment]) -> Tuple[int, PullRequestSummary]:
+        async with semaphore:
+            summary = await PullRequestDiscussionSummarizer().summarize_pull_request_discussion(
+                issue, comments, languages, readme_summary, repository
+            )
+        return issue.id, PullRequestSummary(issue_id=issue.id, summarization=summary)
+
+    pr_summaries = {}
+    latencies = []
+    failed = 0
+
+    async def summarize_commit(item: SyntheticCommit) -> None:
+        nonlocal failed
+        async with semaphore:
+            commit_start = time.perf_counter()
+            try:
+                summary = await LLMSummarizer().summarize_commit(
+                    item.commit, item.diffs, languages, readme_summary, repository,
+                    pr=item.pr, pr_summary=pr_summaries.get(item.pr.id) if item.pr else None,
+                )
+            except Exception:
+                failed += 1
+                return
+            await vector_store.aadd_summary(summary, {
+                "type": "commit",
+                "commit_id": item.commit.id,
+                "repo_id": repository.id,
+                "date": item.commit.committed_date.isoformat(),
+            })
+            latencies.append(time.perf_counter() - commit_start)
+
+    # Every provider attempt of the run, retries and failed calls included
+    with usage_target("benchmark", 0) as usage:
+        pr_summaries.update(await asyncio.gather(*(summarize_pr(issue, comments) for issue, comments in synthetic_prs)))
+        await asyncio.gather(*(summarize_commit(item) for item in synthetic_commits))
+
+    return BenchmarkResult(
+        commits=commits,
+        prs=prs,
+        seconds=time.perf_counter() - start,
+        llm_calls=usage.calls,
+        prompt_tokens=usage.prompt_tokens,
+        response_tokens=usage.completion_tokens,
+        commit_latencies=latencies,
+        failed=failed,
+        embedding_requests=vector_store.batcher.requests - embedding_requests,
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline summarization pipeline benchmark")
+    parser.add_argument("--commits", type=int, default=100)
+    parser.add_argument("--prs", type=int, default=10)
+    parser.add_argument("--comments-per-pr", type=int, default=30)
+    parser.add_argument("--files-per-commit", type=int, default=6)
+    parser.add_argument("--lines-per-file", type=int, default=80)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    result = asyncio.run(run_benchmark(
+        commits=args.commits,
+        prs=args.prs,
+        comments_per_pr=args.comments_per_pr,
+        files_per_commit=args.files_per_commit,
+        lines_per_file=args.lines_per_file,
+        concurrency=args.concurrency,
+        seed=args.seed,
+    ))
+    print(result.report())
@@ -0,0 +1,74 @@
+"""
+Cold start of the API process: importing the app, opening the vector store and the first searches.
+
+Builds a vector store of synthetic shards in a temporary directory, then measures each step in a
+fresh interpreter so nothing is cached in the process. Searches stop at the commit ids, reading the
+summaries from Postgres is not measured. Runs offline on the fake embeddings:
+
+    python -m backend.benchmarks.startup --shards 20 --vectors-per-shard 20000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import numpy as np
+
+COLD_START = """
+import json, time
+start = time.perf_counter()
+import backend.api.app
+from backend.services.summary_service import summary_service
+imported = time.perf_counter()
+vector_store = summary_service.vector_store
+opened = time.perf_counter()
+vector_store.search("parser cache", k=5, filter={"repo_id": 1})
+first_search = time.perf_counter()
+vector_store.search("parser cache", k=5, filter={"repo_id": 1})
+second_search = time.perf_counter()
+print(json.dumps({
+    "import app": imported - start,
+    "open vector store": opened - imported,
+    "first search (loads the shard)": first_search - opened,
+    "second search": second_search - first_search,
+}))
+"""
+
+
+def build_store(shards: int, vectors_per_shard: int, seed: int = 0) -> None:
+    from backend.services.vector_store import VectorStore
+
+    vector_store = VectorStore()
+    rng = np.random.default_rng(seed)
+    for repo_id in range(1, shards + 1):
+        vectors = rng.standard_normal((vectors_per_shard, vector_store.dimension), dtype=np.float32)
+        commit_ids = list(range((repo_id - 1) * vectors_per_shard, repo_id * vectors_per_shard))
+        shard = vector_store.shard(repo_id)
+        shard.apply(commit_ids, vectors)
+        shard.wait_for_rebuild()
+        shard.checkpoint()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="API cold start benchmark")
+    parser.add_argument("--shards", type=int, default=20)
+    parser.add_argument("--vectors-per-shard", type=int, default=20000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ["LLM_USE"] = "fake"
+    os.environ["VECTOR_STORE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="startup-benchmark-"), "vector_store")
+    # The store is written through the WAL once, fsync would only slow the setup down
+    os.environ["VECTOR_STORE_WAL_FSYNC"] = "false"
+    build_store(args.shards, args.vectors_per_shard)
+
+    runs = [
+        json.loads(subprocess.run(
+            [sys.executable, "-c", COLD_START], capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1])
+        for _ in range(args.runs)
+    ]
+    print(f"{args.shards} shards of {args.vectors_per_shard} vectors, best of {args.runs} cold starts:")
+    for step in runs[0]:
+        print(f"  {step:<32} {min(run[step] for run in runs) * 1000:>9.1f}ms")
@@ -34,6 +34,18 @@ class Settings(BaseSettings):
     # Scheduler settings
     repository_update_interval: int = 5
     use_scheduler: bool = True
+    summary_commits_per_run: int = 5
+    summary_max_concurrent_jobs: int = 4
+    summary_requested_commits_per_run: int = 20
+    summary_requested_commit_window: int = 100
+    summary_request_minutes: int = 60
+    summary_query_half_life_hours: float = 24.0
+    # Unsummarized commits matching a /search/faiss query that are summarized inline
+    summary_on_demand_commits: int = 3
+    summary_on_demand_timeout_seconds: float = 20.0
+    # Re-summarization of summaries made by an older prompt or model, 0 disables it
+    summary_migration_daily_token_budget: int = 1_000_000
+    summary_migration_per_run: int = 10
 
     # Redis settings
     REDIS_HOST: str = "localhost"
@@ -45,7 +57,105 @@ class Settings(BaseSettings):
     LLM_CHUNK_SUMMARIZER: str = "deepseek-r1:14b-qwen-distill-q4_K_M"
     LLM_GEMINI_DIFF_MODEL: str = "gemini-2.0-flash-exp"
     LLM_GEMINI_CHUNK_MODEL: str = "gemini-2.0-flash-exp"
+    LLM_GEMINI_README_MODEL: str = "gemini-2.0-flash-exp"
     LLM_USE: str = "gemini"
+    LLM_MAX_GROUP_TOKENS: int = 8000
+    LLM_DIFF_EXCLUDE_PATTERNS: list[str] = []
+    # Like linguist, .js/.css patches whose changed lines average more than this are minified
+    LLM_DIFF_MINIFIED_AVG_LINE_LENGTH: int = 110
+    LLM_DIFF_MAX_ENTROPY: float = 5.5
+    LLM_CACHE_ENABLED: bool = True
+    LLM_CACHE_PATH: str | None = None
+    LLM_CACHE_TTL_SECONDS: int = 30 * 24 * 60 * 60
+    LLM_CACHE_MAX_SIZE_MB: int = 512
+    LLM_MAX_RETRIES: int = 5
+    LLM_RETRY_BASE_DELAY: float = 1.0
+    LLM_RETRY_MAX_DELAY: float = 60.0
+    LLM_INITIAL_CONCURRENCY: int = 4
+    LLM_MAX_CONCURRENCY: int = 32
+    LLM_BATCH_MODE: bool = False
+    LLM_BATCH_SIZE: int = 200
+    LLM_BATCH_MAX_WAIT_SECONDS: float = 30.0
+    LLM_BATCH_POLL_INTERVAL_SECONDS: float = 30.0
+    LLM_BATCH_BACKFILL_LIMIT: int = 500
+    LLM_BATCH_DIR: str | None = None
+    LLM_PR_TREE_REDUCE: bool = True
+    LLM_PR_REDUCE_FAN_IN: int = 4
+    LLM_PR_MAX_CONCURRENCY: int = 8
+    # Deterministic offline backend selected with LLM_USE=fake, for tests and benchmarks
+    LLM_FAKE_MODEL: str = "fake-llm"
+    LLM_FAKE_LATENCY_SECONDS: float = 0.0
+    LLM_FAKE_FAILURE_RATE: float = 0.0
+    LLM_FAKE_OUTPUT_TOKENS: int = 150
+    LLM_FAKE_SEED: int = 0
+    LLM_FAKE_EMBEDDING_DIM: int = 256
+    LLM_FAKE_EMBEDDING_LATENCY_SECONDS: float = 0.0
+
+    VECTOR_STORE_PATH: str | None = None
+    # Inserts go to a write-ahead log, a shard's index is rewritten after this many inserts or seconds
+    VECTOR_STORE_CHECKPOINT_EVERY: int = 1000
+    VECTOR_STORE_CHECKPOINT_SECONDS: int = 300
+    VECTOR_STORE_WAL_FSYNC: bool = True
+    # Per-repository index shards kept in memory, least recently used ones are dropped first
+    VECTOR_STORE_MAX_LOADED_SHARDS: int = 64
+    # For API workers serving searches while a separate process runs the summary scheduler: shards
+    # are memory-mapped from the latest checkpoint the writer published and never written to
+    VECTOR_STORE_READ_ONLY: bool = False
+    # Shards of the most recently searched repositories loaded in the background at startup
+    VECTOR_STORE_WARM_UP_SHARDS: int = 8
+    # Threads scanning shards in parallel for searches across all repositories
+    VECTOR_STORE_SEARCH_WORKERS: int = 8
+    # flat, hnsw, ivfpq, or auto to pick by shard size: exact search for small shards, HNSW from
+    # VECTOR_STORE_HNSW_MIN_VECTORS and IVF-PQ from VECTOR_STORE_IVFPQ_MIN_VECTORS vectors
+    VECTOR_STORE_INDEX_TYPE: str = "auto"
+    VECTOR_STORE_HNSW_MIN_VECTORS: int = 20_000
+    VECTOR_STORE_IVFPQ_MIN_VECTORS: int = 1_000_000
+    VECTOR_STORE_HNSW_M: int = 32
+    VECTOR_STORE_HNSW_EF_CONSTRUCTION: int = 100
+    # Defaults for searches that do not set ef_search/nprobe themselves
+    VECTOR_STORE_HNSW_EF_SEARCH: int = 64
+    VECTOR_STORE_IVF_NPROBE: int = 16
+    VECTOR_STORE_PQ_SUBQUANTIZERS: int = 64
+    # Replaced documents leave their old vector in the index, rebuild once this share of it is dead
+    VECTOR_STORE_REBUILD_DEAD_FRACTION: float = 0.2
+    VECTOR_STORE_REBUILD_MIN_DEAD: int = 100
+    # How flat and HNSW shards keep vectors in memory: float32, float16, sq8 (8-bit scalar
+    # quantization) or pq. Unless the index is float32 flat or HNSW, the full vectors are kept on disk
+    VECTOR_STORE_ENCODING: str = "float32"
+    # Candidates re-ranked with the full vectors from disk when the encoding is compact, 0 disables it
+    VECTOR_STORE_RERANK_CANDIDATES: int = 50
+    # Shards only store commit ids, this many summaries of recent search hits are kept in memory and
+    # the rest is read from commit_summaries
+    VECTOR_STORE_DOCUMENT_CACHE_SIZE: int = 10_000
+    # Shortened text-embedding-3 vectors (e.g. 1024 instead of 3072), None keeps the full size.
+    # Existing vector store shards have to be re-embedded after changing it
+    EMBEDDING_DIMENSIONS: int | None = None
+    # Embedding requests, sized to the OpenAI limits of 2048 inputs and 300k tokens per request
+    EMBEDDING_BATCH_SIZE: int = 512
+    EMBEDDING_BATCH_MAX_TOKENS: int = 250_000
+    EMBEDDING_BATCH_MAX_WAIT_SECONDS: float = 0.2
+
+    # Provider-side caching of the repository context prompt prefix
+    LLM_GEMINI_CACHE_MIN_TOKENS: int = 1024
+    LLM_GEMINI_CACHE_TTL_SECONDS: int = 3600
+    LLM_OLLAMA_KEEP_ALIVE: str = "30m"
+
+    # USD per million (prompt, completion) tokens, models not listed are treated as free (e.g. local Ollama)
+    LLM_PRICES: dict[str, tuple[float, float]] = {
+        "gemini-2.0-flash-exp": (0.10, 0.40),
+        "gemini-2.0-flash": (0.10, 0.40),
+        "gemini-1.5-pro": (1.25, 5.00),
+    }
+    # Price of prompt tokens read from a provider context cache, relative to the prompt price
+    LLM_CACHED_PROMPT_PRICE_RATIO: float = 0.25
+    LLM_USAGE_FLUSH_INTERVAL_SECONDS: int = 30
+
+    # Used with LLM_USE=routed: providers in order of preference and the largest prompt each one takes
+    LLM_ROUTES: list[str] = ["ollama", "gemini"]
+    LLM_ROUTE_MAX_TOKENS: dict[str, int] = {"ollama": 4000}
+    LLM_ROUTE_LATENCY_SLO_SECONDS: float = 30.0
+    LLM_ROUTE_FAILURE_THRESHOLD: int = 3
+    LLM_ROUTE_COOLDOWN_SECONDS: float = 60.0
 
     OPENAI_API_KEY: str = None
     OPENAI_API_BASE: str = None
@@ -1,13 +1,14 @@
 from typing import Optional, Dict, List
 from sqlalchemy.ext.asyncio import AsyncSession
-from backend.models.repository import Repository, Commit, Issue, IssueComment, CommitDiff, DeletedIssue, RepositoryLanguage, PullRequestSummary
+from backend.models.repository import Repository, Commit, Issue, IssueComment, CommitDiff, DeletedIssue, RepositoryLanguage, PullRequestSummary, LLMCall, CommitSummary
 from backend.models.base import Base
 from sqlalchemy.ext.asyncio import create_async_engine
 from backend.config.settings import settings
 from sqlalchemy import select, func, and_, exists, alias, text
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
+from backend.services.summary_priority import decayed_query_score
 
 # Create SQLAlchemy engine for sync operations (Celery tasks)
 sync_engine = create_engine(
@@ -237,6 +238,70 @@ async def save_pull_request_summary(
     await session.flush()
     return pr_summary
 
+async def record_repository_query(session: AsyncSession, repository: Repository) -> Repository:
+    """Count a search against the repository, used to prioritize its pending summaries."""
+    now = datetime.now(timezone.utc)
+    repository.query_score = decayed_query_score(repository.query_score, repository.last_queried_at, now) + 1
+    repository.last_queried_at = now
+    await session.flush()
+    return repository
+
+async def get_commit_summaries_by_commit_ids(session: AsyncSession, commit_ids: List[int]) -> List[tuple]:
+    """(summary, commit) pairs of the given commits that have a summary, to fill in vector store hits."""
+    if not commit_ids:
+        return []
+    result = await session.execute(
+        select(CommitSummary, Commit)
+        .join(Commit, Commit.id == CommitSummary.commit_id)
+        .where(CommitSummary.commit_id.in_(commit_ids))
+    )
+    return list(result.all())
+
+async def get_recently_queried_repository_ids(session: AsyncSession, limit: int) -> List[int]:
+    """Repositories searched most recently first, to preload their vector store shards."""
+    result = await session.execute(
+        select(Repository.id)
+        .filter(Repository.last_queried_at.isnot(None))
+        .order_by(Repository.last_queried_at.desc())
+        .limit(limit)
+    )
+    return list(result.scalars().all())
+
+async def request_repository_summaries(session: AsyncSession, repository: Repository, minutes: int = None) -> Repository:
+    """Move the repository's latest commits into the requested summary lane for a while."""
+    minutes = minutes or settings.summary_request_minutes
+    repository.summary_requested_until = datetime.now(timezone.utc) + timedelta(minutes=minutes)
+    await session.flush()
+    return repository
+
+async def get_llm_usage_rollup(session: AsyncSession, group_by: str = "day", since: Optional[datetime] = None) -> List[Dict]:
+    """Token, latency and cost totals of LLM calls per day or per repository."""
+    if group_by == "day":
+        key = func.date_trunc("day", LLMCall.created_at)
+    elif group_by == "repository":
+        key = LLMCall.repository_id
+    else:
+        raise ValueError(f"Unsupported grouping: {group_by}")
+
+    query = select(
+        key.label("key"),
+        func.count(LLMCall.id).label("calls"),
+        func.sum(LLMCall.prompt_tokens).label("prompt_tokens"),
+        func.sum(LLMCall.completion_tokens).label("completion_tokens"),
+        func.sum(LLMCall.cached_tokens).label("cached_tokens"),
+        func.sum(LLMCall.cost_usd).label("cost_usd"),
+        func.avg(LLMCall.latency_seconds).label("avg_latency_seconds"),
+        func.sum(LLMCall.retries).label("retries"),
+        func.count(LLMCall.id).filter(LLMCall.cache_hit).label("cache_hits"),
+        func.count(LLMCall.id).filter(LLMCall.failed).label("failed_attempts"),
+        func.count(func.distinct(LLMCall.target_id)).filter(LLMCall.target_type == "commit").label("commits"),
+    ).group_by(key).order_by(key)
+    if since is not None:
+        query = query.filter(LLMCall.created_at >= since)
+
+    result = await session.execute(query)
+    return [dict(row._mapping) for row in result.all()]
+
 async def get_pull_request_summary(
     session: AsyncSession,
     issue_id: int
@@ -1,6 +1,6 @@
 import re
 from datetime import datetime, timezone
-from sqlalchemy import BigInteger, Integer, String, Boolean, DateTime, ForeignKey, Column, Text
+from sqlalchemy import BigInteger, Integer, String, Boolean, DateTime, ForeignKey, Column, Text, Float
 from backend.models.base import Base
 
 
@@ -44,6 +44,11 @@ class Repository(Base):
     is_initialized = Column(Boolean, default=False)
     readme_content = Column(Text, nullable=True)
     readme_path = Column(String, nullable=True)
+    gitattributes_content = Column(Text, nullable=True)
+    # Search traffic (decayed count) and explicit requests drive summary scheduling priority
+    query_score = Column(Float, default=0.0)
+    last_queried_at = Column(DateTime(timezone=True), nullable=True)
+    summary_requested_until = Column(DateTime(timezone=True), nullable=True)
 
     @classmethod
     def from_github_data(cls, data: dict):
@@ -59,7 +64,8 @@ class Repository(Base):
             forks_count=data["forks_count"],
             is_initialized=False,
             readme_content=None,
-            readme_path=None
+            readme_path=None,
+            gitattributes_content=None
         )
 
 class Commit(Base):
@@ -102,6 +108,11 @@ class CommitSummary(Base):
     id = Column(Integer, primary_key=True)
     commit_id = Column(Integer, ForeignKey("commits.id"), unique=True)
     summary = Column(Text, nullable=False)
+    # Set when the pull request summary this summary was built from has changed
+    is_stale = Column(Boolean, default=False, nullable=False)
+    # Hashes of the prompt templates and models that produced the summary
+    prompt_version = Column(String, nullable=True)
+    model_version = Column(String, nullable=True)
 
 class CommitDiff(Base):
     __tablename__ = "commit_diffs"
@@ -187,6 +198,8 @@ class ReadmeSummary(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     repository_id = Column(Integer, ForeignKey("repositories.id"), unique=True)
     summarization = Column(Text)
+    # md5 of the README content that was summarized
+    readme_hash = Column(String, nullable=True)
     updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
 class PullRequestSummary(Base):
@@ -195,8 +208,37 @@ class PullRequestSummary(Base):
     id = Column(Integer, primary_key=True, autoincrement=True)
     issue_id = Column(Integer, ForeignKey("issues.id"), unique=True)
     summarization = Column(Text)
+    # Last comment covered by the summary, newer comments are merged in incrementally
+    last_comment_id = Column(Integer, nullable=True)
+    # Hashes of the prompt templates and models that produced the summary
+    prompt_version = Column(String, nullable=True)
+    model_version = Column(String, nullable=True)
     updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
+class LLMCall(Base):
+    """One generate_content call with its token usage, latency and the summary it served"""
+    __tablename__ = "llm_calls"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    provider = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    prompt_tokens = Column(Integer, nullable=False)
+    completion_tokens = Column(Integer, nullable=False)
+    # Prompt tokens read from the provider's context cache
+    cached_tokens = Column(Integer, default=0, nullable=False)
+    latency_seconds = Column(Float, nullable=False)
+    retries = Column(Integer, default=0, nullable=False)
+    cache_hit = Column(Boolean, default=False, nullable=False)
+    # A provider attempt that raised, retried or failed over
+    failed = Column(Boolean, default=False, nullable=False)
+    cost_usd = Column(Float, default=0.0, nullable=False)
+    # "commit", "pr" or "readme" (with a "_migration" suffix for re-summarization)
+    # and the id of the commit, pull request issue or repository
+    target_type = Column(String, nullable=True)
+    target_id = Column(Integer, nullable=True)
+    repository_id = Column(Integer, ForeignKey("repositories.id", ondelete="SET NULL"), nullable=True, index=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True)
+
 
 if __name__ == "__main__":
     print(_get_pr_number_from_title("mrg (#1) from test/branch"))
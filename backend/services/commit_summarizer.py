@@ -2,14 +2,14 @@ import logging
 from typing import List, Optional
 from dataclasses import dataclass
 from backend.models.repository import CommitDiff, RepositoryLanguage, ReadmeSummary, Repository, Commit, Issue, PullRequestSummary
-from ollama import AsyncClient
 from datetime import datetime
 import re
 import asyncio
 from backend.utils.logger import get_logger
 from backend.config.settings import settings
-from abc import ABC, abstractmethod
-from google import genai
+from backend.services.token_grouping import pack_diffs
+from backend.services.diff_filter import DiffClassifier
+from backend.services.model_backends import ModelBackend, OllamaBackend, GeminiBackend, create_summarizer_backends
 
 logger = get_logger(__name__)
 logger.setLevel(logging.INFO)
@@ -51,87 +51,30 @@ class RepositoryContext:
     def get_description_str(self) -> str:
         return self.readme_summary.summarization if self.readme_summary else "No domain information available"
 
-class ModelBackend(ABC):
-    @abstractmethod
-    async def generate_content(self, system_prompt: str, user_content: str) -> str:
-        pass
-
-class OllamaBackend(ModelBackend):
-    def __init__(self, model_name: str):
-        self.client = AsyncClient()
-        self.model_name = model_name
-
-    async def generate_content(self, system_prompt: str, user_content: str) -> str:
-        response = await self.client.chat(
-            model=self.model_name,
-            messages=[
-                {'role': 'system', 'content': system_prompt},
-                {'role': 'user', 'content': user_content}
-            ]
+    def get_prompt_context(self) -> str:
+        """Repository block shared by every prompt of the repository, sent as a cacheable prompt prefix"""
+        with open('backend/prompts/repository_context.txt', 'r') as f:
+            prompt_template = f.read()
+        return prompt_template.format(
+            repo_name=self.repo_path,
+            languages=self.get_languages_str(),
+            description=self.get_description_str(),
         )
-        return response.message.content
-
-class GeminiBackend(ModelBackend):
-    def __init__(self, model_name: str):
-        self.client = genai.Client(api_key=settings.gemini_api_key)
-        self.model_name = model_name
-
-    async def generate_content(self, system_prompt: str, user_content: str) -> str:
-        combined_prompt = f"{system_prompt}\n\n{user_content}"
-        for _ in range(3):
-            try:
-                response = await self.client.aio.models.generate_content(
-                    model=self.model_name,
-                    contents=combined_prompt
-                )
-                return response.text
-            except:
-                await asyncio.sleep(15)
-        else:
-            raise Exception("Failed to generate content")
 
 class LLMSummarizer:
-    def __init__(self, max_group_size: int = 25000, backend: str = None ):
-        self.max_group_size = max_group_size
+    def __init__(self, max_group_tokens: int = None, backend: str = None, batch: bool = False):
+        self.max_group_tokens = max_group_tokens or settings.LLM_MAX_GROUP_TOKENS
         self.repo_context = None
-        if backend is None:
-            backend = settings.LLM_USE
-        if backend == "ollama":
-            self.diff_backend = OllamaBackend(settings.LLM_DIFF_SUMMARIZER)
-            self.chunk_backend = OllamaBackend(settings.LLM_CHUNK_SUMMARIZER)
-        elif backend == "gemini":
-            self.diff_backend = GeminiBackend(settings.LLM_GEMINI_DIFF_MODEL)
-            self.chunk_backend = GeminiBackend(settings.LLM_GEMINI_CHUNK_MODEL)
-        else:
-            raise ValueError(f"Unsupported backend: {backend}")
+        self.diff_backend, self.chunk_backend = create_summarizer_backends(backend, batch=batch)
 
-    def filter_diffs(self, diffs: List[CommitDiff]) -> List[CommitDiff]:
-        return [diff for diff in diffs if not diff.file_path.endswith('.lock') and diff.diff_content]
+    def filter_diffs(self, diffs: List[CommitDiff], gitattributes: Optional[str] = None) -> List[CommitDiff]:
+        return DiffClassifier(gitattributes=gitattributes).filter(diffs)
 
     def batch_diffs(self, diffs: List[CommitDiff]) -> List[CommitDiffGroup]:
-        groups = []
-        current_group = []
-        current_size = 0
-
-        for diff in diffs:
-            diff_size = len(diff.diff_content)
-            
-            if current_size + diff_size > self.max_group_size and current_group:
-                groups.append(CommitDiffGroup(
-                    commit_diffs=current_group
-                ))
-                current_group = []
-                current_size = 0
-            
-            current_group.append(diff)
-            current_size += diff_size
-
-        if current_group:
-            groups.append(CommitDiffGroup(
-                commit_diffs=current_group
-            ))
-
-        return groups
+        return [
+            CommitDiffGroup(commit_diffs=group)
+            for group in pack_diffs(diffs, self.max_group_tokens, self.diff_backend.count_tokens)
+        ]
 
     def clean_summary(self, summary: str) -> str:
         # Remove content between <think> tags
@@ -145,16 +88,45 @@ class LLMSummarizer:
             prompt_template = f.read()
 
         system_prompt = prompt_template.format(
-            repo_name=self.repo_context.repo_path,
-            languages=self.repo_context.get_languages_str() if self.repo_context else "",
-            description=self.repo_context.get_description_str() if self.repo_context else "",
             commit_message=commit_message,
         )
 
         content = "\n\n".join(d.diff_content for d in diff_group.commit_diffs)
         summary = await self.diff_backend.generate_content(
             system_prompt,
-            f"Summarize these changes {content}"
+            f"Summarize these changes {content}",
+            context=self.repo_context.get_prompt_context(),
+        )
+        return self.clean_summary(summary)
+
+    async def process_single_group(self, diff_group: CommitDiffGroup, commit_message: str, pr: Optional[Issue] = None, pr_summary: Optional[PullRequestSummary] = None) -> str:
+        """Summarize a commit whose diffs fit into one group with a single LLM call"""
+        with open('backend/prompts/single_pass_summarizer.txt', 'r') as f:
+            prompt_template = f.read()
+
+        if pr is None:
+            pr_params = {
+                "pr_title": "No pull request attached",
+                "pr_content": "No message provided",
+                "pr_summary": "No summary provided",
+            }
+        else:
+            pr_params = {
+                "pr_title": pr.title,
+                "pr_content": pr.body or "No message provided",
+                "pr_summary": pr_summary.summarization if pr_summary else "No summary provided",
+            }
+
+        system_prompt = prompt_template.format(
+            commit_message=commit_message,
+            **pr_params,
+        )
+
+        content = "\n\n".join(d.diff_content for d in diff_group.commit_diffs)
+        summary = await self.chunk_backend.generate_content(
+            system_prompt,
+            f"Summarize these changes {content}",
+            context=self.repo_context.get_prompt_context(),
         )
         return self.clean_summary(summary)
 
@@ -173,9 +145,6 @@ class LLMSummarizer:
                 additional_params["pr_summary"] = "No summary provided"
 
         system_prompt = prompt_template.format(
-            repo_name=self.repo_context.repo_path,
-            languages=self.repo_context.get_languages_str() if self.repo_context else "",
-            description=self.repo_context.get_description_str() if self.repo_context else "",
             commit_message=commit_message,
             **additional_params,
         )
@@ -183,7 +152,8 @@ class LLMSummarizer:
         combined_summaries = "\n".join(summaries)
         summary = await self.chunk_backend.generate_content(
             system_prompt,
-            f"Finalize the summary {combined_summaries}"
+            f"Finalize the summary {combined_summaries}",
+            context=self.repo_context.get_prompt_context(),
         )
         return self.clean_summary(summary)
 
@@ -202,8 +172,12 @@ class LLMSummarizer:
         
         self.set_repository_context(languages, readme_summary, repo_path)
         
-        filtered_diffs = self.filter_diffs(diffs)
+        filtered_diffs = self.filter_diffs(diffs, repository.gitattributes_content)
         diff_groups = self.batch_diffs(filtered_diffs)
+
+        if len(diff_groups) == 1:
+            log_info("Processing single diff group of size %d", len(diff_groups[0].commit_diffs))
+            return await self.process_single_group(diff_groups[0], commit.message, pr=pr, pr_summary=pr_summary)
         
         group_summaries = []
         for group in diff_groups:
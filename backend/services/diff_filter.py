@@ -0,0 +1,167 @@
+import math
+import re
+from collections import Counter
+from dataclasses import dataclass
+from fnmatch import fnmatch
+from typing import List, Optional, Tuple
+from backend.config.settings import settings
+from backend.models.repository import CommitDiff
+
+# Path rules in the spirit of github-linguist generated.rb and vendor.yml
+GENERATED_PATTERNS = [
+    # lock files
+    "*.lock", "package-lock.json", "npm-shrinkwrap.json", "pnpm-lock.yaml", "go.sum", "Pipfile.lock",
+    # minified and compiled assets
+    "*.min.js", "*.min.css", "*.js.map", "*.css.map", "*.bundle.js",
+    # protobuf / grpc / thrift output
+    "*_pb2.py", "*_pb2.pyi", "*_pb2_grpc.py", "*.pb.go", "*.pb.cc", "*.pb.h", "*.pb.swift", "*_pb.js", "*_pb.d.ts",
+    # test snapshots
+    "*.snap", "__snapshots__/*", "*/__snapshots__/*",
+    # other generated artifacts
+    "*.designer.cs", "*.g.dart", "*.freezed.dart", "*.pyc",
+]
+
+# Linguist only checks scripts and stylesheets for minification, long lines elsewhere are legitimate
+MINIFIED_EXTENSIONS = (".js", ".mjs", ".cjs", ".css")
+
+VENDORED_DIRECTORIES = [
+    "vendor", "vendors", "third_party", "third-party", "node_modules", "bower_components",
+    "dist", "Pods", "Carthage", ".yarn",
+]
+
+GENERATED_MARKERS = re.compile(
+    r"(Code generated .* DO NOT EDIT|@generated|(auto-?|automatically )generated.*do not (edit|modify)|"
+    r"This file (was|is) (automatically )?generated|Generated by the protocol buffer compiler)",
+    re.IGNORECASE,
+)
+
+# Only look for markers near the top of a patch, like linguist does for file headers
+MARKER_SEARCH_LINES = 15
+
+
+@dataclass
+class DiffClassification:
+    excluded: bool
+    reason: Optional[str] = None
+
+
+def _changed_lines(diff_content: str) -> List[str]:
+    return [
+        line[1:] for line in diff_content.splitlines()
+        if line[:1] in ("+", "-") and not line.startswith(("+++", "---"))
+    ]
+
+
+def shannon_entropy(text: str) -> float:
+    """Bits per character of the text"""
+    if not text:
+        return 0.0
+    counts = Counter(text)
+    total = len(text)
+    return -sum(count / total * math.log2(count / total) for count in counts.values())
+
+
+def parse_gitattributes(content: Optional[str]) -> List[Tuple[str, str, bool]]:
+    """Extract (pattern, attribute, is_set) rules for linguist-generated/linguist-vendored attributes"""
+    rules = []
+    for line in (content or "").splitlines():
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        pattern, *attributes = line.split()
+        for attribute in attributes:
+            name, _, value = attribute.partition("=")
+            if name.lstrip("-!") not in ("linguist-generated", "linguist-vendored"):
+                continue
+            rules.append((pattern, name.lstrip("-!"), not name.startswith(("-", "!")) and value != "false"))
+    return rules
+
+
+def _matches_gitattributes_pattern(path: str, pattern: str) -> bool:
+    if pattern.endswith("/**"):
+        pattern = pattern[:-3] + "/*"
+    if "/" not in pattern.rstrip("/"):
+        return fnmatch(path.rsplit("/", 1)[-1], pattern)
+    return fnmatch(path, pattern.lstrip("/"))
+
+
+class DiffClassifier:
+    """Decides which file diffs are machine generated or vendored and should not reach the LLM"""
+
+    def __init__(
+        self,
+        gitattributes: Optional[str] = None,
+        extra_patterns: Optional[List[str]] = None,
+        minified_avg_line_length: Optional[int] = None,
+        max_entropy: Optional[float] = None,
+        entropy_min_chars: int = 2000,
+    ):
+        self.gitattributes_rules = parse_gitattributes(gitattributes)
+        self.patterns = GENERATED_PATTERNS + list(extra_patterns if extra_patterns is not None else settings.LLM_DIFF_EXCLUDE_PATTERNS)
+        self.minified_avg_line_length = minified_avg_line_length or settings.LLM_DIFF_MINIFIED_AVG_LINE_LENGTH
+        self.max_entropy = max_entropy or settings.LLM_DIFF_MAX_ENTROPY
+        self.entropy_min_chars = entropy_min_chars
+
+    def _gitattributes_verdict(self, path: str) -> Optional[DiffClassification]:
+        """None when .gitattributes says nothing about the path"""
+        attributes = {}
+        # Later lines override earlier ones, same as git
+        for pattern, attribute, is_set in self.gitattributes_rules:
+            if _matches_gitattributes_pattern(path, pattern):
+                attributes[attribute] = is_set
+        if not attributes:
+            return None
+        reason = next((attribute for attribute, is_set in sorted(attributes.items()) if is_set), None)
+        return DiffClassification(excluded=reason is not None, reason=reason)
+
+    def classify(self, diff: CommitDiff) -> DiffClassification:
+        path = diff.file_path
+        verdict = self._gitattributes_verdict(path)
+        if verdict is not None:
+            return verdict
+
+        file_name = path.rsplit("/", 1)[-1]
+        for pattern in self.patterns:
+            if fnmatch(file_name, pattern) or fnmatch(path, pattern):
+                return DiffClassification(excluded=True, reason="generated")
+
+        if any(part in VENDORED_DIRECTORIES for part in path.split("/")[:-1]):
+            return DiffClassification(excluded=True, reason="vendored")
+
+        lines = _changed_lines(diff.diff_content or "")
+        if not lines:
+            return DiffClassification(excluded=False)
+
+        if GENERATED_MARKERS.search("\n".join(lines[:MARKER_SEARCH_LINES])):
+            return DiffClassification(excluded=True, reason="generated")
+
+        if (
+            path.lower().endswith(MINIFIED_EXTENSIONS)
+            and sum(len(line) for line in lines) / len(lines) > self.minified_avg_line_length
+        ):
+            return DiffClassification(excluded=True, reason="minified")
+
+        text = "".join(lines)
+        if len(text) >= self.entropy_min_chars and shannon_entropy(text) > self.max_entropy:
+            return DiffClassification(excluded=True, reason="high-entropy")
+
+        return DiffClassification(excluded=False)
+
+    def filter(self, diffs: List[CommitDiff]) -> List[CommitDiff]:
+        """Drop empty patches and replace excluded files with a one-line stub"""
+        result = []
+        for diff in diffs:
+            if not diff.diff_content:
+                continue
+            classification = self.classify(diff)
+            if not classification.excluded:
+                result.append(diff)
+                continue
+            changed = len(_changed_lines(diff.diff_content))
+            # Transient stub, never added to a session
+            result.append(CommitDiff(
+                commit_id=diff.commit_id,
+                file_path=diff.file_path,
+                diff_content=f"{changed} lines changed in {classification.reason} file {diff.file_path}",
+            ))
+        return result
@@ -0,0 +1,165 @@
+import asyncio
+import hashlib
+import math
+import re
+import time
+from typing import Iterator, List, Optional, Tuple
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+from backend.config.settings import settings
+from backend.services.llm_resilience import ErrorKind, RetryPolicy, classify_error
+from backend.services.token_grouping import estimate_tokens
+from backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Output size of the embedding models, so that nobody has to embed a text just to find out
+MODEL_DIMENSIONS = {
+    "text-embedding-3-large": 3072,
+    "text-embedding-3-small": 1536,
+    "text-embedding-ada-002": 1536,
+}
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Offline embeddings for tests and benchmarks: a hashed bag of words, L2 normalized.
+    Texts sharing words get similar vectors, so similarity search still behaves sensibly.
+    """
+
+    def __init__(self, dimension: int = None, latency: float = None):
+        self.dimension = dimension or settings.LLM_FAKE_EMBEDDING_DIM
+        self.latency = settings.LLM_FAKE_EMBEDDING_LATENCY_SECONDS if latency is None else latency
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimension
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.md5(word.encode()).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.latency:
+            time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def create_embeddings() -> Embeddings:
+    """Embeddings matching the configured LLM provider, the fake provider never touches the network"""
+    if settings.LLM_USE == "fake":
+        return FakeEmbeddings()
+    return OpenAIEmbeddings(
+        model="text-embedding-3-large",
+        api_key=settings.OPENAI_API_KEY,
+        openai_api_base=settings.OPENAI_API_BASE,
+        chunk_size=settings.EMBEDDING_BATCH_SIZE,
+        dimensions=settings.EMBEDDING_DIMENSIONS,
+    )
+
+
+def embedding_dimension(embeddings: Embeddings) -> Optional[int]:
+    """Vector size of the embeddings without a request, None for models missing from MODEL_DIMENSIONS"""
+    if isinstance(embeddings, FakeEmbeddings):
+        return embeddings.dimension
+    if isinstance(embeddings, OpenAIEmbeddings):
+        return embeddings.dimensions or MODEL_DIMENSIONS.get(embeddings.model)
+    return None
+
+
+def split_batches(texts: List[str], batch_size: int = None, max_tokens: int = None) -> Iterator[Tuple[int, int]]:
+    """(start, end) ranges of consecutive texts that fit into one embedding request"""
+    batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+    max_tokens = max_tokens or settings.EMBEDDING_BATCH_MAX_TOKENS
+    start, tokens = 0, 0
+    for i, text in enumerate(texts):
+        text_tokens = estimate_tokens(text)
+        if i > start and (i - start >= batch_size or tokens + text_tokens > max_tokens):
+            yield start, i
+            start, tokens = i, 0
+        tokens += text_tokens
+    if start < len(texts):
+        yield start, len(texts)
+
+
+class EmbeddingBatcher:
+    """
+    Collects texts from concurrent callers and embeds them in requests sized to the provider limits.
+
+    A batch is sent when batch_size texts are pending or max_wait seconds after the first one.
+    Failed requests are retried with backoff. A batch rejected as invalid is split in half until the
+    failing texts are isolated, so one bad input does not fail everybody else's embedding; throttled
+    and transient failures fail the whole batch once the retries are used up.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        batch_size: int = None,
+        max_tokens: int = None,
+        max_wait: float = None,
+        retry_policy: RetryPolicy = None,
+    ):
+        self.embeddings = embeddings
+        self.batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        self.max_tokens = max_tokens or settings.EMBEDDING_BATCH_MAX_TOKENS
+        self.max_wait = settings.EMBEDDING_BATCH_MAX_WAIT_SECONDS if max_wait is None else max_wait
+        self.retry_policy = retry_policy or RetryPolicy.from_settings()
+        self.requests = 0
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer = None
+        self._tasks = set()
+
+    async def embed(self, text: str) -> List[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self.flush)
+        return await future
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        items, self._pending = self._pending, []
+        for start, end in split_batches([text for text, _ in items], self.batch_size, self.max_tokens):
+            task = asyncio.create_task(self._run_batch(items[start:end]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, items: List[Tuple[str, asyncio.Future]]) -> None:
+        try:
+            vectors = await self._embed_with_retry([text for text, _ in items])
+        except Exception as e:
+            # Only a rejected input is worth isolating, splitting during an outage or a throttling
+            # storm would multiply the requests when the provider can least take them
+            if len(items) > 1 and classify_error(e) == ErrorKind.PERMANENT:
+                middle = len(items) // 2
+                await asyncio.gather(self._run_batch(items[:middle]), self._run_batch(items[middle:]))
+                return
+            logger.error(f"Embedding request for {len(items)} texts failed: {e}")
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), vector in zip(items, vectors):
+            if not future.done():
+                future.set_result(vector)
+
+    async def _embed_with_retry(self, texts: List[str]) -> List[List[float]]:
+        for attempt in range(self.retry_policy.max_retries + 1):
+            self.requests += 1
+            try:
+                return await asyncio.to_thread(self.embeddings.embed_documents, texts)
+            except Exception as e:
+                kind = classify_error(e)
+                if kind == ErrorKind.PERMANENT or attempt == self.retry_policy.max_retries:
+                    raise
+                await asyncio.sleep(self.retry_policy.delay(attempt, kind))
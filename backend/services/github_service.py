@@ -1,4 +1,5 @@
 import logging
+from datetime import datetime, timezone
 from typing import Dict, List, Optional
 import httpx
 import time
@@ -58,11 +59,20 @@ class GitHubService:
             params={"page": page, "per_page": per_page, "state": "all"}
         )
 
-    async def get_issue_comments(self, owner: str, repo: str, issue_number: int) -> List[Dict]:
-        """Fetch comments for an issue."""
-        return await self._make_request(
-            f"repos/{owner}/{repo}/issues/{issue_number}/comments"
-        )
+    async def _get_all_pages(self, endpoint: str, params: Optional[Dict] = None, per_page: int = 100) -> List[Dict]:
+        """Fetch every page of a list endpoint, until a page comes back with fewer than per_page items."""
+        items, page = [], 1
+        while True:
+            batch = await self._make_request(endpoint, params={**(params or {}), "page": page, "per_page": per_page})
+            items.extend(batch)
+            if len(batch) < per_page:
+                return items
+            page += 1
+
+    async def get_issue_comments(self, owner: str, repo: str, issue_number: int, since: Optional[datetime] = None) -> List[Dict]:
+        """Fetch all comments for an issue, only those updated at or after `since` when it is given."""
+        params = {"since": since.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")} if since else None
+        return await self._get_all_pages(f"repos/{owner}/{repo}/issues/{issue_number}/comments", params)
         
     async def get_commit(self, owner: str, repo: str, commit_sha: str) -> dict:
         """Fetch detailed information about a specific commit."""
@@ -91,6 +101,15 @@ class GitHubService:
         """Fetch repository languages and their byte counts."""
         return await self._make_request(f"repos/{owner}/{repo}/languages")
 
+    async def get_file_content(self, owner: str, repo: str, path: str) -> Optional[Dict]:
+        """Fetch a file from the default branch, e.g. .gitattributes."""
+        try:
+            return await self._make_request(f"repos/{owner}/{repo}/contents/{path}")
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return None
+            raise
+
     async def get_readme(self, owner: str, repo: str) -> Optional[Dict]:
         """Fetch repository README content."""
         try:
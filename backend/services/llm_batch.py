@@ -0,0 +1,244 @@
+import asyncio
+import json
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from typing import Dict, List, Tuple
+from ollama import AsyncClient
+from google import genai
+from backend.config.settings import settings
+from backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class BatchRequestError(Exception):
+    pass
+
+
+@dataclass
+class BatchRequest:
+    custom_id: str
+    system_prompt: str
+    user_content: str
+
+
+def write_batch_file(path: Path, requests: List[BatchRequest]) -> None:
+    with open(path, "w") as f:
+        for request in requests:
+            f.write(json.dumps(asdict(request)) + "\n")
+
+
+def read_batch_file(path: Path) -> List[BatchRequest]:
+    with open(path, "r") as f:
+        return [BatchRequest(**json.loads(line)) for line in f if line.strip()]
+
+
+class BatchProvider(ABC):
+    """Offline execution of many prompts at once, e.g. a provider batch API"""
+
+    @abstractmethod
+    async def submit(self, requests_path: Path, model_name: str) -> str:
+        """Submit a batch file and return the provider's batch id"""
+
+    @abstractmethod
+    async def is_done(self, batch_id: str) -> bool:
+        pass
+
+    @abstractmethod
+    async def get_results(self, batch_id: str) -> Dict[str, str]:
+        """Map custom_id to the generated text, failed requests are omitted"""
+
+
+class GeminiBatchProvider(BatchProvider):
+    """Gemini API batch mode: upload a JSONL file, create a batch job, download the result file"""
+
+    DONE_STATES = {"JOB_STATE_SUCCEEDED", "JOB_STATE_FAILED", "JOB_STATE_CANCELLED", "JOB_STATE_EXPIRED"}
+
+    def __init__(self):
+        self.client = genai.Client(api_key=settings.gemini_api_key)
+
+    async def submit(self, requests_path: Path, model_name: str) -> str:
+        gemini_path = requests_path.with_suffix(".gemini.jsonl")
+        with open(gemini_path, "w") as f:
+            for request in read_batch_file(requests_path):
+                f.write(json.dumps({
+                    "key": request.custom_id,
+                    "request": {
+                        "contents": [{"role": "user", "parts": [{"text": f"{request.system_prompt}\n\n{request.user_content}"}]}]
+                    },
+                }) + "\n")
+        uploaded = await self.client.aio.files.upload(file=str(gemini_path), config={"mime_type": "jsonl"})
+        job = await self.client.aio.batches.create(model=model_name, src=uploaded.name)
+        return job.name
+
+    async def is_done(self, batch_id: str) -> bool:
+        job = await self.client.aio.batches.get(name=batch_id)
+        return getattr(job.state, "name", str(job.state)) in self.DONE_STATES
+
+    async def get_results(self, batch_id: str) -> Dict[str, str]:
+        job = await self.client.aio.batches.get(name=batch_id)
+        if job.dest is None or not job.dest.file_name:
+            raise BatchRequestError(f"Batch {batch_id} finished without results: {job.state}")
+        content = await asyncio.to_thread(self.client.files.download, file=job.dest.file_name)
+        results = {}
+        for line in content.decode("utf-8").splitlines():
+            if not line.strip():
+                continue
+            item = json.loads(line)
+            try:
+                parts = item["response"]["candidates"][0]["content"]["parts"]
+            except (KeyError, IndexError):
+                logger.error(f"Batch {batch_id} request {item.get('key')} failed: {item.get('error')}")
+                continue
+            results[item["key"]] = "".join(part.get("text", "") for part in parts)
+        return results
+
+
+class OllamaBatchProvider(BatchProvider):
+    """Local batch runner: executes a batch file against Ollama in the background with bounded concurrency"""
+
+    def __init__(self, concurrency: int = None):
+        self.client = AsyncClient()
+        self.concurrency = concurrency or settings.LLM_INITIAL_CONCURRENCY
+        self._jobs: Dict[str, asyncio.Task] = {}
+
+    async def _complete(self, request: BatchRequest, model_name: str) -> str:
+        response = await self.client.chat(
+            model=model_name,
+            messages=[
+                {'role': 'system', 'content': request.system_prompt},
+                {'role': 'user', 'content': request.user_content}
+            ]
+        )
+        return response.message.content
+
+    async def _run(self, requests: List[BatchRequest], model_name: str) -> Dict[str, str]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_one(request: BatchRequest) -> Tuple[str, str]:
+            async with semaphore:
+                return request.custom_id, await self._complete(request, model_name)
+
+        results = {}
+        for outcome in await asyncio.gather(*(run_one(r) for r in requests), return_exceptions=True):
+            if isinstance(outcome, Exception):
+                logger.error(f"Ollama batch request failed: {outcome}")
+                continue
+            results[outcome[0]] = outcome[1]
+        return results
+
+    async def submit(self, requests_path: Path, model_name: str) -> str:
+        batch_id = requests_path.stem
+        self._jobs[batch_id] = asyncio.create_task(self._run(read_batch_file(requests_path), model_name))
+        return batch_id
+
+    async def is_done(self, batch_id: str) -> bool:
+        return self._jobs[batch_id].done()
+
+    async def get_results(self, batch_id: str) -> Dict[str, str]:
+        return await self._jobs.pop(batch_id)
+
+
+class FakeBatchProvider(OllamaBatchProvider):
+    """Runs batch files through the offline FakeBackend, so LLM_BATCH_MODE works with LLM_USE=fake"""
+
+    def __init__(self, concurrency: int = None):
+        self.concurrency = concurrency or settings.LLM_INITIAL_CONCURRENCY
+        self._jobs: Dict[str, asyncio.Task] = {}
+        self._backends = {}
+
+    async def _complete(self, request: BatchRequest, model_name: str) -> str:
+        # model_backends builds on this module
+        from backend.services.model_backends import FakeBackend
+
+        if model_name not in self._backends:
+            self._backends[model_name] = FakeBackend(model_name)
+        return await self._backends[model_name]._generate_content(request.system_prompt, request.user_content)
+
+
+BATCH_PROVIDERS = {
+    "ollama": OllamaBatchProvider,
+    "gemini": GeminiBatchProvider,
+    "fake": FakeBatchProvider,
+}
+
+
+class BatchCollector:
+    """
+    Collects prompts from concurrent callers into batch files and resolves each caller's
+    future once the batch results are written back.
+
+    A batch is submitted when batch_size prompts are pending or max_wait seconds after the first one.
+    """
+
+    def __init__(
+        self,
+        provider: BatchProvider,
+        model_name: str,
+        batch_size: int = None,
+        max_wait: float = None,
+        poll_interval: float = None,
+        batch_dir: str = None,
+    ):
+        self.provider = provider
+        self.model_name = model_name
+        self.batch_size = batch_size or settings.LLM_BATCH_SIZE
+        self.max_wait = max_wait if max_wait is not None else settings.LLM_BATCH_MAX_WAIT_SECONDS
+        self.poll_interval = poll_interval if poll_interval is not None else settings.LLM_BATCH_POLL_INTERVAL_SECONDS
+        self.batch_dir = Path(batch_dir or settings.LLM_BATCH_DIR or Path(__file__).parent.parent.parent / "llm_batches")
+        self._pending: List[Tuple[BatchRequest, asyncio.Future]] = []
+        self._timer = None
+        self._tasks = set()
+
+    async def submit(self, system_prompt: str, user_content: str) -> str:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((BatchRequest(uuid.uuid4().hex, system_prompt, user_content), future))
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self.flush)
+        return await future
+
+    def flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._pending:
+            return
+        items, self._pending = self._pending, []
+        task = asyncio.create_task(self._run_batch(items))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, items: List[Tuple[BatchRequest, asyncio.Future]]) -> None:
+        try:
+            self.batch_dir.mkdir(parents=True, exist_ok=True)
+            requests_path = self.batch_dir / f"{uuid.uuid4().hex}.jsonl"
+            write_batch_file(requests_path, [request for request, _ in items])
+
+            batch_id = await self.provider.submit(requests_path, self.model_name)
+            logger.info(f"Submitted batch {batch_id} with {len(items)} requests to {self.model_name}")
+            while not await self.provider.is_done(batch_id):
+                await asyncio.sleep(self.poll_interval)
+            results = await self.provider.get_results(batch_id)
+
+            with open(requests_path.with_suffix(".results.jsonl"), "w") as f:
+                for custom_id, text in results.items():
+                    f.write(json.dumps({"custom_id": custom_id, "text": text}) + "\n")
+        except Exception as e:
+            logger.error(f"Batch for {self.model_name} failed: {e}")
+            for _, future in items:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for request, future in items:
+            if future.done():
+                continue
+            if request.custom_id in results:
+                future.set_result(results[request.custom_id])
+            else:
+                future.set_exception(BatchRequestError(f"No result for batch request {request.custom_id}"))
@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+from backend.config.settings import settings
+from backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Check the size limit every N writes instead of on every insert
+EVICTION_CHECK_INTERVAL = 100
+# Hits only update accessed_at in memory, written back in one transaction every N hits
+TOUCH_FLUSH_INTERVAL = 100
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Persistent on-disk cache of LLM responses with TTL and size-based (LRU) eviction.
+
+    Several processes share the sqlite file, so any call can wait on a lock: async code goes
+    through aget/aset, which run off the event loop and treat database errors as a miss.
+    """
+
+    def __init__(self, path: str = None, ttl_seconds: int = None, max_size_bytes: int = None):
+        self.path = path or settings.LLM_CACHE_PATH or str(Path(__file__).parent.parent.parent / "llm_cache.sqlite3")
+        self.ttl_seconds = ttl_seconds or settings.LLM_CACHE_TTL_SECONDS
+        self.max_size_bytes = max_size_bytes or settings.LLM_CACHE_MAX_SIZE_MB * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = 0
+        # key -> last hit not yet written to accessed_at
+        self._touched = {}
+        self._conn = None
+        # One connection shared by the worker threads of aget/aset
+        self._lock = threading.RLock()
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        # Connect lazily so importing the module never touches the disk
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_responses (
+                    key TEXT PRIMARY KEY,
+                    response TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+            """)
+            self._conn.execute("CREATE INDEX IF NOT EXISTS ix_llm_responses_accessed_at ON llm_responses (accessed_at)")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def make_key(provider: str, model_name: str, system_prompt: str, user_content: str) -> str:
+        return f"{provider}:{model_name}:{_sha256(system_prompt)}:{_sha256(user_content)}"
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self._touched[key] = now
+            if len(self._touched) >= TOUCH_FLUSH_INTERVAL:
+                self._flush_touches()
+            self.hits += 1
+            return row[0]
+
+    def _flush_touches(self) -> None:
+        touched, self._touched = self._touched, {}
+        self.conn.executemany(
+            "UPDATE llm_responses SET accessed_at = ? WHERE key = ?", [(at, key) for key, at in touched.items()]
+        )
+        self.conn.commit()
+
+    def set(self, key: str, response: str) -> None:
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_responses (key, response, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response.encode("utf-8")), now, now)
+            )
+            self.conn.commit()
+            self._writes += 1
+            if self._writes % EVICTION_CHECK_INTERVAL == 0:
+                self.evict()
+
+    async def aget(self, key: str) -> Optional[str]:
+        """get() off the event loop, a locked or broken database counts as a miss"""
+        try:
+            return await asyncio.to_thread(self.get, key)
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache lookup failed: {e}")
+            self.misses += 1
+            return None
+
+    async def aset(self, key: str, response: str) -> None:
+        """set() off the event loop, a failed write only loses the cache entry"""
+        try:
+            await asyncio.to_thread(self.set, key, response)
+        except sqlite3.Error as e:
+            logger.warning(f"LLM cache write failed: {e}")
+
+    def evict(self) -> int:
+        """Drop expired entries, then least recently used ones until the cache fits into max_size_bytes"""
+        with self._lock:
+            return self._evict()
+
+    def _evict(self) -> int:
+        self._flush_touches()
+        removed = self.conn.execute(
+            "DELETE FROM llm_responses WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+        ).rowcount
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+        if total > self.max_size_bytes:
+            to_free = total - self.max_size_bytes
+            freed = 0
+            keys = []
+            for key, size in self.conn.execute("SELECT key, size FROM llm_responses ORDER BY accessed_at"):
+                if freed >= to_free:
+                    break
+                keys.append((key,))
+                freed += size
+            self.conn.executemany("DELETE FROM llm_responses WHERE key = ?", keys)
+            removed += len(keys)
+        self.conn.commit()
+        self.evictions += removed
+        if removed:
+            logger.info(f"Evicted {removed} LLM cache entries")
+        return removed
+
+    def stats(self) -> dict:
+        entries, size = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_responses"
+        ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "size_bytes": size,
+        }
+
+
+llm_cache = LLMResponseCache()
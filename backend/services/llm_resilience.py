@@ -0,0 +1,150 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass
+from enum import Enum
+from typing import Dict, Optional, Tuple
+from backend.config.settings import settings
+
+
+class ErrorKind(str, Enum):
+    THROTTLED = "throttled"
+    TRANSIENT = "transient"
+    PERMANENT = "permanent"
+
+
+THROTTLING_MARKERS = ("resource_exhausted", "rate limit", "quota", "too many requests")
+
+
+def _status_code(exc: Exception) -> Optional[int]:
+    # ollama.ResponseError and httpx errors expose status_code, google.genai.errors.APIError exposes code
+    for attribute in ("status_code", "code"):
+        value = getattr(exc, attribute, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(exc, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+
+def classify_error(exc: Exception) -> ErrorKind:
+    """Map a provider exception to throttled (429), transient (5xx, network) or permanent (other 4xx)"""
+    status = _status_code(exc)
+    if status == 429 or any(marker in str(exc).lower() for marker in THROTTLING_MARKERS):
+        return ErrorKind.THROTTLED
+    if status is not None and 400 <= status < 500 and status not in (408, 409):
+        return ErrorKind.PERMANENT
+    if isinstance(exc, (ValueError, TypeError, KeyError)):
+        return ErrorKind.PERMANENT
+    return ErrorKind.TRANSIENT
+
+
+@dataclass
+class RetryPolicy:
+    max_retries: int = 5
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+
+    @classmethod
+    def from_settings(cls) -> "RetryPolicy":
+        return cls(
+            max_retries=settings.LLM_MAX_RETRIES,
+            base_delay=settings.LLM_RETRY_BASE_DELAY,
+            max_delay=settings.LLM_RETRY_MAX_DELAY,
+        )
+
+    def delay(self, attempt: int, kind: ErrorKind) -> float:
+        """Exponential backoff with full jitter, throttling starts one step further back"""
+        exponent = attempt + 1 if kind == ErrorKind.THROTTLED else attempt
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** exponent))
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD limit on in-flight requests.
+
+    Every success raises the limit by ~1 per window of requests (additive increase), a throttled
+    response halves it (multiplicative decrease). Throttles from requests that started before the
+    last decrease are ignored, so one burst of 429s only shrinks the window once.
+    """
+
+    def __init__(self, initial_limit: int, min_limit: int = 1, max_limit: int = 64, decrease_factor: float = 0.5):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._epoch = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self) -> int:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+            return self._epoch
+
+    async def release(self, epoch: int, kind: Optional[ErrorKind] = None) -> None:
+        async with self._condition:
+            self.in_flight -= 1
+            if kind is None:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            elif kind == ErrorKind.THROTTLED and epoch == self._epoch:
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                self._epoch += 1
+            self._condition.notify_all()
+
+
+_limiters: Dict[Tuple[str, str], AdaptiveConcurrencyLimiter] = {}
+
+def get_limiter(provider: str, model_name: str) -> AdaptiveConcurrencyLimiter:
+    """One limiter per (provider, model), shared by every backend instance in the process"""
+    key = (provider, model_name)
+    if key not in _limiters:
+        _limiters[key] = AdaptiveConcurrencyLimiter(
+            initial_limit=settings.LLM_INITIAL_CONCURRENCY,
+            max_limit=settings.LLM_MAX_CONCURRENCY,
+        )
+    return _limiters[key]
+
+
+class BackendHealth:
+    """
+    Circuit breaker and latency tracker for one (provider, model).
+
+    After failure_threshold consecutive failures the backend is considered down for cooldown seconds.
+    Latency is an exponentially weighted moving average of successful calls.
+    """
+
+    def __init__(self, failure_threshold: int = 3, cooldown: float = 60.0, smoothing: float = 0.2):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self.consecutive_failures = 0
+        self.open_until = 0.0
+        self.latency: Optional[float] = None
+
+    def is_available(self, now: float = None) -> bool:
+        return (now or time.monotonic()) >= self.open_until
+
+    def record_success(self, latency: float) -> None:
+        self.consecutive_failures = 0
+        self.latency = latency if self.latency is None else self.smoothing * latency + (1 - self.smoothing) * self.latency
+
+    def record_failure(self, now: float = None) -> None:
+        self.consecutive_failures += 1
+        if self.consecutive_failures >= self.failure_threshold:
+            self.open_until = (now or time.monotonic()) + self.cooldown
+            self.consecutive_failures = 0
+
+
+_health: Dict[Tuple[str, str], BackendHealth] = {}
+
+def get_health(provider: str, model_name: str) -> BackendHealth:
+    """One health tracker per (provider, model), shared by every backend instance in the process"""
+    key = (provider, model_name)
+    if key not in _health:
+        _health[key] = BackendHealth(
+            failure_threshold=settings.LLM_ROUTE_FAILURE_THRESHOLD,
+            cooldown=settings.LLM_ROUTE_COOLDOWN_SECONDS,
+        )
+    return _health[key]
@@ -0,0 +1,122 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import List, Optional
+from backend.config.settings import async_session, settings
+from backend.models.repository import LLMCall
+from backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class UsageTarget:
+    target_type: str
+    target_id: int
+    repository_id: Optional[int] = None
+    # Tokens spent on the target so far in this process
+    tokens: int = 0
+    # Provider attempts, failed ones included, and their tokens; cache hits are not counted
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+@dataclass
+class TokenUsage:
+    """Billed tokens of one provider response"""
+    prompt_tokens: int
+    completion_tokens: int
+    # Part of prompt_tokens served from the provider's context cache at a discount
+    cached_tokens: int = 0
+
+
+# The summary the current task is working on, inherited by every asyncio task it starts
+_current_target: ContextVar[Optional[UsageTarget]] = ContextVar("llm_usage_target", default=None)
+
+
+@contextmanager
+def usage_target(target_type: str, target_id: int, repository_id: int = None):
+    """Attribute LLM calls made inside the block to a commit, pull request or README summary"""
+    target = UsageTarget(target_type, target_id, repository_id)
+    token = _current_target.set(target)
+    try:
+        yield target
+    finally:
+        _current_target.reset(token)
+
+
+def call_cost(model: str, prompt_tokens: int, completion_tokens: int, cached_tokens: int = 0) -> float:
+    prompt_price, completion_price = settings.LLM_PRICES.get(model, (0.0, 0.0))
+    prompt_cost = (prompt_tokens - cached_tokens + cached_tokens * settings.LLM_CACHED_PROMPT_PRICE_RATIO) * prompt_price
+    return (prompt_cost + completion_tokens * completion_price) / 1_000_000
+
+
+class LLMUsageRecorder:
+    """
+    Buffers one LLMCall row per generate_content call, plus one per failed provider attempt, and writes
+    them in bulk, so accounting never adds a database round trip to an LLM call.
+    """
+
+    def __init__(self, max_buffer: int = 10_000):
+        self.max_buffer = max_buffer
+        self._buffer: List[LLMCall] = []
+
+    def record(
+        self,
+        provider: str,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        latency_seconds: float,
+        retries: int = 0,
+        cache_hit: bool = False,
+        cached_tokens: int = 0,
+        failed: bool = False,
+    ) -> LLMCall:
+        target = _current_target.get()
+        if target is not None:
+            target.tokens += prompt_tokens + completion_tokens
+            if not cache_hit:
+                target.calls += 1
+                target.prompt_tokens += prompt_tokens
+                target.completion_tokens += completion_tokens
+        call = LLMCall(
+            provider=provider,
+            model=model,
+            prompt_tokens=prompt_tokens,
+            completion_tokens=completion_tokens,
+            cached_tokens=cached_tokens,
+            latency_seconds=latency_seconds,
+            retries=retries,
+            cache_hit=cache_hit,
+            failed=failed,
+            cost_usd=0.0 if cache_hit else call_cost(model, prompt_tokens, completion_tokens, cached_tokens),
+            target_type=target.target_type if target else None,
+            target_id=target.target_id if target else None,
+            repository_id=target.repository_id if target else None,
+            created_at=datetime.now(timezone.utc),
+        )
+        if len(self._buffer) >= self.max_buffer:
+            # The database is unreachable for a long time, keep the newest records
+            self._buffer.pop(0)
+        self._buffer.append(call)
+        return call
+
+    async def flush(self) -> int:
+        if not self._buffer:
+            return 0
+        calls, self._buffer = self._buffer, []
+        try:
+            async with async_session() as session:
+                async with session.begin():
+                    session.add_all(calls)
+        except Exception as e:
+            logger.error(f"Failed to store {len(calls)} LLM call records: {e}")
+            self._buffer = (calls + self._buffer)[-self.max_buffer:]
+            return 0
+        return len(calls)
+
+
+llm_usage = LLMUsageRecorder()
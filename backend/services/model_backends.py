@@ -0,0 +1,418 @@
+import asyncio
+import hashlib
+import random
+import time
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Tuple, Union
+from ollama import AsyncClient
+from google import genai
+from google.genai import types
+from backend.config.settings import settings
+from backend.services.token_grouping import estimate_tokens
+from backend.services.llm_cache import LLMResponseCache, llm_cache
+from backend.services.llm_batch import BATCH_PROVIDERS, BatchCollector
+from backend.services.llm_resilience import (
+    AdaptiveConcurrencyLimiter, BackendHealth, ErrorKind, RetryPolicy, classify_error, get_health, get_limiter
+)
+from backend.services.llm_usage import TokenUsage, llm_usage
+from backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ModelBackend(ABC):
+    provider: str = "base"
+    model_name: str = ""
+    cache: Optional[LLMResponseCache] = None
+    limiter: Optional[AdaptiveConcurrencyLimiter] = None
+    retry_policy: Optional[RetryPolicy] = None
+    # Backends that can cache the shared context prefix on the provider side take it separately,
+    # for the others it is prepended to the system prompt
+    supports_context: bool = False
+
+    async def generate_content(self, system_prompt: str, user_content: str, context: Optional[str] = None) -> str:
+        """
+        Generate a response. `context` is a prompt prefix shared by many calls (e.g. the repository block),
+        which backends supporting it send once and reference afterwards.
+        """
+        start = time.perf_counter()
+        full_system_prompt = f"{context}\n\n{system_prompt}" if context else system_prompt
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(self.provider, self.model_name, full_system_prompt, user_content)
+            cached = await self.cache.aget(key)
+            if cached is not None:
+                self._record_usage(full_system_prompt, user_content, cached, start, cache_hit=True)
+                return cached
+
+        if self.supports_context:
+            response, usage, retries = await self._call_provider(system_prompt, user_content, context=context)
+        else:
+            response, usage, retries = await self._call_provider(full_system_prompt, user_content)
+        if key is not None:
+            await self.cache.aset(key, response)
+        self._record_usage(full_system_prompt, user_content, response, start, retries=retries, usage=usage)
+        return response
+
+    def _record_usage(
+        self, system_prompt: str, user_content: str, response: str, start: float, retries: int = 0,
+        cache_hit: bool = False, usage: Optional[TokenUsage] = None, failed: bool = False,
+    ) -> None:
+        # Provider reported usage when there is one, the tokenizer estimate otherwise
+        if usage is None:
+            usage = TokenUsage(
+                self.count_tokens(system_prompt) + self.count_tokens(user_content),
+                self.count_tokens(response) if response else 0,
+            )
+        llm_usage.record(
+            provider=self.provider,
+            model=self.model_name,
+            prompt_tokens=usage.prompt_tokens,
+            completion_tokens=usage.completion_tokens,
+            cached_tokens=usage.cached_tokens,
+            latency_seconds=time.perf_counter() - start,
+            retries=retries,
+            cache_hit=cache_hit,
+            failed=failed,
+        )
+
+    async def _call_provider(self, system_prompt: str, user_content: str, **kwargs) -> Tuple[str, Optional[TokenUsage], int]:
+        """
+        Call the provider under the concurrency limit, retrying throttled and transient errors.
+        Returns the response, its reported token usage if any and the number of retries it took.
+        Failed attempts are recorded on their own.
+        """
+        max_retries = self.retry_policy.max_retries if self.retry_policy else 0
+        for attempt in range(max_retries + 1):
+            epoch = await self.limiter.acquire() if self.limiter else None
+            start = time.perf_counter()
+            # Calls cancelled in flight release their slot without moving the limit either way
+            kind = ErrorKind.TRANSIENT
+            try:
+                response = await self._generate_content(system_prompt, user_content, **kwargs)
+                kind = None
+            except Exception as e:
+                kind = classify_error(e)
+                self._record_failed_attempt(system_prompt, user_content, kwargs.get("context"), kind, start)
+                if kind == ErrorKind.PERMANENT or attempt == max_retries:
+                    raise
+                delay = self.retry_policy.delay(attempt, kind)
+                logger.warning(f"{self.provider}/{self.model_name} {kind.value} error: {e}, retrying in {delay:.1f}s")
+            else:
+                if isinstance(response, tuple):
+                    return response[0], response[1], attempt
+                return response, None, attempt
+            finally:
+                if self.limiter:
+                    await self.limiter.release(epoch, kind)
+            await asyncio.sleep(delay)
+
+    def _record_failed_attempt(self, system_prompt: str, user_content: str, context: Optional[str], kind: ErrorKind, start: float) -> None:
+        """
+        Throttled and rejected requests are not billed. A timeout or server error may come after the
+        provider processed the prompt, so its estimated prompt tokens are counted.
+        """
+        usage = TokenUsage(0, 0)
+        if kind == ErrorKind.TRANSIENT:
+            prompt = f"{context}\n\n{system_prompt}" if context else system_prompt
+            usage = TokenUsage(self.count_tokens(prompt) + self.count_tokens(user_content), 0)
+        self._record_usage(system_prompt, user_content, "", start, usage=usage, failed=True)
+
+    @abstractmethod
+    async def _generate_content(self, system_prompt: str, user_content: str) -> Union[str, Tuple[str, TokenUsage]]:
+        """The response text, together with the billed tokens when the provider reports them"""
+        pass
+
+    def count_tokens(self, text: str) -> int:
+        """Estimate prompt tokens, override in backends with a model specific tokenizer"""
+        return estimate_tokens(text)
+
+class OllamaBackend(ModelBackend):
+    provider = "ollama"
+    supports_context = True
+
+    def __init__(self, model_name: str):
+        self.client = AsyncClient()
+        self.model_name = model_name
+
+    async def _generate_content(self, system_prompt: str, user_content: str, context: Optional[str] = None) -> str:
+        # The context goes first as its own message, so consecutive prompts of a repository share a
+        # token prefix and Ollama reuses its KV cache while keep_alive holds the model in memory
+        messages = [{'role': 'system', 'content': context}] if context else []
+        response = await self.client.chat(
+            model=self.model_name,
+            messages=messages + [
+                {'role': 'system', 'content': system_prompt},
+                {'role': 'user', 'content': user_content}
+            ],
+            keep_alive=settings.LLM_OLLAMA_KEEP_ALIVE,
+        )
+        # prompt_eval_count only covers the prompt tokens not reused from the KV cache
+        usage = TokenUsage(response.prompt_eval_count or 0, response.eval_count or 0)
+        return response.message.content, usage
+
+class GeminiBackend(ModelBackend):
+    provider = "gemini"
+    supports_context = True
+    # (model, context hash) -> (cached content name, expiry), shared by all instances
+    _context_caches: Dict[Tuple[str, str], Tuple[Optional[str], float]] = {}
+    # Creations in flight, concurrent calls with the same context wait for one instead of each paying for a cache
+    _context_cache_jobs: Dict[Tuple[str, str], asyncio.Future] = {}
+
+    def __init__(self, model_name: str):
+        self.client = genai.Client(api_key=settings.gemini_api_key)
+        self.model_name = model_name
+
+    async def _get_cached_context(self, context: str) -> Optional[str]:
+        """
+        Name of a Gemini cached content holding the context, created on first use. Contexts below the
+        provider's minimum cache size are not cached explicitly and are sent inline as a stable prefix.
+        """
+        if self.count_tokens(context) < settings.LLM_GEMINI_CACHE_MIN_TOKENS:
+            return None
+        key = (self.model_name, hashlib.sha256(context.encode()).hexdigest())
+        entry = self._context_caches.get(key)
+        if entry is not None and entry[1] > time.time():
+            return entry[0]
+
+        job = self._context_cache_jobs.get(key)
+        if job is None:
+            job = asyncio.ensure_future(self._create_cached_context(key, context))
+            self._context_cache_jobs[key] = job
+            job.add_done_callback(lambda _: self._context_cache_jobs.pop(key, None))
+        # A cancelled caller must not cancel the creation the others are waiting for
+        return await asyncio.shield(job)
+
+    async def _create_cached_context(self, key: Tuple[str, str], context: str) -> Optional[str]:
+        ttl = settings.LLM_GEMINI_CACHE_TTL_SECONDS
+        try:
+            cached = await self.client.aio.caches.create(
+                model=self.model_name,
+                config=types.CreateCachedContentConfig(system_instruction=context, ttl=f"{ttl}s"),
+            )
+            name = cached.name
+        except Exception as e:
+            # Not every model supports caching, don't ask again until the entry expires
+            logger.warning(f"Could not cache context for {self.model_name}: {e}")
+            name = None
+        # Refresh a minute early so a request never references an expired cache
+        self._context_caches[key] = (name, time.time() + ttl - 60)
+        return name
+
+    async def _generate_content(self, system_prompt: str, user_content: str, context: Optional[str] = None) -> Tuple[str, Optional[TokenUsage]]:
+        cached_context = await self._get_cached_context(context) if context else None
+        if cached_context:
+            response = await self.client.aio.models.generate_content(
+                model=self.model_name,
+                contents=f"{system_prompt}\n\n{user_content}",
+                config=types.GenerateContentConfig(cached_content=cached_context),
+            )
+        else:
+            prefix = f"{context}\n\n" if context else ""
+            response = await self.client.aio.models.generate_content(
+                model=self.model_name,
+                contents=f"{prefix}{system_prompt}\n\n{user_content}"
+            )
+        return response.text, self._usage(response)
+
+    @staticmethod
+    def _usage(response) -> Optional[TokenUsage]:
+        metadata = getattr(response, "usage_metadata", None)
+        if metadata is None or metadata.prompt_token_count is None:
+            return None
+        # Thinking tokens are billed as output
+        return TokenUsage(
+            prompt_tokens=metadata.prompt_token_count,
+            completion_tokens=(metadata.candidates_token_count or 0) + (getattr(metadata, "thoughts_token_count", None) or 0),
+            cached_tokens=metadata.cached_content_token_count or 0,
+        )
+
+class FakeBackendError(Exception):
+    """Simulated provider outage, classified as transient so it goes through the retry path"""
+    status_code = 503
+
+class FakeBackend(ModelBackend):
+    """
+    Offline backend for tests and benchmarks. The response is derived from the prompt only, so runs are
+    reproducible; latency and failure rate are configurable through the LLM_FAKE_* settings.
+    """
+    provider = "fake"
+
+    def __init__(self, model_name: str, latency: float = None, failure_rate: float = None, seed: int = None):
+        self.model_name = model_name
+        self.latency = settings.LLM_FAKE_LATENCY_SECONDS if latency is None else latency
+        self.failure_rate = settings.LLM_FAKE_FAILURE_RATE if failure_rate is None else failure_rate
+        self.output_tokens = settings.LLM_FAKE_OUTPUT_TOKENS
+        self.random = random.Random(settings.LLM_FAKE_SEED if seed is None else seed)
+
+    async def _generate_content(self, system_prompt: str, user_content: str) -> str:
+        if self.latency:
+            # Uniform jitter around the configured mean
+            await asyncio.sleep(self.latency * (0.5 + self.random.random()))
+        if self.random.random() < self.failure_rate:
+            raise FakeBackendError("Simulated provider failure")
+
+        digest = hashlib.sha256(f"{system_prompt}\n{user_content}".encode()).hexdigest()
+        words = user_content.split() or [digest]
+        response = f"Summary {digest[:12]}:"
+        i = 0
+        while estimate_tokens(response) < self.output_tokens:
+            response += " " + words[i % len(words)]
+            i += 1
+        return response
+
+class BatchBackend(ModelBackend):
+    """Queues prompts into provider batches instead of sending interactive requests"""
+
+    def __init__(self, provider: str, model_name: str, collector: BatchCollector):
+        self.provider = provider
+        self.model_name = model_name
+        self.collector = collector
+
+    async def _generate_content(self, system_prompt: str, user_content: str) -> str:
+        return await self.collector.submit(system_prompt, user_content)
+
+
+class Route:
+    def __init__(self, backend: ModelBackend, max_tokens: Optional[int] = None, health: BackendHealth = None):
+        self.backend = backend
+        self.max_tokens = max_tokens
+        self.health = health or get_health(backend.provider, backend.model_name)
+
+    def fits(self, tokens: int) -> bool:
+        return self.max_tokens is None or tokens <= self.max_tokens
+
+    def is_saturated(self) -> bool:
+        limiter = self.backend.limiter
+        return limiter is not None and limiter.in_flight >= int(limiter.limit)
+
+class RoutedBackend(ModelBackend):
+    """
+    Picks a backend per call: the first route (in order of preference) whose size limit fits the prompt
+    and that is up, not saturated and within the latency SLO. Falls over to the next route on errors.
+    """
+    provider = "routed"
+
+    def __init__(self, routes: List[Route], latency_slo: float = None):
+        self.routes = routes
+        self.model_name = "+".join(route.backend.model_name for route in routes)
+        self.latency_slo = settings.LLM_ROUTE_LATENCY_SLO_SECONDS if latency_slo is None else latency_slo
+
+    def select_routes(self, tokens: int) -> List[Route]:
+        """Routes to try in order, healthy ones first"""
+        fitting = [route for route in self.routes if route.fits(tokens)] or self.routes[-1:]
+        healthy = [
+            route for route in fitting
+            if route.health.is_available()
+            and not route.is_saturated()
+            and (route.health.latency is None or route.health.latency <= self.latency_slo)
+        ]
+        return healthy + [route for route in fitting if route not in healthy]
+
+    async def generate_content(self, system_prompt: str, user_content: str, context: Optional[str] = None) -> str:
+        # Each route's backend applies its own cache, limits, retries and usage accounting
+        return await self._generate_content(system_prompt, user_content, context=context)
+
+    async def _generate_content(self, system_prompt: str, user_content: str, context: Optional[str] = None) -> str:
+        tokens = self.count_tokens(system_prompt) + self.count_tokens(user_content) + (self.count_tokens(context) if context else 0)
+        last_error = None
+        for route in self.select_routes(tokens):
+            start = time.perf_counter()
+            try:
+                response = await route.backend.generate_content(system_prompt, user_content, context=context)
+            except Exception as e:
+                route.health.record_failure()
+                logger.warning(f"Route {route.backend.provider}/{route.backend.model_name} failed: {e}, failing over")
+                last_error = e
+                continue
+            route.health.record_success(time.perf_counter() - start)
+            return response
+        raise last_error
+
+    def count_tokens(self, text: str) -> int:
+        return self.routes[0].backend.count_tokens(text)
+
+
+BACKENDS = {
+    "ollama": OllamaBackend,
+    "gemini": GeminiBackend,
+    "fake": FakeBackend,
+}
+
+_batch_backends: Dict[Tuple[str, str], BatchBackend] = {}
+
+def _get_batch_backend(provider: str, model_name: str) -> BatchBackend:
+    # Shared per (provider, model) so prompts from all concurrent summarizers land in the same batches
+    key = (provider, model_name)
+    if key not in _batch_backends:
+        collector = BatchCollector(BATCH_PROVIDERS[provider](), model_name)
+        _batch_backends[key] = BatchBackend(provider, model_name, collector)
+    return _batch_backends[key]
+
+def create_backend(provider: str, model_name: str, batch: bool = False) -> ModelBackend:
+    """Instantiate a backend by provider name, attaching the shared response cache when enabled"""
+    if provider not in BACKENDS:
+        raise ValueError(f"Unsupported backend: {provider}")
+    if batch and provider not in BATCH_PROVIDERS:
+        raise ValueError(f"Backend {provider} has no batch mode, disable LLM_BATCH_MODE")
+    if batch:
+        backend = _get_batch_backend(provider, model_name)
+    else:
+        backend = BACKENDS[provider](model_name)
+        backend.limiter = get_limiter(provider, model_name)
+        backend.retry_policy = RetryPolicy.from_settings()
+    if settings.LLM_CACHE_ENABLED:
+        backend.cache = llm_cache
+    return backend
+
+# Settings attribute holding the model name for each summarization step
+MODEL_SETTINGS = {
+    "ollama": {
+        "diff": "LLM_DIFF_SUMMARIZER",
+        "chunk": "LLM_CHUNK_SUMMARIZER",
+        "readme": "LLM_README_SUMMARIZER",
+    },
+    "gemini": {
+        "diff": "LLM_GEMINI_DIFF_MODEL",
+        "chunk": "LLM_GEMINI_CHUNK_MODEL",
+        "readme": "LLM_GEMINI_README_MODEL",
+    },
+    "fake": {
+        "diff": "LLM_FAKE_MODEL",
+        "chunk": "LLM_FAKE_MODEL",
+        "readme": "LLM_FAKE_MODEL",
+    },
+}
+
+def create_routed_backend(role: str, batch: bool = False) -> RoutedBackend:
+    """Size-based router over the LLM_ROUTES providers for one summarization step"""
+    routes = []
+    for provider in settings.LLM_ROUTES:
+        backend = create_role_backend(role, provider, batch=batch)
+        if backend.retry_policy is not None and len(settings.LLM_ROUTES) > 1:
+            # Fail over to the next route instead of backing off on a struggling one
+            backend.retry_policy.max_retries = min(backend.retry_policy.max_retries, 1)
+        routes.append(Route(backend, max_tokens=settings.LLM_ROUTE_MAX_TOKENS.get(provider)))
+    return RoutedBackend(routes)
+
+def create_role_backend(role: str, provider: str = None, batch: bool = False) -> ModelBackend:
+    """Backend for one summarization step ("diff", "chunk" or "readme") of the configured provider"""
+    if provider is None:
+        provider = settings.LLM_USE
+    if provider == "routed":
+        return create_routed_backend(role, batch=batch)
+    if provider not in MODEL_SETTINGS:
+        raise ValueError(f"Unsupported backend: {provider}")
+    return create_backend(provider, getattr(settings, MODEL_SETTINGS[provider][role]), batch=batch)
+
+def role_model_names(role: str, provider: str = None) -> List[str]:
+    """"provider/model" of every model that may serve a summarization step, without creating clients"""
+    if provider is None:
+        provider = settings.LLM_USE
+    if provider == "routed":
+        return [name for route in settings.LLM_ROUTES for name in role_model_names(role, route)]
+    return [f"{provider}/{getattr(settings, MODEL_SETTINGS[provider][role])}"]
+
+def create_summarizer_backends(provider: str = None, batch: bool = False) -> Tuple[ModelBackend, ModelBackend]:
+    """Backends for the per-group (diff) and final (chunk) summarization steps"""
+    return create_role_backend("diff", provider, batch=batch), create_role_backend("chunk", provider, batch=batch)
@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import re
 from typing import List, Optional
@@ -6,7 +7,9 @@ from backend.models.repository import (
     Issue, IssueComment, Repository,
     RepositoryLanguage, ReadmeSummary
 )
-from backend.services.commit_summarizer import OllamaBackend, GeminiBackend, RepositoryContext
+from backend.services.commit_summarizer import RepositoryContext
+from backend.services.model_backends import create_summarizer_backends
+from backend.services.token_grouping import pack_sequential, split_oversized_comments
 from backend.utils.logger import get_logger
 from backend.config.settings import settings
 
@@ -19,19 +22,13 @@ class PRCommentGroup:
     total_size: int = 0
 
 class PullRequestDiscussionSummarizer:
-    def __init__(self, max_group_size: int = 25000, backend: str = None):
-        self.max_group_size = max_group_size
+    def __init__(self, max_group_tokens: int = None, backend: str = None):
+        self.max_group_tokens = max_group_tokens or settings.LLM_MAX_GROUP_TOKENS
+        self.tree_reduce_enabled = settings.LLM_PR_TREE_REDUCE
+        self.reduce_fan_in = max(2, settings.LLM_PR_REDUCE_FAN_IN)
+        self.max_concurrency = settings.LLM_PR_MAX_CONCURRENCY
         self.repo_context = None
-        if backend is None:
-            backend = settings.LLM_USE
-        if backend == "ollama":
-            self.content_backend = OllamaBackend(settings.LLM_DIFF_SUMMARIZER)
-            self.final_backend = OllamaBackend(settings.LLM_CHUNK_SUMMARIZER)
-        elif backend == "gemini":
-            self.content_backend = GeminiBackend(settings.LLM_GEMINI_DIFF_MODEL)
-            self.final_backend = GeminiBackend(settings.LLM_GEMINI_CHUNK_MODEL)
-        else:
-            raise ValueError(f"Unsupported backend: {backend}")
+        self.content_backend, self.final_backend = create_summarizer_backends(backend)
 
     def clean_summary(self, summary: str) -> str:
         # Remove content between <think> tags
@@ -40,24 +37,18 @@ class PullRequestDiscussionSummarizer:
     def set_repository_context(self, languages: List[RepositoryLanguage], readme_summary: Optional[ReadmeSummary], repo_path: str) -> None:
         self.repo_context = RepositoryContext(languages=languages, readme_summary=readme_summary, repo_path=repo_path)
 
+    def comment_tokens(self, comment: IssueComment) -> int:
+        return self.content_backend.count_tokens(f"{comment.author_login}: {comment.body or ''}")
+
     def batch_comments(self, comments: List[IssueComment]) -> List[PRCommentGroup]:
+        # Comments keep their chronological order, groups are summarized and merged as contiguous spans
+        comments = split_oversized_comments(comments, self.max_group_tokens, self.content_backend.count_tokens)
+        sizes = [self.comment_tokens(comment) for comment in comments]
         groups = []
-        current_group = []
-        current_size = 0
-
-        for comment in comments:
-            comment_size = len(comment.body)
-            if current_size + comment_size > self.max_group_size and current_group:
-                groups.append(PRCommentGroup(comments=current_group, total_size=current_size))
-                current_group = []
-                current_size = 0
-            
-            current_group.append(comment)
-            current_size += comment_size
-
-        if current_group:
-            groups.append(PRCommentGroup(comments=current_group, total_size=current_size))
-
+        start = 0
+        for group in pack_sequential(comments, sizes, self.max_group_tokens):
+            groups.append(PRCommentGroup(comments=group, total_size=sum(sizes[start:start + len(group)])))
+            start += len(group)
         return groups
 
     async def summarize_comment_group(self, comment_group: PRCommentGroup, issue: Issue, prev_group_summary: str = None) -> str:
@@ -65,9 +56,6 @@ class PullRequestDiscussionSummarizer:
             prompt_template = f.read()
 
         system_prompt = prompt_template.format(
-            repo_name=self.repo_context.repo_path,
-            languages=self.repo_context.get_languages_str(),
-            description=self.repo_context.get_description_str(),
             pr_title=issue.title,
             pr_content=issue.body or "No message provided",
             prev_summary=prev_group_summary or "This is first segment"
@@ -76,7 +64,72 @@ class PullRequestDiscussionSummarizer:
         content = "\n".join(f"{comment.author_login}: {comment.body}" for comment in comment_group.comments)
         summary = await self.content_backend.generate_content(
             system_prompt,
-            f"Summarize these comments: {content}"
+            f"Summarize these comments: {content}",
+            context=self.repo_context.get_prompt_context(),
+        )
+        return self.clean_summary(summary)
+
+    async def merge_summaries(self, summaries: List[str], issue: Issue) -> str:
+        """Merge summaries of consecutive comment groups into one summary of the whole span"""
+        with open('backend/prompts/pr_summaries_merger.txt', 'r') as f:
+            prompt_template = f.read()
+
+        system_prompt = prompt_template.format(
+            pr_title=issue.title,
+            pr_content=issue.body or "No message provided",
+        )
+
+        content = "\n\n".join(f"Segment {i + 1}:\n{summary}" for i, summary in enumerate(summaries))
+        summary = await self.content_backend.generate_content(
+            system_prompt,
+            f"Merge these segment summaries: {content}",
+            context=self.repo_context.get_prompt_context(),
+        )
+        return self.clean_summary(summary)
+
+    async def tree_reduce(self, comment_groups: List[PRCommentGroup], issue: Issue) -> List[str]:
+        """
+        Summarize all comment groups in parallel, then merge neighbouring summaries k at a time
+        until at most `reduce_fan_in` remain for the final summary
+        """
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        total = len(comment_groups)
+
+        async def summarize(i: int, group: PRCommentGroup) -> str:
+            async with semaphore:
+                return await self.summarize_comment_group(
+                    group, issue, prev_group_summary=f"Segments are summarized independently, this is segment {i + 1} of {total}"
+                )
+
+        async def merge(chunk: List[str]) -> str:
+            if len(chunk) == 1:
+                return chunk[0]
+            async with semaphore:
+                return await self.merge_summaries(chunk, issue)
+
+        summaries = await asyncio.gather(*(summarize(i, group) for i, group in enumerate(comment_groups)))
+        while len(summaries) > self.reduce_fan_in:
+            logger.info(f"Merging {len(summaries)} comment group summaries")
+            chunks = [summaries[i:i + self.reduce_fan_in] for i in range(0, len(summaries), self.reduce_fan_in)]
+            summaries = await asyncio.gather(*(merge(chunk) for chunk in chunks))
+        return list(summaries)
+
+    async def summarize_single_group(self, comment_group: PRCommentGroup, issue: Issue) -> str:
+        """Summarize a discussion that fits into one group with a single LLM call"""
+        with open('backend/prompts/pr_single_pass_summarizer.txt', 'r') as f:
+            prompt_template = f.read()
+
+        system_prompt = prompt_template.format(
+            pr_title=issue.title,
+            pr_content=issue.body or "No message provided",
+        )
+
+        content = "\n".join(f"{comment.author_login}: {comment.body}" for comment in comment_group.comments)
+        summary = await self.final_backend.generate_content(
+            system_prompt,
+            f"Create discussion summary: Pull Request Description:\n{issue.body or 'No description provided'}\n\n"
+            f"Discussion:\n{content}",
+            context=self.repo_context.get_prompt_context(),
         )
         return self.clean_summary(summary)
 
@@ -89,9 +142,6 @@ class PullRequestDiscussionSummarizer:
             prompt_template = f.read()
 
         system_prompt = prompt_template.format(
-            repo_name=self.repo_context.repo_path,
-            languages=self.repo_context.get_languages_str(),
-            description=self.repo_context.get_description_str(),
             pr_title=issue.title,
             pr_content=issue.body or "No message provided",
         )
@@ -101,32 +151,85 @@ class PullRequestDiscussionSummarizer:
 
         summary = await self.final_backend.generate_content(
             system_prompt,
-            f"Create discussion summary: {content}"
+            f"Create discussion summary: {content}",
+            context=self.repo_context.get_prompt_context(),
         )
         return self.clean_summary(summary)
 
-    async def summarize_pull_request_discussion(
+    async def update_summary(self, issue: Issue, existing_summary: str, new_content: str) -> str:
+        """Merge a summary of new discussion into the existing pull request summary"""
+        with open('backend/prompts/pr_summary_updater.txt', 'r') as f:
+            prompt_template = f.read()
+
+        system_prompt = prompt_template.format(
+            pr_title=issue.title,
+            pr_content=issue.body or "No message provided",
+        )
+
+        summary = await self.final_backend.generate_content(
+            system_prompt,
+            f"Existing summary:\n{existing_summary}\n\nNew discussion:\n{new_content}",
+            context=self.repo_context.get_prompt_context(),
+        )
+        return self.clean_summary(summary)
+
+    async def update_pull_request_discussion(
         self,
         issue: Issue,
-        comments: List[IssueComment],
+        existing_summary: str,
+        new_comments: List[IssueComment],
         languages: List[RepositoryLanguage],
         readme_summary: Optional[ReadmeSummary],
         repository: Repository
     ) -> str:
+        """Summarize only comments posted after the existing summary and merge them into it"""
         repo_path = f"{repository.owner}/{repository.name}"
-        logger.info(f"Summarizing PR #{issue.number} discussion in {repo_path}")
-        
+        logger.info(f"Updating PR #{issue.number} discussion summary in {repo_path} with {len(new_comments)} new comments")
+
         self.set_repository_context(languages, readme_summary, repo_path)
 
+        comment_groups = self.batch_comments(new_comments)
+        if len(comment_groups) == 1:
+            new_content = "\n".join(f"{comment.author_login}: {comment.body}" for comment in comment_groups[0].comments)
+        else:
+            new_content = "\n".join(await self.summarize_comment_groups(comment_groups, issue))
+        return await self.update_summary(issue, existing_summary, new_content)
+
+    async def summarize_comment_groups(self, comment_groups: List[PRCommentGroup], issue: Issue) -> List[str]:
+        """Summaries of several comment groups, tree-reduced in parallel or chained in order (LLM_PR_TREE_REDUCE)"""
+        if self.tree_reduce_enabled:
+            logger.info(f"Tree-reducing {len(comment_groups)} comment groups")
+            return await self.tree_reduce(comment_groups, issue)
+
         # Process comments in groups
         prev_summary = None
-        comment_groups = self.batch_comments(comments)
         comment_summaries = []
         for group in comment_groups:
             logger.info(f"Processing comment group with {len(group.comments)} comments")
             summary = await self.summarize_comment_group(group, issue, prev_group_summary=prev_summary)
             prev_summary = summary
             comment_summaries.append(summary)
+        return comment_summaries
+
+    async def summarize_pull_request_discussion(
+        self,
+        issue: Issue,
+        comments: List[IssueComment],
+        languages: List[RepositoryLanguage],
+        readme_summary: Optional[ReadmeSummary],
+        repository: Repository
+    ) -> str:
+        repo_path = f"{repository.owner}/{repository.name}"
+        logger.info(f"Summarizing PR #{issue.number} discussion in {repo_path}")
+        
+        self.set_repository_context(languages, readme_summary, repo_path)
+
+        comment_groups = self.batch_comments(comments)
+        if len(comment_groups) == 1:
+            logger.info(f"Processing single comment group with {len(comment_groups[0].comments)} comments")
+            return await self.summarize_single_group(comment_groups[0], issue)
+
+        comment_summaries = await self.summarize_comment_groups(comment_groups, issue)
 
         # Generate final discussion summary
         logger.info("Generating final PR discussion summary")
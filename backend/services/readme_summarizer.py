@@ -1,10 +1,22 @@
-from ollama import chat
+import asyncio
+import hashlib
+import re
+from typing import List
 from backend.config.settings import settings
+from backend.services.model_backends import create_role_backend
+from backend.services.token_grouping import pack_sequential, split_lines
 import os
-import re
+
+MARKDOWN_HEADING = re.compile(r'^#{1,6} ', re.MULTILINE)
+
+
+def readme_hash(readme_content: str) -> str:
+    """Fingerprint of README content, matches Postgres md5() so changes can be detected in SQL"""
+    return hashlib.md5(readme_content.encode("utf-8")).hexdigest()
+
 
 class ReadmeSummarizer:
-    def __init__(self):
+    def __init__(self, max_chunk_tokens: int = None, backend: str = None):
         self.prompt_path = os.path.join(
             os.path.dirname(__file__), 
             "..", 
@@ -13,19 +25,50 @@ class ReadmeSummarizer:
         )
         with open(self.prompt_path, 'r') as f:
             self.prompt_template = f.read()
+        with open(os.path.join(os.path.dirname(self.prompt_path), "readme_chunks_merger.txt"), 'r') as f:
+            self.merge_prompt_template = f.read()
+        self.max_chunk_tokens = max_chunk_tokens or settings.LLM_MAX_GROUP_TOKENS
+        self.backend = create_role_backend("readme", backend)
 
-    def summarize(self, readme_content: str) -> str:
-        prompt = f"{self.prompt_template}\n\nAnalyze this README content:\n\n{readme_content}"
-    
-        response = chat(
-            model=settings.LLM_README_SUMMARIZER,
-            messages=[{
-                'role': 'user',
-                'content': prompt
-            }]
-        )
+    def split_readme(self, readme_content: str) -> List[str]:
+        """Split a README into chunks of whole markdown sections that fit into one prompt"""
+        starts = [m.start() for m in MARKDOWN_HEADING.finditer(readme_content)]
+        if not starts or starts[0] != 0:
+            starts.insert(0, 0)
+        sections = []
+        for start, end in zip(starts, starts[1:] + [len(readme_content)]):
+            section = readme_content[start:end]
+            if self.backend.count_tokens(section) > self.max_chunk_tokens:
+                sections.extend(split_lines(section, self.max_chunk_tokens, self.backend.count_tokens))
+            else:
+                sections.append(section)
+        sizes = [self.backend.count_tokens(section) for section in sections]
+        return ["".join(chunk) for chunk in pack_sequential(sections, sizes, self.max_chunk_tokens)]
+
+    async def summarize(self, readme_content: str) -> str:
+        chunks = self.split_readme(readme_content)
+        if len(chunks) == 1:
+            summary = await self.backend.generate_content(
+                self.prompt_template,
+                f"Analyze this README content:\n\n{readme_content}"
+            )
+            return self.clean_summary(summary)
 
-        return self.clean_summary(response.message.content)
+        partial_summaries = await asyncio.gather(*(
+            self.backend.generate_content(
+                self.prompt_template,
+                f"Analyze this README part ({i + 1} of {len(chunks)}):\n\n{chunk}"
+            )
+            for i, chunk in enumerate(chunks)
+        ))
+        combined = "\n\n".join(
+            f"Part {i + 1}:\n{self.clean_summary(summary)}" for i, summary in enumerate(partial_summaries)
+        )
+        summary = await self.backend.generate_content(
+            self.merge_prompt_template,
+            f"Combine these README analyses:\n\n{combined}"
+        )
+        return self.clean_summary(summary)
 
     def clean_summary(self, summary: str) -> str:
         # Remove content between <think> tags
@@ -45,10 +88,9 @@ if __name__ == "__main__":
             )
             readme_content = result.scalar_one_or_none()
             if readme_content:
-                summary = summarizer.summarize(readme_content)
+                summary = await summarizer.summarize(readme_content)
                 print(f"Readme Summary: {summary}")
             else:
                 print("No README content found")
 
-    import asyncio
     asyncio.run(test_readme_summarizer())
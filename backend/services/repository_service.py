@@ -1,6 +1,7 @@
+import base64
 from typing import Tuple, List, Dict
 from backend.config.settings import settings
-from sqlalchemy import select, text
+from sqlalchemy import func, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 from backend.services.github_service import GitHubService
 from backend.models.repository import Repository, Commit, Issue, IssueComment, CommitDiff, DeletedIssue
@@ -9,7 +10,7 @@ from backend.db.database import (
     save_issue_comment, save_commit_diff,
     get_last_commit_with_null_parent, get_commit_by_sha,
     get_last_issue_with_null_parent, get_issue_by_number,
-    get_repository_by_owner_and_name, update_repository_attributes,
+    get_repository_by_owner_and_name, update_repository_attributes, request_repository_summaries,
     update_commit_attributes, get_deleted_issue_by_number,
     save_deleted_issue, save_repository_languages
 )
@@ -55,6 +56,35 @@ class RepositoryService:
             commits_count += 1
         return commits_count
     
+    async def _process_new_comments(
+        self,
+        session: AsyncSession,
+        issue: Issue,
+        issue_data: Dict,
+        repository: Repository,
+    ) -> int:
+        """Save comments posted on an already stored issue since it was last fetched."""
+        result = await session.execute(
+            select(func.count(IssueComment.id), func.max(IssueComment.created_at))
+            .where(IssueComment.issue_id == issue.id)
+        )
+        stored_count, last_created_at = result.one()
+        if issue_data.get("comments", 0) <= stored_count:
+            return 0
+
+        # `since` filters on the update time, so edited older comments come back too and are skipped below
+        comments = await self.github.get_issue_comments(
+            repository.owner, repository.name, issue.number, since=last_created_at
+        )
+        comments_count = 0
+        for comment_data in comments:
+            comment = IssueComment.from_github_data(comment_data, issue.id)
+            if last_created_at and comment.created_at <= last_created_at:
+                continue
+            await save_issue_comment(session, comment)
+            comments_count += 1
+        return comments_count
+
     async def _process_issue(
         self,
         session: AsyncSession,
@@ -64,7 +94,7 @@ class RepositoryService:
         """Process an issue and return the issue and count of new comments."""
         existing_issue = await get_issue_by_number(session, issue_data["number"], repository.id)
         if existing_issue:
-            return existing_issue, 0
+            return existing_issue, await self._process_new_comments(session, existing_issue, issue_data, repository)
         
         issue = Issue.from_github_data(issue_data, repository.id)
         issue = await save_issue(session, issue)
@@ -91,6 +121,39 @@ class RepositoryService:
             issues_count += count
         return issues_count
 
+    async def _update_readme(self, session: AsyncSession, repository: Repository) -> Repository:
+        """Fetch README, a changed README is re-summarized by the summary service."""
+        readme_data = await self.github.get_readme(repository.owner, repository.name)
+        if not readme_data:
+            return repository
+        readme_content = base64.b64decode(readme_data["content"]).decode("utf-8")
+        if readme_content == repository.readme_content:
+            return repository
+        return await update_repository_attributes(
+            session,
+            repository.id,
+            readme_content=readme_content,
+            readme_path=readme_data["path"]
+        )
+
+    async def _update_gitattributes(self, session: AsyncSession, repository: Repository) -> Repository:
+        """Store .gitattributes so linguist-generated files can be excluded from summaries."""
+        gitattributes_data = await self.github.get_file_content(repository.owner, repository.name, ".gitattributes")
+        if gitattributes_data is None:
+            # Deleted upstream, its attributes no longer apply
+            gitattributes_content = None
+        elif "content" not in gitattributes_data:
+            return repository
+        else:
+            gitattributes_content = base64.b64decode(gitattributes_data["content"]).decode("utf-8", errors="replace")
+        if gitattributes_content == repository.gitattributes_content:
+            return repository
+        return await update_repository_attributes(
+            session,
+            repository.id,
+            gitattributes_content=gitattributes_content
+        )
+
     async def _initialize_repository(self, session: AsyncSession, repository: Repository) -> Tuple[Repository, int, int]:
         owner, repo = repository.owner, repository.name
 
@@ -98,17 +161,8 @@ class RepositoryService:
         languages = await self.github.get_languages(owner, repo)
         await save_repository_languages(session, repository.id, languages)
 
-        # Fetch README
-        readme_data = await self.github.get_readme(owner, repo)
-        if (readme_data):
-            import base64
-            readme_content = base64.b64decode(readme_data["content"]).decode("utf-8")
-            repository = await update_repository_attributes(
-                session,
-                repository.id,
-                readme_content=readme_content,
-                readme_path=readme_data["path"]
-            )
+        repository = await self._update_readme(session, repository)
+        repository = await self._update_gitattributes(session, repository)
 
         # Continue with existing initialization
         commits_data = await self.github.get_commits(
@@ -133,6 +187,9 @@ class RepositoryService:
             
             issues_count += 1
 
+        # Summarize the latest commits of a new repository ahead of the regular backlog
+        repository = await request_repository_summaries(session, repository)
+
         # Update repository initialization status using the new function
         repository = await update_repository_attributes(
             session, 
@@ -163,6 +220,9 @@ class RepositoryService:
         languages = await self.github.get_languages(owner, repo)
         await save_repository_languages(session, repository.id, languages)
 
+        repository = await self._update_readme(session, repository)
+        repository = await self._update_gitattributes(session, repository)
+
         # Fetch recent commits
         recent_commits = await self.github.get_commits(
             owner, repo, page=1, per_page=self.update_fetch_items
@@ -1,15 +1,19 @@
+import re
 from typing import Optional, List, Tuple
-from sqlalchemy import select, text
+from datetime import datetime, timezone
+from sqlalchemy import func, select, text
 from sqlalchemy.ext.asyncio import AsyncSession
 from backend.models.repository import (
     Commit, CommitDiff, Issue, RepositoryLanguage,
     ReadmeSummary, Repository, CommitSummary, IssueComment,
-    PullRequestSummary
+    PullRequestSummary, LLMCall
 )
 from backend.utils.logger import get_logger
-from backend.config.settings import async_session
+from backend.config.settings import async_session, settings
 from .commit_summarizer import LLMSummarizer
 from .pr_summarizer import PullRequestDiscussionSummarizer
+from .summary_priority import PendingCommit, decayed_query_score, repository_weight
+from .summary_versions import commit_summary_version, pr_summary_version
 
 logger = get_logger(__name__)
 
@@ -76,7 +80,7 @@ async def get_commit_data(
             ReadmeSummary.repository_id == commit.repository_id
         )
     )
-    readme_summary = result.scalar_one()
+    readme_summary = result.scalar_one_or_none()
     
     # Get repository info
     result = await db.execute(
@@ -104,7 +108,9 @@ async def get_pr_data(
     
     # Get all comments for the PR
     result = await db.execute(
-        select(IssueComment).filter(IssueComment.issue_id == pr_id)
+        select(IssueComment)
+        .filter(IssueComment.issue_id == pr_id)
+        .order_by(IssueComment.created_at, IssueComment.id)
     )
     comments = result.scalars().all()
     
@@ -132,17 +138,107 @@ async def get_pr_data(
     
     return pr, comments, languages, readme_summary, repository
 
-async def get_commits_without_summaries(db: AsyncSession) -> List[int]:
-    """Find all commit IDs that don't have corresponding summaries"""
+async def search_unsummarized_commits(db: AsyncSession, repository_id: int, query: str, limit: int = 3) -> List[int]:
+    """Commits of a repository without a summary whose message matches any word of the query, best matches first"""
+    words = re.findall(r"\w+", query)
+    if not words:
+        return []
     result = await db.execute(
-        text("SELECT c.id FROM commits c LEFT JOIN commit_summaries cs ON c.id = cs.commit_id WHERE cs.id IS NULL limit 5")
+        text("""
+            SELECT c.id
+            FROM commits c
+            LEFT JOIN commit_summaries cs ON c.id = cs.commit_id
+            WHERE c.repository_id = :repository_id
+                AND (cs.id IS NULL OR cs.is_stale)
+                AND to_tsvector('english', c.message) @@ to_tsquery('english', :tsquery)
+            ORDER BY ts_rank(to_tsvector('english', c.message), to_tsquery('english', :tsquery)) DESC,
+                c.committed_date DESC
+            LIMIT :limit
+        """),
+        {"repository_id": repository_id, "tsquery": " | ".join(words), "limit": limit}
+    )
+    return [row[0] for row in result.all()]
+
+# Decayed search traffic of the repository r, see summary_priority.decayed_query_score
+DECAYED_QUERY_SCORE_SQL = """
+    COALESCE(r.query_score, 0) * power(0.5,
+        EXTRACT(EPOCH FROM (now() - COALESCE(r.last_queried_at, now()))) / 3600 / :half_life)
+"""
+
+async def get_outdated_commit_summaries(db: AsyncSession, limit: int = 10) -> List[Tuple[int, int]]:
+    """
+    (commit id, repository id) of summaries produced by an older prompt or model,
+    most queried repositories and newest commits first
+    """
+    prompt_version, model_version = commit_summary_version()
+    result = await db.execute(
+        text(f"""
+            SELECT c.id, c.repository_id
+            FROM commit_summaries cs
+            INNER JOIN commits c ON c.id = cs.commit_id
+            INNER JOIN repositories r ON r.id = c.repository_id
+            WHERE NOT cs.is_stale
+                AND (cs.prompt_version IS DISTINCT FROM :prompt_version OR cs.model_version IS DISTINCT FROM :model_version)
+            ORDER BY {DECAYED_QUERY_SCORE_SQL} DESC, c.committed_date DESC
+            LIMIT :limit
+        """),
+        {
+            "prompt_version": prompt_version,
+            "model_version": model_version,
+            "half_life": settings.summary_query_half_life_hours,
+            "limit": limit,
+        }
+    )
+    return [(row[0], row[1]) for row in result.all()]
+
+async def get_outdated_pr_summaries(db: AsyncSession, limit: int = 10) -> List[Tuple[int, int]]:
+    """(pull request id, repository id) of summaries produced by an older prompt or model, same order as commits"""
+    prompt_version, model_version = pr_summary_version()
+    result = await db.execute(
+        text(f"""
+            SELECT i.id, i.repository_id
+            FROM pull_request_summaries prs
+            INNER JOIN issues i ON i.id = prs.issue_id
+            INNER JOIN repositories r ON r.id = i.repository_id
+            WHERE prs.prompt_version IS DISTINCT FROM :prompt_version OR prs.model_version IS DISTINCT FROM :model_version
+            ORDER BY {DECAYED_QUERY_SCORE_SQL} DESC, i.updated_at DESC
+            LIMIT :limit
+        """),
+        {
+            "prompt_version": prompt_version,
+            "model_version": model_version,
+            "half_life": settings.summary_query_half_life_hours,
+            "limit": limit,
+        }
+    )
+    return [(row[0], row[1]) for row in result.all()]
+
+async def get_tokens_spent(db: AsyncSession, target_types: List[str], since: datetime) -> int:
+    """Prompt and completion tokens recorded for the given LLM call target types since a point in time"""
+    result = await db.execute(
+        select(func.coalesce(func.sum(LLMCall.prompt_tokens + LLMCall.completion_tokens), 0))
+        .filter(LLMCall.target_type.in_(target_types), LLMCall.created_at >= since)
+    )
+    return result.scalar_one()
+
+async def get_commits_without_summaries(db: AsyncSession, limit: int = 5) -> List[int]:
+    """Find all commit IDs that don't have corresponding summaries or whose summary is stale"""
+    result = await db.execute(
+        text("SELECT c.id FROM commits c LEFT JOIN commit_summaries cs ON c.id = cs.commit_id WHERE cs.id IS NULL OR cs.is_stale limit :limit"),
+        {"limit": limit}
     )
     return [row[0] for row in result.all()]
 
 async def get_readme_without_summaries(db: AsyncSession) -> List[int]:
-    """Find all repositories with READMEs that don't have corresponding summaries"""
+    """Find all repositories with READMEs that don't have summaries or whose README changed since it was summarized"""
     result = await db.execute(
-        text("SELECT r.id FROM repositories r LEFT JOIN readme_summaries rs ON r.id = rs.repository_id WHERE rs.id IS NULL")
+        text("""
+            SELECT r.id
+            FROM repositories r
+            LEFT JOIN readme_summaries rs ON r.id = rs.repository_id
+            WHERE r.readme_content IS NOT NULL
+            AND (rs.id IS NULL OR rs.readme_hash IS DISTINCT FROM md5(r.readme_content))
+        """)
     )
     return [row[0] for row in result.all()]
 
@@ -162,6 +258,103 @@ async def get_prs_without_summaries(db: AsyncSession) -> List[int]:
     )
     return [row[0] for row in result.all()]
 
+async def get_pending_commits(db: AsyncSession, per_repository_limit: int = 5) -> List[PendingCommit]:
+    """Newest commits of every repository that need a summary, with the linked pull request if any"""
+    result = await db.execute(
+        text("""
+            WITH ranked AS (
+                SELECT c.id, c.repository_id, c.pull_request_number, c.committed_date,
+                    ROW_NUMBER() OVER (PARTITION BY c.repository_id ORDER BY c.committed_date DESC) AS recency_rank
+                FROM commits c
+            ), pending AS (
+                SELECT r.*,
+                    ROW_NUMBER() OVER (PARTITION BY r.repository_id ORDER BY r.committed_date DESC) AS pending_rank
+                FROM ranked r
+                LEFT JOIN commit_summaries cs ON r.id = cs.commit_id
+                WHERE cs.id IS NULL OR cs.is_stale
+            )
+            SELECT p.id, p.repository_id, i.id, prs.id IS NOT NULL, p.recency_rank
+            FROM pending p
+            LEFT JOIN issues i ON i.repository_id = p.repository_id
+                AND i.number = p.pull_request_number
+                AND i.is_pull_request = true
+            LEFT JOIN pull_request_summaries prs ON prs.issue_id = i.id
+            WHERE p.pending_rank <= :limit
+        """),
+        {"limit": per_repository_limit}
+    )
+    return [
+        PendingCommit(commit_id=row[0], repository_id=row[1], pr_id=row[2], pr_summarized=row[3], recency_rank=row[4])
+        for row in result.all()
+    ]
+
+async def get_repository_priorities(db: AsyncSession) -> Tuple[dict[int, float], set[int]]:
+    """Scheduling weight of every repository and the ids of repositories with an active summary request"""
+    result = await db.execute(
+        select(Repository.id, Repository.query_score, Repository.last_queried_at, Repository.summary_requested_until)
+    )
+    now = datetime.now(timezone.utc)
+    weights = {}
+    requested = set()
+    for repo_id, query_score, last_queried_at, requested_until in result.all():
+        weights[repo_id] = repository_weight(decayed_query_score(query_score, last_queried_at, now))
+        if requested_until and requested_until > now:
+            requested.add(repo_id)
+    return weights, requested
+
+async def get_pr_repository_ids(db: AsyncSession, pr_ids: List[int]) -> dict[int, int]:
+    """Map pull request ids to their repository ids"""
+    if not pr_ids:
+        return {}
+    result = await db.execute(
+        select(Issue.id, Issue.repository_id).where(Issue.id.in_(pr_ids))
+    )
+    return {row[0]: row[1] for row in result.all()}
+
+async def get_prs_with_new_comments(db: AsyncSession) -> List[int]:
+    """Find summarized pull requests that received comments after their summary was generated"""
+    result = await db.execute(
+        text("""
+            SELECT DISTINCT prs.issue_id
+            FROM pull_request_summaries prs
+            INNER JOIN issue_comments ic ON ic.issue_id = prs.issue_id
+            WHERE ic.id > prs.last_comment_id
+            -- Summaries from before last_comment_id was tracked cover the comments up to their last update
+            OR (prs.last_comment_id IS NULL AND ic.created_at > prs.updated_at)
+            LIMIT 5
+        """)
+    )
+    return [row[0] for row in result.all()]
+
+async def mark_pr_commit_summaries_stale(db: AsyncSession, pr: Issue) -> None:
+    """Commit summaries embed the PR summary, flag them for regeneration after it changes"""
+    await db.execute(
+        text("""
+            UPDATE commit_summaries cs SET is_stale = true
+            FROM commits c
+            WHERE cs.commit_id = c.id
+            AND c.repository_id = :repository_id
+            AND c.pull_request_number = :number
+        """),
+        {"repository_id": pr.repository_id, "number": pr.number}
+    )
+
+async def store_commit_summary(db: AsyncSession, commit_id: int, summary: str) -> CommitSummary:
+    """Insert a commit summary or replace a stale or outdated one"""
+    result = await db.execute(
+        select(CommitSummary).filter(CommitSummary.commit_id == commit_id)
+    )
+    commit_summary = result.scalar_one_or_none()
+    if commit_summary:
+        commit_summary.summary = summary
+        commit_summary.is_stale = False
+    else:
+        commit_summary = CommitSummary(commit_id=commit_id, summary=summary)
+        db.add(commit_summary)
+    commit_summary.prompt_version, commit_summary.model_version = commit_summary_version()
+    await db.flush()
+    return commit_summary
+
 async def generate_commit_summary(commit_id: int, db: AsyncSession) -> Tuple[str, Repository]:
     """Generate a summary for a commit based on its data"""
     commit, diffs, pr, languages, readme_summary, repository, pr_summary = await get_commit_data(db, commit_id)
@@ -177,13 +370,14 @@ async def generate_commit_summary(commit_id: int, db: AsyncSession) -> Tuple[str
         pr_summary=pr_summary,
     ), repository, commit
 
-async def save_commit_summary(db: AsyncSession, commit_id: int) -> None:
-    """Generate and save commit summary to the database"""
+async def save_commit_summary(db: AsyncSession, commit_id: int, regenerate: bool = False) -> None:
+    """Generate and save commit summary to the database, `regenerate` replaces an up to date summary too"""
     # Check for existing summary
     result = await db.execute(
         select(CommitSummary).filter(CommitSummary.commit_id == commit_id)
     )
-    if result.scalar_one_or_none():
+    existing_summary = result.scalar_one_or_none()
+    if existing_summary and not existing_summary.is_stale and not regenerate:
         return
     
     try:
@@ -192,8 +386,7 @@ async def save_commit_summary(db: AsyncSession, commit_id: int) -> None:
         logger.error(f"Commit with id {commit_id} not found")
         return
     
-    commit_summary = CommitSummary(commit_id=commit_id, summary=summary)
-    db.add(commit_summary)
+    await store_commit_summary(db, commit_id, summary)
     await db.commit()
     return summary, repo, commit
 
@@ -211,14 +404,51 @@ async def generate_pr_summary(pr_id: int, db: AsyncSession) -> Tuple[str, Reposi
     )
     return summary, repository, pr
 
-async def save_pr_summary(db: AsyncSession, pr_id: int) -> Optional[Tuple[str, Repository, Issue]]:
-    """Generate and save pull request summary to the database"""
+def is_new_comment(pr_summary: PullRequestSummary, comment: IssueComment) -> bool:
+    """Whether the comment was posted after the summary, see get_prs_with_new_comments"""
+    if pr_summary.last_comment_id is not None:
+        return comment.id > pr_summary.last_comment_id
+    return pr_summary.updated_at is not None and comment.created_at > pr_summary.updated_at
+
+async def update_pr_summary(db: AsyncSession, pr_summary: PullRequestSummary) -> Optional[Tuple[str, Repository, Issue]]:
+    """Merge comments posted since the last summary into it, without re-reading the whole thread"""
+    pr, comments, languages, readme_summary, repository = await get_pr_data(db, pr_summary.issue_id)
+    new_comments = [comment for comment in comments if is_new_comment(pr_summary, comment)]
+    if not new_comments:
+        return None
+
+    summarizer = PullRequestDiscussionSummarizer()
+    summary = await summarizer.update_pull_request_discussion(
+        issue=pr,
+        existing_summary=pr_summary.summarization,
+        new_comments=new_comments,
+        languages=languages,
+        readme_summary=readme_summary,
+        repository=repository
+    )
+    pr_summary.summarization = summary
+    pr_summary.last_comment_id = max(comment.id for comment in new_comments)
+    pr_summary.updated_at = datetime.now(timezone.utc)
+    await mark_pr_commit_summaries_stale(db, pr)
+    await db.commit()
+    return summary, repository, pr
+
+async def save_pr_summary(db: AsyncSession, pr_id: int, regenerate: bool = False) -> Optional[Tuple[str, Repository, Issue]]:
+    """
+    Generate and save pull request summary to the database, or update it with new comments.
+    `regenerate` summarizes the whole discussion again instead of updating an existing summary.
+    """
     # Check for existing summary
     result = await db.execute(
         select(PullRequestSummary).filter(PullRequestSummary.issue_id == pr_id)
     )
-    if result.scalar_one_or_none():
-        return None
+    existing_summary = result.scalar_one_or_none()
+    if existing_summary and not regenerate:
+        try:
+            return await update_pr_summary(db, existing_summary)
+        except PullRequestNotFoundError:
+            logger.error(f"Pull request with id {pr_id} not found")
+            return None
     
     try:
         summary, repo, pr = await generate_pr_summary(pr_id, db)
@@ -226,11 +456,28 @@ async def save_pr_summary(db: AsyncSession, pr_id: int) -> Optional[Tuple[str, R
         logger.error(f"Pull request with id {pr_id} not found")
         return None
     
-    pr_summary = PullRequestSummary(
-        issue_id=pr_id,
-        summarization=summary
+    result = await db.execute(
+        select(func.max(IssueComment.id)).filter(IssueComment.issue_id == pr_id)
     )
-    db.add(pr_summary)
+    last_comment_id = result.scalar_one_or_none()
+    prompt_version, model_version = pr_summary_version()
+    if existing_summary:
+        # Re-summarized with a newer prompt or model, commit summaries built on it stay valid
+        existing_summary.summarization = summary
+        existing_summary.last_comment_id = last_comment_id
+        existing_summary.prompt_version = prompt_version
+        existing_summary.model_version = model_version
+        existing_summary.updated_at = datetime.now(timezone.utc)
+    else:
+        pr_summary = PullRequestSummary(
+            issue_id=pr_id,
+            summarization=summary,
+            last_comment_id=last_comment_id,
+            prompt_version=prompt_version,
+            model_version=model_version,
+        )
+        db.add(pr_summary)
+        await mark_pr_commit_summaries_stale(db, pr)
     await db.commit()
     return summary, repo, pr
 
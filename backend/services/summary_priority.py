@@ -0,0 +1,80 @@
+import math
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
+from backend.config.settings import settings
+
+# Scheduler lanes, lower runs first
+LANE_REQUESTED = 0
+LANE_DEFAULT = 1
+
+
+@dataclass
+class PendingCommit:
+    commit_id: int
+    repository_id: int
+    # Linked pull request, if the commit references one
+    pr_id: Optional[int]
+    pr_summarized: bool
+    # 1 for the newest commit of its repository
+    recency_rank: int
+
+
+def decayed_query_score(query_score: float, last_queried_at: Optional[datetime], now: datetime = None) -> float:
+    """Query traffic counter with exponential decay, so old traffic stops dominating priorities"""
+    if not query_score or last_queried_at is None:
+        return 0.0
+    now = now or datetime.now(timezone.utc)
+    age_hours = max(0.0, (now - last_queried_at).total_seconds() / 3600)
+    return query_score * 0.5 ** (age_hours / settings.summary_query_half_life_hours)
+
+
+def repository_weight(query_score: float) -> float:
+    """Share of summary work a repository gets, grows logarithmically with its search traffic"""
+    return 1.0 + math.log1p(query_score)
+
+
+def _weighted_fair_order(commits: List[PendingCommit], weights: Dict[int, float]) -> List[Tuple[float, PendingCommit]]:
+    """
+    Weighted fair queueing across repositories: the k-th newest pending commit of a repository gets
+    virtual finish time k / weight, so repositories are interleaved in proportion to their weights
+    and each repository's newest commits go first.
+    """
+    ordered = []
+    served: Dict[int, int] = {}
+    for commit in sorted(commits, key=lambda c: c.recency_rank):
+        served[commit.repository_id] = served.get(commit.repository_id, 0) + 1
+        ordered.append((served[commit.repository_id] / weights.get(commit.repository_id, 1.0), commit))
+    ordered.sort(key=lambda item: item[0])
+    return ordered
+
+
+def prioritize_commits(
+    commits: List[PendingCommit],
+    weights: Dict[int, float],
+    requested_repository_ids: Set[int],
+    limit: int,
+    requested_limit: int = None,
+    requested_window: int = None,
+) -> List[Tuple[Tuple, PendingCommit]]:
+    """
+    Pick the commits to summarize in this run and their scheduler priority.
+
+    Explicitly requested (e.g. newly initialized) repositories get their own lane with an extra budget
+    for their latest `requested_window` commits, everything else shares `limit` by weighted fair queueing.
+    """
+    requested_limit = settings.summary_requested_commits_per_run if requested_limit is None else requested_limit
+    requested_window = settings.summary_requested_commit_window if requested_window is None else requested_window
+
+    requested = [
+        c for c in commits
+        if c.repository_id in requested_repository_ids and c.recency_rank <= requested_window
+    ]
+    requested_order = _weighted_fair_order(requested, weights)[:requested_limit]
+    picked = {commit.commit_id for _, commit in requested_order}
+    default_order = _weighted_fair_order([c for c in commits if c.commit_id not in picked], weights)[:limit]
+
+    return (
+        [((LANE_REQUESTED, finish), commit) for finish, commit in requested_order]
+        + [((LANE_DEFAULT, finish), commit) for finish, commit in default_order]
+    )
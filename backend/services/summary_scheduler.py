@@ -0,0 +1,97 @@
+import asyncio
+import heapq
+import itertools
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Iterable, List, Set, Tuple
+from backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# (kind, id), e.g. ("readme", repository_id), ("pr", issue_id), ("commit", commit_id)
+JobKey = Tuple[str, int]
+
+
+@dataclass
+class SummaryJob:
+    key: JobKey
+    run: Callable[[], Awaitable]
+    priority: Tuple = ()
+    dependencies: Set[JobKey] = field(default_factory=set)
+    dependents: Set[JobKey] = field(default_factory=set)
+
+
+@dataclass
+class SchedulerResult:
+    completed: List[JobKey] = field(default_factory=list)
+    failed: List[JobKey] = field(default_factory=list)
+    deferred: List[JobKey] = field(default_factory=list)
+
+
+class SummaryJobScheduler:
+    """
+    Runs summary jobs as a DAG: a job starts only after every job it depends on has succeeded.
+
+    Ready jobs run in priority order (lower first) with bounded concurrency. Dependents of a failed
+    job are deferred to the next run instead of being summarized without their context.
+    Dependencies on jobs that are not part of the graph are treated as already satisfied.
+    """
+
+    def __init__(self, max_concurrency: int = 1):
+        self.max_concurrency = max_concurrency
+        self.jobs: Dict[JobKey, SummaryJob] = {}
+
+    def add_job(self, key: JobKey, run: Callable[[], Awaitable], priority: Tuple = (), depends_on: Iterable[JobKey] = ()) -> None:
+        if key in self.jobs:
+            return
+        self.jobs[key] = SummaryJob(key=key, run=run, priority=priority, dependencies=set(depends_on))
+
+    def _link(self) -> Dict[JobKey, int]:
+        unmet = {}
+        for job in self.jobs.values():
+            job.dependencies = {dep for dep in job.dependencies if dep in self.jobs and dep != job.key}
+            for dep in job.dependencies:
+                self.jobs[dep].dependents.add(job.key)
+            unmet[job.key] = len(job.dependencies)
+        return unmet
+
+    def _defer_dependents(self, key: JobKey, result: SchedulerResult, blocked: Set[JobKey]) -> None:
+        for dependent in self.jobs[key].dependents:
+            if dependent not in blocked:
+                blocked.add(dependent)
+                result.deferred.append(dependent)
+                self._defer_dependents(dependent, result, blocked)
+
+    async def run(self) -> SchedulerResult:
+        unmet = self._link()
+        counter = itertools.count()
+        ready = []
+        for job in self.jobs.values():
+            if unmet[job.key] == 0:
+                heapq.heappush(ready, (job.priority, next(counter), job.key))
+
+        result = SchedulerResult()
+        blocked: Set[JobKey] = set()
+        running: Dict[asyncio.Task, JobKey] = {}
+
+        while ready or running:
+            while ready and len(running) < self.max_concurrency:
+                _, _, key = heapq.heappop(ready)
+                running[asyncio.create_task(self.jobs[key].run())] = key
+
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                key = running.pop(task)
+                if task.exception() is not None:
+                    logger.error(f"Summary job {key} failed: {task.exception()}")
+                    result.failed.append(key)
+                    self._defer_dependents(key, result, blocked)
+                    continue
+                result.completed.append(key)
+                for dependent in self.jobs[key].dependents:
+                    unmet[dependent] -= 1
+                    if unmet[dependent] == 0 and dependent not in blocked:
+                        heapq.heappush(ready, (self.jobs[dependent].priority, next(counter), dependent))
+
+        finished = set(result.completed) | set(result.failed) | blocked
+        result.deferred.extend(key for key in self.jobs if key not in finished)
+        return result
@@ -1,13 +1,24 @@
+import asyncio
 import traceback
 import logging
+from functools import partial
 from sqlalchemy import select
-from datetime import datetime
+from datetime import datetime, timezone, time as dt_time
 from backend.utils.logger import get_logger
-from backend.services.summary_generator import save_commit_summary, get_commits_without_summaries, get_readme_without_summaries, get_prs_without_summaries, save_pr_summary
-from backend.services.readme_summarizer import ReadmeSummarizer
-from backend.models.repository import ReadmeSummary, Repository
+from backend.services.summary_generator import (
+    save_commit_summary, get_readme_without_summaries, get_prs_without_summaries, save_pr_summary, get_commit_data,
+    get_prs_with_new_comments, store_commit_summary, get_pending_commits, get_pr_repository_ids,
+    get_repository_priorities, search_unsummarized_commits, get_outdated_commit_summaries,
+    get_outdated_pr_summaries, get_tokens_spent
+)
+from backend.services.summary_priority import prioritize_commits
+from backend.services.llm_usage import llm_usage, usage_target
+from backend.services.summary_scheduler import SummaryJobScheduler, SchedulerResult
+from backend.services.readme_summarizer import ReadmeSummarizer, readme_hash
+from backend.services.commit_summarizer import LLMSummarizer
+from backend.models.repository import CommitSummary, ReadmeSummary, Repository
 from backend.services.vector_store import VectorStore
-from backend.config.settings import async_session
+from backend.config.settings import async_session, settings
 from backend.services.repository_service import repository_service
 
 logger = get_logger(__name__)
@@ -21,59 +32,243 @@ def log_info(msg):
 
 class SummaryService:
     def __init__(self):
-        self.vector_store = VectorStore()
+        self._vector_store = None
         self.is_running = False
+        self._background_jobs = set()
+        # Commit summaries in progress, shared by scheduled and query-time jobs
+        self._commit_jobs = {}
+        self._migration = None
+
+    @property
+    def vector_store(self) -> VectorStore:
+        # Created on first use, the service is instantiated at import time
+        if self._vector_store is None:
+            self._vector_store = VectorStore()
+        return self._vector_store
+
+    @property
+    def vector_store_loaded(self) -> bool:
+        return self._vector_store is not None
 
     async def process_all_summaries(self):
-        """Process both commits and README summaries in one go"""
+        """Process README, pull request and commit summaries in one go"""
         try:
             await self.periodic_repository_update()
-            await self.process_readmes()
-            await self.process_prs()
-            await self.process_commits()
-            log_info("Completed processing all summaries")
+            result = await self.schedule_summaries()
+            await llm_usage.flush()
+            log_info(
+                f"Completed processing all summaries: {len(result.completed)} done, "
+                f"{len(result.failed)} failed, {len(result.deferred)} deferred"
+            )
+            # Migration batches can take hours, they must not hold up the next summary run
+            if self._migration is None or self._migration.done():
+                self._migration = asyncio.create_task(self._run_migration())
         except Exception as e:
             logger.error(f"Error in unified summary processing: {str(e)} {traceback.format_exc()}")
 
-    async def process_commits(self):
-        """Process pending commit summaries"""
+    async def schedule_summaries(self) -> SchedulerResult:
+        """
+        Run pending summaries as a dependency graph: README -> pull request -> commit.
+        A commit is summarized only once its repository README and its pull request summaries are available.
+        """
+        commits_limit = settings.LLM_BATCH_BACKFILL_LIMIT if settings.LLM_BATCH_MODE else settings.summary_commits_per_run
+        async with async_session() as session:
+            async with session.begin():
+                readme_repo_ids = await get_readme_without_summaries(session)
+                pr_ids = await get_prs_without_summaries(session)
+                pr_ids += await get_prs_with_new_comments(session)
+                pr_repository_ids = await get_pr_repository_ids(session, pr_ids)
+                weights, requested_repo_ids = await get_repository_priorities(session)
+                candidates = await get_pending_commits(
+                    session, per_repository_limit=max(commits_limit, settings.summary_requested_commits_per_run)
+                )
+        commits = prioritize_commits(candidates, weights, requested_repo_ids, limit=commits_limit)
+        # Pull in summaries of pull requests the selected commits are waiting for
+        for _, commit in commits:
+            if commit.pr_id is not None and not commit.pr_summarized:
+                pr_repository_ids.setdefault(commit.pr_id, commit.repository_id)
+        log_info(f"Found {len(readme_repo_ids)} READMEs, {len(pr_repository_ids)} pull requests and {len(commits)} commits to process")
+
+        # Batches only fill up when many commits are waiting on them at once
+        max_concurrency = settings.LLM_BATCH_BACKFILL_LIMIT if settings.LLM_BATCH_MODE else settings.summary_max_concurrent_jobs
+        scheduler = SummaryJobScheduler(max_concurrency=max_concurrency)
+        for repo_id in readme_repo_ids:
+            scheduler.add_job(("readme", repo_id), partial(self._run_readme_job, repo_id), priority=(0,))
+        for pr_id, repo_id in pr_repository_ids.items():
+            scheduler.add_job(("pr", pr_id), partial(self._run_pr_job, pr_id, repo_id), priority=(1,), depends_on=[("readme", repo_id)])
+        for priority, commit in commits:
+            depends_on = [("readme", commit.repository_id)]
+            if commit.pr_id is not None:
+                depends_on.append(("pr", commit.pr_id))
+            scheduler.add_job(
+                ("commit", commit.commit_id),
+                partial(self._run_commit_job, commit.commit_id, commit.repository_id),
+                priority=(2, *priority),
+                depends_on=depends_on
+            )
+        return await scheduler.run()
+
+    async def summarize_for_query(self, repository_id: int, query: str, limit: int = None, timeout: float = None) -> int:
+        """
+        Summarize unsummarized commits whose message matches a search query, so they can be found right away.
+        Summaries that miss the latency budget keep running in the background and are stored for later queries.
+        Returns the number of commits summarized within the budget.
+        """
+        if settings.VECTOR_STORE_READ_ONLY:
+            # New summaries could not be added to the vector store here, the writer process summarizes them
+            return 0
+        limit = limit or settings.summary_on_demand_commits
+        timeout = timeout if timeout is not None else settings.summary_on_demand_timeout_seconds
+        async with async_session() as session:
+            commit_ids = await search_unsummarized_commits(session, repository_id, query, limit=limit)
+        if not commit_ids:
+            return 0
+
+        tasks = [asyncio.create_task(self._run_commit_job(commit_id, repository_id)) for commit_id in commit_ids]
+        done, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            self._background_jobs.add(task)
+            task.add_done_callback(self._background_jobs.discard)
+        for task in tasks:
+            task.add_done_callback(self._log_on_demand_failure)
+        log_info(f"Summarized {len(done)} of {len(commit_ids)} commits matching the query inline")
+        return sum(1 for task in done if not task.cancelled() and task.exception() is None)
+
+    @staticmethod
+    def _log_on_demand_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"On-demand commit summary failed: {task.exception()}")
+
+    async def _run_migration(self):
         try:
+            migrated = await self.migrate_outdated_summaries()
+            if migrated:
+                log_info(f"Re-summarized {migrated} outdated summaries")
+        except Exception as e:
+            logger.error(f"Error re-summarizing outdated summaries: {str(e)} {traceback.format_exc()}")
+
+    async def migrate_outdated_summaries(self) -> int:
+        """
+        Re-summarize pull requests and commits produced by an older prompt or model, most queried
+        repositories and newest items first, without exceeding the daily migration token budget
+        """
+        if settings.summary_migration_daily_token_budget <= 0:
+            return 0
+        await llm_usage.flush()
+        start_of_day = datetime.combine(datetime.now(timezone.utc).date(), dt_time.min, tzinfo=timezone.utc)
+        async with async_session() as session:
+            spent = await get_tokens_spent(session, ["pr_migration", "commit_migration"], since=start_of_day)
+            budget = settings.summary_migration_daily_token_budget - spent
+            if budget <= 0:
+                return 0
+            prs = await get_outdated_pr_summaries(session, limit=settings.summary_migration_per_run)
+            commits = await get_outdated_commit_summaries(session, limit=settings.summary_migration_per_run)
+
+        migrated = 0
+
+        async def migrate(kind, item_id, repo_id):
+            nonlocal budget, migrated
+            # Checked as each job starts, jobs already running can only overshoot it by their own cost
+            if budget <= 0:
+                return
+            with usage_target(f"{kind}_migration", item_id, repo_id) as target:
+                try:
+                    if kind == "pr":
+                        async with async_session() as session:
+                            async with session.begin():
+                                await save_pr_summary(session, item_id, regenerate=True)
+                    else:
+                        await self._summarize_commit(item_id, regenerate=True)
+                finally:
+                    budget -= target.tokens
+            migrated += 1
+
+        # Submitted together like the regular backlog, so in batch mode one batch carries the whole run
+        max_concurrency = settings.LLM_BATCH_BACKFILL_LIMIT if settings.LLM_BATCH_MODE else settings.summary_max_concurrent_jobs
+        scheduler = SummaryJobScheduler(max_concurrency=max_concurrency)
+        jobs = [("pr", pr_id, repo_id) for pr_id, repo_id in prs] + [("commit", commit_id, repo_id) for commit_id, repo_id in commits]
+        for position, (kind, item_id, repo_id) in enumerate(jobs[:settings.summary_migration_per_run]):
+            scheduler.add_job((kind, item_id), partial(migrate, kind, item_id, repo_id), priority=(position,))
+        await scheduler.run()
+        await llm_usage.flush()
+        return migrated
+
+    async def _run_readme_job(self, repo_id):
+        with usage_target("readme", repo_id, repo_id):
             async with async_session() as session:
                 async with session.begin():
-                    commits = await get_commits_without_summaries(session)
-
-            for commit_id in commits:
-                async with async_session() as session:
-                    async with session.begin():
-                        summary, repo, commit = await save_commit_summary(session, commit_id)
-                if summary:
-                    self.vector_store.add_summary(
-                        summary,
-                        {
-                            "type": "commit",
-                            "commit_id": commit_id,
-                            "repo_id": repo.id,
-                            "date": commit.committed_date.isoformat()
-                        }
-                    )
-                    log_info(f"Generated summary for commit {commit_id}")
-        except Exception as e:
-            logger.error(f"Error processing commits: {str(e)} {traceback.format_exc()}")
+                    await self._process_readme_summary(session, repo_id)
 
-    async def process_readmes(self):
-        """Process pending README summaries"""
-        try:
+    async def _run_pr_job(self, pr_id, repo_id=None):
+        with usage_target("pr", pr_id, repo_id):
             async with async_session() as session:
                 async with session.begin():
-                    repo_ids = await get_readme_without_summaries(session)
+                    await save_pr_summary(session, pr_id)
+        log_info(f"Generated summary for PR {pr_id}")
 
-            for repo_id in repo_ids:
-                async with async_session() as session:
-                    async with session.begin():
-                        await self._process_readme_summary(session, repo_id)
-                        log_info(f"Generated README summary for repository {repo_id}")
-        except Exception as e:
-            logger.error(f"Error processing READMEs: {str(e)} {traceback.format_exc()}")
+    async def _run_commit_job(self, commit_id, repo_id=None):
+        # A query can ask for a commit the scheduler is already summarizing, the second caller waits
+        # for the first one instead of paying for the same summary again
+        job = self._commit_jobs.get(commit_id)
+        if job is None:
+            job = asyncio.create_task(self._summarize_commit_job(commit_id, repo_id))
+            self._commit_jobs[commit_id] = job
+            job.add_done_callback(lambda _: self._commit_jobs.pop(commit_id, None))
+        # Shielded, so one caller giving up does not cancel the summary for the other
+        await asyncio.shield(job)
+
+    async def _summarize_commit_job(self, commit_id, repo_id=None):
+        with usage_target("commit", commit_id, repo_id):
+            await self._summarize_commit(commit_id)
+
+    async def _summarize_commit(self, commit_id, regenerate=False):
+        if settings.LLM_BATCH_MODE:
+            return await self._summarize_commit_batched(commit_id, regenerate=regenerate)
+
+        async with async_session() as session:
+            async with session.begin():
+                result = await save_commit_summary(session, commit_id, regenerate=regenerate)
+        if not result:
+            return
+        summary, repo, commit = result
+        await self.vector_store.aadd_summary(
+            summary,
+            {
+                "type": "commit",
+                "commit_id": commit_id,
+                "repo_id": repo.id,
+                "date": commit.committed_date.isoformat()
+            }
+        )
+        log_info(f"Generated summary for commit {commit_id}")
+
+    async def _summarize_commit_batched(self, commit_id, regenerate=False):
+        async with async_session() as session:
+            async with session.begin():
+                result = await session.execute(select(CommitSummary).filter(CommitSummary.commit_id == commit_id))
+                existing_summary = result.scalar_one_or_none()
+                if existing_summary and not existing_summary.is_stale and not regenerate:
+                    return
+                commit, diffs, pr, languages, readme_summary, repository, pr_summary = await get_commit_data(session, commit_id)
+
+        # Batches can take hours, so no transaction is held open while waiting for the results
+        summary = await LLMSummarizer(batch=True).summarize_commit(
+            commit, diffs, languages, readme_summary, repository, pr=pr, pr_summary=pr_summary
+        )
+
+        async with async_session() as session:
+            async with session.begin():
+                await store_commit_summary(session, commit_id, summary)
+        await self.vector_store.aadd_summary(
+            summary,
+            {
+                "type": "commit",
+                "commit_id": commit_id,
+                "repo_id": repository.id,
+                "date": commit.committed_date.isoformat()
+            }
+        )
+        log_info(f"Generated batch summary for commit {commit_id}")
 
     async def _process_readme_summary(self, session, repository_id):
         """Process a single README summary"""
@@ -86,7 +281,7 @@ class SummaryService:
             return
 
         summarizer = ReadmeSummarizer()
-        summary = summarizer.summarize(repository.readme_content)
+        summary = await summarizer.summarize(repository.readme_content)
         
         result = await session.execute(
             select(ReadmeSummary).filter(
@@ -97,32 +292,19 @@ class SummaryService:
         
         if existing_summary:
             existing_summary.summarization = summary
+            existing_summary.readme_hash = readme_hash(repository.readme_content)
+            existing_summary.updated_at = datetime.now(timezone.utc)
         else:
             readme_summary = ReadmeSummary(
                 repository_id=repository_id,
-                summarization=summary
+                summarization=summary,
+                readme_hash=readme_hash(repository.readme_content)
             )
             session.add(readme_summary)
         
         await session.flush()
         log_info(f"Generated README summary for repository {repository_id}")
 
-    async def process_prs(self):
-        """Process pending pull request summaries"""
-        try:
-            async with async_session() as session:
-                async with session.begin():
-                    prs = await get_prs_without_summaries(session)
-                    log_info("Found %d pull requests to process" % len(prs))
-
-            for pr_id in prs:
-                async with async_session() as session:
-                    async with session.begin():
-                        result = await save_pr_summary(session, pr_id)
-                log_info(f"Generated summary for PR {pr_id}")
-        except Exception as e:
-            logger.error(f"Error processing pull requests: {str(e)} {traceback.format_exc()}")
-
     async def periodic_repository_update(self):
         async with async_session() as session:
             async with session.begin():
@@ -0,0 +1,46 @@
+import hashlib
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Tuple
+from backend.services.model_backends import role_model_names
+
+PROMPTS_DIR = Path(__file__).parent.parent / "prompts"
+
+# Templates that shape a summary, a change to any of them makes existing summaries outdated
+COMMIT_PROMPTS = (
+    "repository_context.txt",
+    "diff_summarizer.txt",
+    "single_pass_summarizer.txt",
+    "chunk_summarizer.txt",
+    "chunk_summarizerv2.txt",
+)
+PR_PROMPTS = (
+    "repository_context.txt",
+    "pr_comments_summarizer.txt",
+    "pr_summaries_merger.txt",
+    "pr_single_pass_summarizer.txt",
+    "pr_discussion_summarizer.txt",
+)
+
+
+def _hash(parts: Iterable[str]) -> str:
+    return hashlib.sha256("\0".join(parts).encode()).hexdigest()[:16]
+
+
+@lru_cache()
+def prompt_version(prompts: Tuple[str, ...]) -> str:
+    return _hash((PROMPTS_DIR / name).read_text() for name in prompts)
+
+
+def model_version(roles: Tuple[str, ...] = ("diff", "chunk")) -> str:
+    return _hash(name for role in roles for name in role_model_names(role))
+
+
+def commit_summary_version() -> Tuple[str, str]:
+    """(prompt version, model version) a commit summary generated now would have"""
+    return prompt_version(COMMIT_PROMPTS), model_version()
+
+
+def pr_summary_version() -> Tuple[str, str]:
+    """(prompt version, model version) a pull request summary generated now would have"""
+    return prompt_version(PR_PROMPTS), model_version()
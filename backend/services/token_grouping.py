@@ -0,0 +1,143 @@
+import math
+import os
+import re
+from typing import Callable, List, TypeVar
+from backend.models.repository import CommitDiff, IssueComment
+
+T = TypeVar("T")
+
+Tokenizer = Callable[[str], int]
+
+HUNK_HEADER = re.compile(r'^@@ .* @@', re.MULTILINE)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used when a backend has no tokenizer of its own (~4 characters per token)"""
+    if not text:
+        return 0
+    return math.ceil(len(text) / 4)
+
+
+def split_lines(text: str, max_tokens: int, tokenizer: Tokenizer) -> List[str]:
+    """Split text on line boundaries into pieces of at most max_tokens (a single huge line stays whole)"""
+    pieces = []
+    current = []
+    current_size = 0
+    for line in text.splitlines(keepends=True):
+        line_size = tokenizer(line)
+        if current_size + line_size > max_tokens and current:
+            pieces.append("".join(current))
+            current = []
+            current_size = 0
+        current.append(line)
+        current_size += line_size
+    if current:
+        pieces.append("".join(current))
+    return pieces
+
+
+def split_diff_at_hunks(diff: str, max_tokens: int, tokenizer: Tokenizer) -> List[str]:
+    """Split a unified diff into pieces of at most max_tokens, cutting only between hunks when possible"""
+    starts = [m.start() for m in HUNK_HEADER.finditer(diff)]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    hunks = [diff[start:end] for start, end in zip(starts, starts[1:] + [len(diff)])]
+
+    pieces = []
+    current = ""
+    for hunk in hunks:
+        if tokenizer(hunk) > max_tokens:
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.extend(split_lines(hunk, max_tokens, tokenizer))
+        elif current and tokenizer(current + hunk) > max_tokens:
+            pieces.append(current)
+            current = hunk
+        else:
+            current += hunk
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def _split_oversized_diffs(diffs: List[CommitDiff], max_tokens: int, tokenizer: Tokenizer) -> List[CommitDiff]:
+    result = []
+    for diff in diffs:
+        if tokenizer(diff.diff_content) <= max_tokens:
+            result.append(diff)
+            continue
+        for piece in split_diff_at_hunks(diff.diff_content, max_tokens, tokenizer):
+            # Transient copies, never added to a session
+            result.append(CommitDiff(commit_id=diff.commit_id, file_path=diff.file_path, diff_content=piece))
+    return result
+
+
+def pack_diffs(diffs: List[CommitDiff], max_tokens: int, tokenizer: Tokenizer = estimate_tokens) -> List[List[CommitDiff]]:
+    """
+    Pack diffs into as few groups of at most max_tokens as possible.
+
+    Files from the same directory are kept together when the whole directory fits into one group,
+    directories are placed with first-fit-decreasing and oversized files are split at hunk boundaries.
+    """
+    pieces = _split_oversized_diffs(diffs, max_tokens, tokenizer)
+    order = {id(piece): i for i, piece in enumerate(pieces)}
+
+    by_directory = {}
+    for piece in pieces:
+        by_directory.setdefault(os.path.dirname(piece.file_path), []).append(piece)
+
+    units = []
+    for directory_pieces in by_directory.values():
+        sizes = [tokenizer(piece.diff_content) for piece in directory_pieces]
+        if sum(sizes) <= max_tokens:
+            units.append((sum(sizes), directory_pieces))
+        else:
+            units.extend((size, [piece]) for size, piece in zip(sizes, directory_pieces))
+
+    bins = []
+    for size, unit in sorted(units, key=lambda u: u[0], reverse=True):
+        for bin_ in bins:
+            if bin_[0] + size <= max_tokens:
+                bin_[0] += size
+                bin_[1].extend(unit)
+                break
+        else:
+            bins.append([size, list(unit)])
+
+    return [sorted(items, key=lambda piece: order[id(piece)]) for _, items in bins]
+
+
+def pack_sequential(items: List[T], sizes: List[int], max_tokens: int) -> List[List[T]]:
+    """Greedy order-preserving packing for inputs where order matters (e.g. discussion threads)"""
+    groups = []
+    current = []
+    current_size = 0
+    for item, size in zip(items, sizes):
+        if current_size + size > max_tokens and current:
+            groups.append(current)
+            current = []
+            current_size = 0
+        current.append(item)
+        current_size += size
+    if current:
+        groups.append(current)
+    return groups
+
+
+def split_oversized_comments(comments: List[IssueComment], max_tokens: int, tokenizer: Tokenizer = estimate_tokens) -> List[IssueComment]:
+    """Split comments that do not fit into one group on line boundaries, preserving their order"""
+    result = []
+    for comment in comments:
+        if tokenizer(comment.body or "") <= max_tokens:
+            result.append(comment)
+            continue
+        for piece in split_lines(comment.body, max_tokens, tokenizer):
+            result.append(IssueComment(
+                issue_id=comment.issue_id,
+                body=piece,
+                created_at=comment.created_at,
+                updated_at=comment.updated_at,
+                author_login=comment.author_login,
+            ))
+    return result
@@ -0,0 +1,181 @@
+import math
+import os
+from typing import List, Optional
+import faiss
+import numpy as np
+from backend.config.settings import settings
+
+INDEX_TYPES = ("flat", "hnsw", "ivfpq")
+
+# IVF-PQ needs enough vectors to train 256 centroids per subquantizer
+IVF_MIN_TRAIN_VECTORS = 256 * 39
+# 8-bit scalar quantization learns a value range per dimension
+SQ_MIN_TRAIN_VECTORS = 1000
+
+_SCALAR_QUANTIZERS = {"float16": faiss.ScalarQuantizer.QT_fp16, "sq8": faiss.ScalarQuantizer.QT_8bit}
+
+
+def index_type(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivfpq"
+    return "flat"
+
+
+def index_encoding(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexIVF):
+        return "pq"
+    storage = faiss.downcast_index(index.storage) if isinstance(index, faiss.IndexHNSW) else index
+    if isinstance(storage, faiss.IndexScalarQuantizer):
+        return next(name for name, qtype in _SCALAR_QUANTIZERS.items() if storage.sq.qtype == qtype)
+    if isinstance(storage, faiss.IndexPQ):
+        return "pq"
+    return "float32"
+
+
+def choose_encoding(count: int) -> str:
+    """VECTOR_STORE_ENCODING, or float32 while a shard is too small to train the quantizer"""
+    encoding = settings.VECTOR_STORE_ENCODING
+    if encoding == "pq" and count < IVF_MIN_TRAIN_VECTORS or encoding == "sq8" and count < SQ_MIN_TRAIN_VECTORS:
+        return "float32"
+    return encoding
+
+
+def is_lossy(index: faiss.Index) -> bool:
+    """Whether the index only holds compact codes, and so needs the float32 vectors kept on disk"""
+    return index_encoding(index) != "float32"
+
+
+def choose_index_type(count: int) -> str:
+    """Index type for a shard holding count vectors, VECTOR_STORE_INDEX_TYPE=auto picks it by size"""
+    configured = settings.VECTOR_STORE_INDEX_TYPE
+    if configured == "auto":
+        if count >= settings.VECTOR_STORE_IVFPQ_MIN_VECTORS:
+            configured = "ivfpq"
+        elif count >= settings.VECTOR_STORE_HNSW_MIN_VECTORS:
+            configured = "hnsw"
+        else:
+            configured = "flat"
+    if configured == "ivfpq" and count < IVF_MIN_TRAIN_VECTORS:
+        return "flat"
+    return configured
+
+
+def ivf_nlist(count: int) -> int:
+    # ~4 sqrt(n) inverted lists, with the 39 training points per centroid k-means asks for
+    return max(1, min(int(4 * math.sqrt(count)), count // 39))
+
+
+def pq_subquantizers(dimension: int) -> int:
+    """Largest divisor of the dimension up to VECTOR_STORE_PQ_SUBQUANTIZERS"""
+    return max(m for m in range(1, min(dimension, settings.VECTOR_STORE_PQ_SUBQUANTIZERS) + 1) if dimension % m == 0)
+
+
+def build_index(kind: str, dimension: int, vectors: np.ndarray = None, encoding: str = None) -> faiss.Index:
+    """Create an index of the given type, train it on the vectors if it needs training and add them"""
+    if vectors is None:
+        vectors = np.empty((0, dimension), dtype=np.float32)
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    encoding = encoding or choose_encoding(len(vectors))
+    if kind == "hnsw":
+        if encoding in _SCALAR_QUANTIZERS:
+            index = faiss.IndexHNSWSQ(dimension, _SCALAR_QUANTIZERS[encoding], settings.VECTOR_STORE_HNSW_M)
+        elif encoding == "pq":
+            index = faiss.IndexHNSWPQ(dimension, pq_subquantizers(dimension), settings.VECTOR_STORE_HNSW_M)
+        else:
+            index = faiss.IndexHNSWFlat(dimension, settings.VECTOR_STORE_HNSW_M)
+        index.hnsw.efConstruction = settings.VECTOR_STORE_HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = settings.VECTOR_STORE_HNSW_EF_SEARCH
+        if not index.is_trained:
+            index.train(vectors)
+    elif kind == "ivfpq":
+        nlist = ivf_nlist(len(vectors))
+        index = faiss.IndexIVFPQ(faiss.IndexFlatL2(dimension), dimension, nlist, pq_subquantizers(dimension), 8)
+        # Training on a sample is as good as on everything and much faster for large shards
+        sample = vectors
+        if len(vectors) > nlist * 256:
+            sample = vectors[np.random.default_rng(0).choice(len(vectors), nlist * 256, replace=False)]
+        index.train(sample)
+        index.nprobe = settings.VECTOR_STORE_IVF_NPROBE
+        # Needed to reconstruct vectors when the index is rebuilt
+        index.set_direct_map_type(faiss.DirectMap.Hashtable)
+    elif encoding in _SCALAR_QUANTIZERS:
+        index = faiss.IndexScalarQuantizer(dimension, _SCALAR_QUANTIZERS[encoding], faiss.METRIC_L2)
+        index.train(vectors)
+    elif encoding == "pq":
+        index = faiss.IndexPQ(dimension, pq_subquantizers(dimension), 8)
+        index.train(vectors)
+    else:
+        index = faiss.IndexFlatL2(dimension)
+    if len(vectors):
+        index.add(vectors)
+    return index
+
+
+def search_parameters(index: faiss.Index, ef_search: int = None, nprobe: int = None) -> Optional[faiss.SearchParameters]:
+    """Per-query efSearch/nprobe overrides, None keeps the values stored on the index"""
+    kind = index_type(index)
+    if kind == "hnsw" and ef_search:
+        return faiss.SearchParametersHNSW(efSearch=ef_search)
+    if kind == "ivfpq" and nprobe:
+        return faiss.SearchParametersIVF(nprobe=nprobe)
+    return None
+
+
+def rebuild_reason(index: faiss.Index, live_count: int) -> Optional[str]:
+    """Why a shard's index should be rebuilt from its live vectors, None if it is fine as it is"""
+    dead = index.ntotal - live_count
+    if dead >= settings.VECTOR_STORE_REBUILD_MIN_DEAD and dead > settings.VECTOR_STORE_REBUILD_DEAD_FRACTION * index.ntotal:
+        return f"{dead} replaced vectors"
+    current, target = index_type(index), choose_index_type(live_count)
+    # Under auto, shards only move up to more scalable index types, never back down
+    if target != current and (settings.VECTOR_STORE_INDEX_TYPE != "auto" or INDEX_TYPES.index(target) > INDEX_TYPES.index(current)):
+        return f"{current} to {target}"
+    if current != "ivfpq" and index_encoding(index) != choose_encoding(live_count):
+        return f"{index_encoding(index)} to {choose_encoding(live_count)} vectors"
+    if current == "ivfpq" and ivf_nlist(live_count) >= 2 * faiss.extract_index_ivf(index).nlist:
+        return "IVF lists outgrown"
+    return None
+
+
+class FullPrecisionVectors:
+    """
+    Append-only float32 copies of a shard's vectors on disk, next to an index that only keeps compact
+    codes in memory, row i holding the vector at index position i. Read back to re-rank candidates and
+    to rebuild the index without compounding quantization error. Rows of replaced documents are dropped
+    when the shard is rebuilt.
+    """
+
+    def __init__(self, path: str, dimension: int, truncate: bool = False, read_only: bool = False):
+        self.path = path
+        self.row_bytes = dimension * np.dtype(np.float32).itemsize
+        self._file = open(path, "rb" if read_only else "w+b" if truncate else "a+b")
+        self.count = os.path.getsize(path) // self.row_bytes
+        if not read_only:
+            # Rows past the last complete one come from a crash in the middle of an append
+            self._file.truncate(self.count * self.row_bytes)
+
+    def append(self, vectors) -> List[int]:
+        data = np.ascontiguousarray(vectors, dtype=np.float32)
+        self._file.write(data.tobytes())
+        self._file.flush()
+        slots = list(range(self.count, self.count + len(data)))
+        self.count += len(data)
+        return slots
+
+    def truncate(self, count: int) -> None:
+        self._file.truncate(count * self.row_bytes)
+        self.count = count
+
+    def get(self, slots: List[int]) -> np.ndarray:
+        fd = self._file.fileno()
+        return np.stack([
+            np.frombuffer(os.pread(fd, self.row_bytes, slot * self.row_bytes), dtype=np.float32) for slot in slots
+        ])
+
+    def sync(self) -> None:
+        os.fsync(self._file.fileno())
+
+    def close(self) -> None:
+        self._file.close()
@@ -1,19 +1,482 @@
-from langchain_openai import OpenAIEmbeddings
-from langchain_community.vectorstores import FAISS
 from backend.config.settings import settings
-from langchain_community.docstore.in_memory import InMemoryDocstore
+from backend.services.embeddings import EmbeddingBatcher, create_embeddings, embedding_dimension, split_batches
+from backend.services.vector_index import (
+    FullPrecisionVectors, build_index, choose_index_type, index_encoding, is_lossy, rebuild_reason,
+    search_parameters,
+)
+from backend.services.vector_store_wal import WriteAheadLog, decode_vector, encode_vector
+from backend.utils.logger import get_logger
+from langchain_core.documents import Document
+from collections import OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+import asyncio
+import faiss
+import heapq
+import itertools
+import json
 import os
+import pickle
+import shutil
+import threading
 import time
-import faiss
-from langchain_core.documents import Document
+import numpy as np
 from pathlib import Path
 import logging
 
 logging.disable(logging.WARNING)
 logging.getLogger('sqlalchemy').setLevel(logging.ERROR)
 
+logger = get_logger(__name__)
+
+
+# Index rebuilds run one at a time, off the event loop
+_rebuild_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="vector-index-rebuild")
+
+
+def _commit_id(doc_id) -> int:
+    """Commit of a log record or legacy docstore id ("commit-<id>"), -1 for documents without a commit"""
+    if isinstance(doc_id, int):
+        return doc_id
+    if isinstance(doc_id, str) and doc_id.startswith("commit-"):
+        return int(doc_id[len("commit-"):])
+    return -1
+
+
+class VectorShard:
+    """
+    One repository's FAISS index with its own write-ahead log. The shard only knows the commit each
+    vector belongs to, as an int64 array of commit ids by index position; the summaries themselves
+    are read from commit_summaries (see DocumentCache).
+
+    HNSW cannot remove vectors, so a replaced summary's old vector stays in the index with its id set
+    to -1 until the next rebuild. Rebuilds also switch the index type as the shard grows (see
+    vector_index.rebuild_reason); they run in the background on a snapshot of the live vectors and
+    replay the changes made meanwhile before the new index is swapped in.
+
+    When the index holds lossy codes (a compact VECTOR_STORE_ENCODING or IVF-PQ) the float32 vectors
+    are also kept on disk in <shard>.vectors.<n>, in index order. Every rebuild starts a new generation n.
+
+    A snapshot is a directory with the raw FAISS index (index.faiss), the commit ids (ids.npy) and
+    snapshot.json. Read-only shards memory-map index.faiss and ids.npy, so worker processes share one
+    copy of them through the page cache, and never write anything.
+    """
+
+    def __init__(self, path: str, dimension: int, read_only: bool = False):
+        self.path = path
+        self.dimension = dimension
+        self.read_only = read_only
+        self.wal = WriteAheadLog(f"{path}.wal", fsync=settings.VECTOR_STORE_WAL_FSYNC)
+        self._lock = threading.Lock()
+        self._rebuild = None
+        # Commit ids upserted while a rebuild is running
+        self._changed = set()
+        # The in-memory index differs from the snapshot by more than the log, e.g. after a rebuild
+        self._dirty = False
+        self.index = None
+        self.ids = np.empty(0, dtype=np.int64)
+        self._live = 0
+        self.full_vectors = None
+        # Full vectors should be on disk but are missing for some positions, the next rebuild writes them
+        self._missing_full_vectors = False
+        self._load_or_create_store()
+        self._last_checkpoint = time.monotonic()
+        self._maybe_rebuild()
+
+    def _load_or_create_store(self):
+        if not self.read_only:
+            # A crash between the renames of a checkpoint leaves only the previous snapshot behind
+            if not os.path.exists(self.path) and os.path.exists(f"{self.path}.old"):
+                os.rename(f"{self.path}.old", self.path)
+            shutil.rmtree(f"{self.path}.tmp", ignore_errors=True)
+
+        self._generation = 0
+        legacy_slots = None
+        self._snapshot = self._snapshot_identity()
+        while self._snapshot is not None:
+            legacy_slots = self._read_snapshot()
+            identity = self._snapshot_identity()
+            if not self.read_only or identity in (None, self._snapshot):
+                break
+            # A writer published a new snapshot while this one was read
+            self._snapshot = identity
+        if self._snapshot is None:
+            # Written to disk at the first checkpoint
+            self.index = build_index(choose_index_type(0), self.dimension)
+        self._live = int(np.count_nonzero(self.ids >= 0))
+
+        vectors_path = self._vectors_path(self._generation)
+        if self.read_only:
+            if legacy_slots is None and os.path.exists(vectors_path):
+                full_vectors = FullPrecisionVectors(vectors_path, self.dimension, read_only=True)
+                if full_vectors.count >= self.index.ntotal:
+                    self.full_vectors = full_vectors
+                else:
+                    full_vectors.close()
+            return
+        if legacy_slots:
+            self._align_full_vectors(legacy_slots)
+        self._remove_stale_vector_files()
+        if is_lossy(self.index):
+            full_vectors = FullPrecisionVectors(self._vectors_path(self._generation), self.dimension)
+            if full_vectors.count >= self.index.ntotal:
+                # Rows past the snapshot belong to inserts from the log, replayed below
+                full_vectors.truncate(self.index.ntotal)
+                self.full_vectors = full_vectors
+            else:
+                # Stored while the index only held float32 vectors
+                full_vectors.close()
+                self._missing_full_vectors = True
+
+        # Inserts since the last checkpoint
+        ids, vectors = [], []
+        for record in self.wal.replay():
+            commit_id = _commit_id(record["id"])
+            if commit_id >= 0:
+                ids.append(commit_id)
+                vectors.append(decode_vector(record["vector"]))
+        if ids:
+            self.upsert(ids, vectors)
+
+    def _snapshot_path(self) -> str:
+        # A reader can look between the two renames of a writer's checkpoint
+        return self.path if os.path.exists(self.path) or not self.read_only else f"{self.path}.old"
+
+    def _snapshot_identity(self):
+        """Changes whenever a checkpoint publishes a new snapshot, None without one"""
+        try:
+            stat = os.stat(os.path.join(self._snapshot_path(), "index.faiss"))
+        except FileNotFoundError:
+            return None
+        return stat.st_ino, stat.st_mtime_ns
+
+    def is_stale(self) -> bool:
+        """Whether a writer has published a newer snapshot than the one this read-only shard serves"""
+        identity = self._snapshot_identity()
+        return self.read_only and identity is not None and identity != self._snapshot
+
+    def _read_snapshot(self):
+        """Load the snapshot, returns the full vector rows of legacy snapshots by index position"""
+        path = self._snapshot_path()
+        if os.path.exists(os.path.join(path, "ids.npy")):
+            flags = faiss.IO_FLAG_MMAP_IFC | faiss.IO_FLAG_READ_ONLY if self.read_only else 0
+            self.index = faiss.read_index(os.path.join(path, "index.faiss"), flags)
+            self.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r" if self.read_only else None)
+            with open(os.path.join(path, "snapshot.json"), encoding="utf-8") as f:
+                self._generation = json.load(f)["full_vectors_generation"]
+            return None
+
+        # Written while the shard kept summary texts in a docstore, the next checkpoint converts it
+        self.index = faiss.read_index(os.path.join(path, "index.faiss"))
+        positions, slots = {}, {}
+        if os.path.exists(os.path.join(path, "index.pkl")):
+            with open(os.path.join(path, "index.pkl"), "rb") as f:
+                _, index_to_docstore_id = pickle.load(f)
+            positions = {doc_id: position for position, doc_id in index_to_docstore_id.items()}
+            if os.path.exists(os.path.join(path, "full_vectors.pkl")):
+                with open(os.path.join(path, "full_vectors.pkl"), "rb") as f:
+                    self._generation, doc_slots = pickle.load(f)
+                slots = {positions[doc_id]: slot for doc_id, slot in doc_slots.items() if doc_id in positions}
+        else:
+            with open(os.path.join(path, "documents.jsonl"), encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    positions[record["id"]] = record["position"]
+                    if "slot" in record:
+                        slots[record["position"]] = record["slot"]
+            with open(os.path.join(path, "snapshot.json"), encoding="utf-8") as f:
+                self._generation = json.load(f)["full_vectors_generation"]
+        self.ids = np.full(self.index.ntotal, -1, dtype=np.int64)
+        for doc_id, position in positions.items():
+            self.ids[position] = _commit_id(doc_id)
+        self._dirty = not self.read_only
+        return slots
+
+    def _align_full_vectors(self, slots: dict):
+        """Copy the full vectors of a legacy snapshot, stored in insertion order, into index order"""
+        legacy_path = self._vectors_path(self._generation)
+        if not os.path.exists(legacy_path):
+            return
+        legacy = FullPrecisionVectors(legacy_path, self.dimension, read_only=True)
+        aligned = FullPrecisionVectors(self._vectors_path(self._generation + 1), self.dimension, truncate=True)
+        for start in range(0, self.index.ntotal, 10_000):
+            positions = np.arange(start, min(start + 10_000, self.index.ntotal), dtype=np.int64)
+            # Positions without a row only have their in-memory codes
+            rows = self.index.reconstruct_batch(positions)
+            known = [i for i, position in enumerate(positions.tolist()) if position in slots]
+            if known:
+                rows[known] = legacy.get([slots[int(positions[i])] for i in known])
+            aligned.append(rows)
+        aligned.sync()
+        legacy.close()
+        aligned.close()
+        self._generation += 1
+
+    def _write_snapshot(self, path: str):
+        os.makedirs(path)
+        faiss.write_index(self.index, os.path.join(path, "index.faiss"))
+        np.save(os.path.join(path, "ids.npy"), self.ids)
+        with open(os.path.join(path, "snapshot.json"), "w", encoding="utf-8") as f:
+            json.dump({"full_vectors_generation": self._generation}, f)
+
+    def _vectors_path(self, generation: int) -> str:
+        return f"{self.path}.vectors.{generation}"
+
+    def _remove_stale_vector_files(self):
+        """Generations the current snapshot does not use, left behind by rebuilds or by a float32 index"""
+        directory, name = os.path.split(self.path)
+        current = os.path.basename(self._vectors_path(self._generation)) if is_lossy(self.index) else None
+        for entry in os.listdir(directory or "."):
+            if entry.startswith(f"{name}.vectors.") and entry != current:
+                os.remove(os.path.join(directory, entry))
+
+    def _full_vectors(self, positions: np.ndarray) -> np.ndarray:
+        """float32 vectors at the given index positions, from disk when the index only keeps compact codes"""
+        if self.full_vectors is not None:
+            return self.full_vectors.get(positions.tolist())
+        # Lossless for float32 indexes; vectors stored before a compact encoding was enabled
+        # only have their in-memory codes until the next rebuild writes them to disk
+        return self.index.reconstruct_batch(positions)
+
+    def upsert(self, ids: list, vectors: list):
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), self.dimension)
+        if len(np.unique(ids)) < len(ids):
+            # A commit summarized twice in one batch only keeps its last vector
+            _, last = np.unique(ids[::-1], return_index=True)
+            keep = np.sort(len(ids) - 1 - last)
+            ids, vectors = ids[keep], vectors[keep]
+        replaced = np.flatnonzero(np.isin(self.ids, ids))
+        self.ids[replaced] = -1
+        if self.full_vectors is not None:
+            self.full_vectors.append(vectors)
+        self.index.add(vectors)
+        self.ids = np.concatenate([self.ids, ids])
+        self._live += len(ids) - len(replaced)
+        if self._rebuild is not None:
+            self._changed.update(ids.tolist())
+
+    def apply(self, ids: list, vectors: list):
+        """Insert or replace the vectors of the given commit ids"""
+        if self.read_only:
+            # Adding to a memory-mapped index aborts the process instead of raising
+            raise RuntimeError(f"Vector store shard {self.path} is opened read-only")
+        with self._lock:
+            # Logged before it is applied, the full index is only rewritten at checkpoints
+            self.wal.append([
+                {"id": int(commit_id), "vector": encode_vector(vector)} for commit_id, vector in zip(ids, vectors)
+            ])
+            self.upsert(ids, vectors)
+        if (
+            len(self.wal) >= settings.VECTOR_STORE_CHECKPOINT_EVERY
+            or time.monotonic() - self._last_checkpoint >= settings.VECTOR_STORE_CHECKPOINT_SECONDS
+        ):
+            self.checkpoint()
+        self._maybe_rebuild()
+
+    def _maybe_rebuild(self):
+        if self._rebuild is not None or self.read_only:
+            return
+        with self._lock:
+            # Inserts from several threads can get here together
+            if self._rebuild is not None:
+                return
+            reason = rebuild_reason(self.index, self._live)
+            if reason is None and self._missing_full_vectors:
+                reason = "full vectors missing on disk"
+            if reason is None:
+                return
+            live = np.flatnonzero(self.ids >= 0)
+            vectors = self._full_vectors(live) if len(live) else None
+            self._changed = set()
+            self._rebuild = _rebuild_pool.submit(self._rebuild_index, self.ids[live], vectors, choose_index_type(len(live)))
+        logger.info(f"Rebuilding the {os.path.basename(self.path)} index: {reason}")
+
+    def _rebuild_index(self, ids: np.ndarray, vectors, kind: str):
+        full_vectors = None
+        try:
+            index = build_index(kind, self.dimension, vectors)
+            if is_lossy(index):
+                full_vectors = FullPrecisionVectors(self._vectors_path(self._generation + 1), self.dimension, truncate=True)
+                if len(ids):
+                    full_vectors.append(vectors)
+        except Exception as e:
+            logger.error(f"Failed to rebuild the {os.path.basename(self.path)} index: {e}")
+            index = None
+        with self._lock:
+            if index is not None:
+                if self._changed:
+                    # Changes made while the index was built: drop the snapshot's version and add the current one
+                    changed = np.fromiter(self._changed, dtype=np.int64)
+                    ids[np.isin(ids, changed)] = -1
+                    positions = np.flatnonzero(np.isin(self.ids, changed))
+                    if len(positions):
+                        changed_vectors = self._full_vectors(positions)
+                        index.add(changed_vectors)
+                        if full_vectors is not None:
+                            full_vectors.append(changed_vectors)
+                        ids = np.concatenate([ids, self.ids[positions]])
+                self.index, self.ids = index, ids
+                if self.full_vectors is not None:
+                    # The old generation stays on disk until a snapshot refers to the new one
+                    self.full_vectors.close()
+                self.full_vectors = full_vectors
+                self._missing_full_vectors = False
+                # Also without full vectors, so rows of the old positions are never read back
+                self._generation += 1
+                self._dirty = True
+            self._changed = set()
+            self._rebuild = None
+
+    def wait_for_rebuild(self):
+        rebuild = self._rebuild
+        if rebuild is not None:
+            rebuild.result()
+
+    def checkpoint(self):
+        """Write a snapshot of the index and commit ids and start a new log"""
+        with self._lock:
+            if self.read_only or not len(self.wal) and not self._dirty:
+                return
+            tmp_path, old_path = f"{self.path}.tmp", f"{self.path}.old"
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            if self.full_vectors is not None:
+                self.full_vectors.sync()
+            self._write_snapshot(tmp_path)
+            if os.path.exists(self.path):
+                os.rename(self.path, old_path)
+            os.rename(tmp_path, self.path)
+            shutil.rmtree(old_path, ignore_errors=True)
+            if self._rebuild is None:
+                self._remove_stale_vector_files()
+            # Replaying the log on top of the new snapshot is harmless, so a crash before this is safe
+            self.wal.truncate()
+            self._dirty = False
+            self._last_checkpoint = time.monotonic()
+
+    def close(self):
+        """Finish a running rebuild, checkpoint and release the files, before the shard is dropped"""
+        self.wait_for_rebuild()
+        self.checkpoint()
+        with self._lock:
+            self.wal.close()
+            if self.full_vectors is not None:
+                self.full_vectors.close()
+
+    def search(self, vector: list, k: int, ef_search: int = None, nprobe: int = None) -> list:
+        """(commit_id, L2 distance) pairs, closest first"""
+        query = np.asarray([vector], dtype=np.float32)
+        with self._lock:
+            index, ids = self.index, self.ids
+            if not self._live:
+                return []
+            params = search_parameters(index, ef_search, nprobe)
+            # Compact codes only approximate the distances, re-rank a wider candidate list exactly
+            lossy = self.full_vectors is not None and index_encoding(index) != "float32"
+            rerank = settings.VECTOR_STORE_RERANK_CANDIDATES if lossy else 0
+            wanted = max(k, rerank)
+            # Replaced vectors take up some of the hits, fetch extra
+            fetch = wanted + min(index.ntotal - self._live, 4 * wanted)
+            while True:
+                distances, positions = index.search(query, min(fetch, index.ntotal), params=params)
+                distances, positions = distances[0], positions[0]
+                found = positions >= 0
+                distances, positions = distances[found], positions[found]
+                live = ids[positions] >= 0
+                distances, positions = distances[live], positions[live]
+                if len(positions) >= wanted or fetch >= index.ntotal:
+                    break
+                fetch *= 4
+            distances, positions = distances[:wanted], positions[:wanted]
+            if rerank and len(positions):
+                distances = ((self._full_vectors(positions) - query) ** 2).sum(axis=1)
+                order = np.argsort(distances, kind="stable")
+                distances, positions = distances[order], positions[order]
+            commit_ids = ids[positions[:k]]
+        return [(int(commit_id), float(distance)) for commit_id, distance in zip(commit_ids, distances[:k])]
+
+    def __len__(self) -> int:
+        return self._live
+
+
+async def fetch_commit_documents(commit_ids: list) -> dict:
+    """Summaries of the given commits from commit_summaries, by commit id"""
+    from backend.config.settings import async_session
+    from backend.db.database import get_commit_summaries_by_commit_ids
+
+    async with async_session() as session:
+        rows = await get_commit_summaries_by_commit_ids(session, commit_ids)
+    return {
+        commit.id: Document(
+            page_content=summary.summary,
+            metadata={
+                "type": "commit",
+                "commit_id": commit.id,
+                "repo_id": commit.repository_id,
+                "date": commit.committed_date.isoformat(),
+            },
+        )
+        for summary, commit in rows
+    }
+
+
+class DocumentCache:
+    """
+    Summaries of recently added and found commits, least recently used ones are dropped first.
+    Misses are read in one query through fetch, by default from commit_summaries.
+    """
+
+    def __init__(self, fetch, max_size: int = None):
+        self.fetch = fetch
+        self.max_size = settings.VECTOR_STORE_DOCUMENT_CACHE_SIZE if max_size is None else max_size
+        self._documents: OrderedDict[int, Document] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, commit_id: int, document: Document):
+        with self._lock:
+            self._documents[commit_id] = document
+            self._documents.move_to_end(commit_id)
+            while len(self._documents) > self.max_size:
+                self._documents.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
+
+    async def get_many(self, commit_ids: list) -> dict:
+        """Documents of the given commits, commits without a summary are left out"""
+        found, missing = {}, []
+        with self._lock:
+            for commit_id in commit_ids:
+                if commit_id in self._documents:
+                    self._documents.move_to_end(commit_id)
+                    found[commit_id] = self._documents[commit_id]
+                else:
+                    missing.append(commit_id)
+        if missing:
+            fetched = await self.fetch(missing)
+            for commit_id, document in fetched.items():
+                self.put(commit_id, document)
+            found.update(fetched)
+        return found
+
+    def __len__(self) -> int:
+        return len(self._documents)
+
+
 class VectorStore:
+    """
+    Summary embeddings, one index shard per repository.
+
+    Shards are loaded on first use and the least recently used ones are checkpointed and dropped
+    once more than VECTOR_STORE_MAX_LOADED_SHARDS are in memory. A search for one repository only
+    touches that repository's shard; a search without a repo_id filter fans out over all shards.
+    Shards hold commit ids only, search_similar fills in the summaries from the document cache.
+
+    Construction does no network requests and loads no index, so it is cheap to create on first use.
+    """
     _instance = None
+    _init_lock = threading.Lock()
     
     def __new__(cls):
         if cls._instance is None:
@@ -22,41 +485,228 @@ class VectorStore:
         return cls._instance
 
     def __init__(self):
-        if self.initialized:
-            return
-            
-        self.embeddings = OpenAIEmbeddings(model="text-embedding-3-large", api_key=settings.OPENAI_API_KEY, openai_api_base=settings.OPENAI_API_BASE)
-        self.index = faiss.IndexFlatL2(len(self.embeddings.embed_query("123")))
-        # Use absolute path in project root
-        self.store_path = str(Path(__file__).parent.parent.parent / "vector_store")
-        self._load_or_create_store()
-        self.initialized = True
+        # The warm-up thread and the first request may get here at the same time
+        with self._init_lock:
+            if self.initialized:
+                return
 
-    def _load_or_create_store(self):
-        if os.path.exists(self.store_path):
-            self.store = FAISS.load_local(self.store_path, self.embeddings, allow_dangerous_deserialization=True)
+            self.embeddings = create_embeddings()
+            self.batcher = EmbeddingBatcher(self.embeddings)
+            # Use absolute path in project root
+            self.store_path = settings.VECTOR_STORE_PATH or str(Path(__file__).parent.parent.parent / "vector_store")
+            self.read_only = settings.VECTOR_STORE_READ_ONLY
+            os.makedirs(self.store_path, exist_ok=True)
+            self.dimension = self._load_dimension()
+            model_dimension = embedding_dimension(self.embeddings)
+            if model_dimension is not None and model_dimension != self.dimension:
+                raise ValueError(
+                    f"The vector store at {self.store_path} holds {self.dimension}-dimensional vectors but the "
+                    f"embedding model returns {model_dimension}, re-embed the store or restore EMBEDDING_DIMENSIONS"
+                )
+            self.shards: OrderedDict[str, VectorShard] = OrderedDict()
+            self._shards_lock = threading.RLock()
+            # Shards in use by an insert or a search, never evicted until released
+            self._pins = defaultdict(int)
+            self.search_pool = ThreadPoolExecutor(max_workers=settings.VECTOR_STORE_SEARCH_WORKERS)
+            self.documents = DocumentCache(fetch_commit_documents)
+            if not self.read_only:
+                self._migrate_single_index()
+            self.initialized = True
+
+    def _load_dimension(self) -> int:
+        """The dimension the stored indexes were built with, or the embedding model's for a new store"""
+        meta_path = os.path.join(self.store_path, "store.json")
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                return json.load(f)["dimension"]
+        # Stores written before store.json existed
+        index_paths = [os.path.join(self.store_path, "index.faiss")] + [
+            os.path.join(self.store_path, entry, "index.faiss") for entry in sorted(os.listdir(self.store_path))
+        ]
+        existing = next((path for path in index_paths if os.path.exists(path)), None)
+        if existing:
+            dimension = faiss.read_index(existing, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY).d
         else:
-            self.store = FAISS(
-                self.embeddings,
-                index=self.index,
-                docstore=InMemoryDocstore(),
-                index_to_docstore_id={},
-            )
-            self.store.save_local(self.store_path)
+            dimension = embedding_dimension(self.embeddings) or len(self.embeddings.embed_query("dimension"))
+        if not self.read_only:
+            with open(meta_path, "w") as f:
+                json.dump({"dimension": dimension}, f)
+        return dimension
+
+    @staticmethod
+    def _shard_name(repo_id) -> str:
+        return "shared" if repo_id is None else f"repo-{repo_id}"
+
+    def _shard_names(self) -> list:
+        """Shards on disk, as a snapshot, a log or a snapshot left behind by an interrupted checkpoint"""
+        with self._shards_lock:
+            names = set(self.shards)
+        for entry in os.listdir(self.store_path):
+            name = entry.split(".")[0]
+            if name == "shared" or name.startswith("repo-"):
+                names.add(name)
+        return sorted(names)
+
+    def _shard(self, name: str) -> VectorShard:
+        with self._shards_lock:
+            if name in self.shards and not self.shards[name].is_stale():
+                self.shards.move_to_end(name)
+                return self.shards[name]
+            # New shards, and for read-only stores the latest snapshot a writer published
+            if self.shards.pop(name, None) is not None:
+                # The writer may have regenerated cached summaries as well
+                self.documents.clear()
+            shard = VectorShard(os.path.join(self.store_path, name), self.dimension, self.read_only)
+            self.shards[name] = shard
+            self._evict(keep=name)
+            return shard
+
+    def _evict(self, keep: str = None):
+        """Drop least recently used shards nobody is using, until at most VECTOR_STORE_MAX_LOADED_SHARDS are left"""
+        with self._shards_lock:
+            for name in list(self.shards):
+                if len(self.shards) <= settings.VECTOR_STORE_MAX_LOADED_SHARDS:
+                    break
+                if self._pins[name] or name == keep:
+                    continue
+                # Closed under the lock, so no second shard object opens the same log and snapshot meanwhile
+                self.shards.pop(name).close()
+
+    @contextmanager
+    def _pinned(self, name: str):
+        """The shard, kept loaded until the block ends"""
+        with self._shards_lock:
+            shard = self._shard(name)
+            self._pins[name] += 1
+        try:
+            yield shard
+        finally:
+            with self._shards_lock:
+                self._pins[name] -= 1
+                if not self._pins[name]:
+                    del self._pins[name]
+                self._evict()
+
+    def shard(self, repo_id) -> VectorShard:
+        """The repository's shard, not pinned: for single-threaded use such as tests and benchmarks"""
+        return self._shard(self._shard_name(repo_id))
+
+    def warm_up(self, repo_ids: list) -> int:
+        """Load the shards of the given repositories ahead of their first search"""
+        existing = set(self._shard_names())
+        names = [name for name in map(self._shard_name, repo_ids) if name in existing]
+        for name in names[:settings.VECTOR_STORE_MAX_LOADED_SHARDS]:
+            self._shard(name)
+        return len(names)
+
+    def _migrate_single_index(self):
+        """Split a store written before sharding (one index for all repositories) into shards"""
+        legacy_wal = WriteAheadLog(f"{self.store_path}.wal", fsync=False)
+        legacy_index = os.path.join(self.store_path, "index.faiss")
+        if not os.path.exists(legacy_index) and not os.path.exists(legacy_wal.path):
+            return
+        documents = {}
+        if os.path.exists(legacy_index):
+            index = faiss.read_index(legacy_index)
+            with open(os.path.join(self.store_path, "index.pkl"), "rb") as f:
+                docstore, index_to_docstore_id = pickle.load(f)
+            for position, doc_id in index_to_docstore_id.items():
+                documents[doc_id] = (index.reconstruct(position).tolist(), docstore.search(doc_id).metadata)
+        for record in legacy_wal.replay():
+            documents[record["id"]] = (decode_vector(record["vector"]), record["metadata"])
+
+        by_shard = defaultdict(list)
+        for vector, metadata in documents.values():
+            # Only commit summaries can be read back from commit_summaries
+            if "commit_id" in metadata:
+                by_shard[self._shard_name(metadata.get("repo_id"))].append((int(metadata["commit_id"]), vector))
+        for name, docs in by_shard.items():
+            with self._pinned(name) as shard:
+                shard.apply(*(list(column) for column in zip(*docs)))
+                shard.checkpoint()
+
+        for path in (legacy_index, os.path.join(self.store_path, "index.pkl"), legacy_wal.path):
+            if os.path.exists(path):
+                os.remove(path)
+        logger.info(f"Split the vector store into {len(by_shard)} shards")
+
+    def _apply(self, texts: list, vectors: list, metadatas: list):
+        # Regenerated summaries (e.g. after a PR summary update) replace the previous vector.
+        # The embeddings are computed first, so a failed request leaves the old vectors in place
+        # and each shard swaps them in under its lock.
+        by_shard = defaultdict(list)
+        for vector, metadata in zip(vectors, metadatas):
+            by_shard[self._shard_name(metadata.get("repo_id"))].append((int(metadata["commit_id"]), vector))
+        for name, docs in by_shard.items():
+            with self._pinned(name) as shard:
+                shard.apply(*(list(column) for column in zip(*docs)))
+        for text, metadata in zip(texts, metadatas):
+            self.documents.put(int(metadata["commit_id"]), Document(page_content=text, metadata=metadata))
 
     def add_summary(self, text: str, metadata: dict):
-        self.store.add_documents(
-            [Document(text, metadata=metadata)],
-        )
-        now = time.time()
-        self.store.save_local(self.store_path)
-        print(time.time() - now, "FAISS SAVED IN")
+        self.add_summaries([(text, metadata)])
+
+    def add_summaries(self, items: list):
+        """Add (text, metadata) pairs, embedded in as few requests as the provider limits allow"""
+        texts = [text for text, _ in items]
+        metadatas = [metadata for _, metadata in items]
+        self._check_writable(metadatas)
+        vectors = []
+        for start, end in split_batches(texts):
+            vectors.extend(self.embeddings.embed_documents(texts[start:end]))
+        self._apply(texts, vectors, metadatas)
+
+    def _check_writable(self, metadatas: list):
+        # Checked before embedding, so a read-only worker does not pay for vectors it cannot store
+        if self.read_only:
+            raise RuntimeError("The vector store is opened read-only")
+        if any("commit_id" not in metadata for metadata in metadatas):
+            raise ValueError("Vector store documents are commit summaries and need a commit_id")
+
+    async def aadd_summary(self, text: str, metadata: dict):
+        """Add one summary, sharing the embedding request with the other workers adding summaries"""
+        self._check_writable([metadata])
+        vector = await self.batcher.embed(text)
+        # The log fsync, a checkpoint or loading an evicted shard would otherwise stall the event loop
+        await asyncio.to_thread(self._apply, [text], [vector], [metadata])
+
+    def checkpoint(self):
+        with self._shards_lock:
+            for shard in self.shards.values():
+                shard.checkpoint()
+
+    def search(self, query: str, k: int = 5, filter: dict = None, ef_search: int = None, nprobe: int = None) -> list:
+        """
+        (commit_id, L2 distance) pairs of the closest summaries. The only supported filter is repo_id.
+        ef_search and nprobe trade recall for latency on HNSW and IVF-PQ shards, flat shards ignore them.
+        """
+        filter = dict(filter or {})
+        if "repo_id" in filter:
+            name = self._shard_name(filter.pop("repo_id"))
+            names = [name] if name in self._shard_names() else []
+        else:
+            names = self._shard_names()
+        if filter:
+            raise ValueError(f"Unsupported vector store filter: {', '.join(sorted(filter))}")
+        if not names:
+            return []
+        vector = self.embeddings.embed_query(query)
+        with ExitStack() as stack:
+            # Shards are loaded here, FAISS releases the GIL while the threads scan them
+            shards = [stack.enter_context(self._pinned(name)) for name in names]
+            results = list(self.search_pool.map(lambda shard: shard.search(vector, k, ef_search, nprobe), shards))
+        return heapq.nsmallest(k, itertools.chain.from_iterable(results), key=lambda r: r[1])
 
-    def search_similar(self, query: str, k: int = 5, filter: dict = None):
-        return self.store.similarity_search(query, k=k, filter=filter)
+    async def search_similar(self, query: str, k: int = 5, filter: dict = None, ef_search: int = None, nprobe: int = None):
+        """Documents of the closest summaries, see search"""
+        # Embedding the query, loading shards and scanning them all block, only the document lookup is async
+        hits = await asyncio.to_thread(self.search, query, k, filter, ef_search, nprobe)
+        documents = await self.documents.get_many([commit_id for commit_id, _ in hits])
+        # Commits whose summary was deleted since it was indexed are left out
+        return [documents[commit_id] for commit_id, _ in hits if commit_id in documents]
 
 
 if __name__ == "__main__":
     vs = VectorStore()
-    res = vs.store.similarity_search("Simplified code")
-    print(res)
\ No newline at end of file
+    res = asyncio.run(vs.search_similar("Simplified code"))
+    print(res)
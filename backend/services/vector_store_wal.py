@@ -0,0 +1,75 @@
+import base64
+import json
+import os
+from typing import Iterator, List
+import numpy as np
+from backend.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+def encode_vector(vector: List[float]) -> str:
+    return base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii")
+
+
+def decode_vector(encoded: str) -> List[float]:
+    return np.frombuffer(base64.b64decode(encoded), dtype=np.float32).tolist()
+
+
+class WriteAheadLog:
+    """
+    Append-only log of vector store upserts since the last checkpoint, one JSON record per line.
+    Replaying it on top of the last checkpoint restores the store after a crash.
+    """
+
+    def __init__(self, path: str, fsync: bool = True):
+        self.path = path
+        self.fsync = fsync
+        self.entries = 0
+        self._file = None
+
+    def append(self, records: List[dict]) -> None:
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write("".join(json.dumps(record) + "\n" for record in records))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+        self.entries += len(records)
+
+    def replay(self) -> Iterator[dict]:
+        if not os.path.exists(self.path):
+            return
+        valid_bytes = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("missing line end")
+                    record = json.loads(line)
+                except ValueError:
+                    # A crash in the middle of an append leaves a torn last line, cut it off
+                    # so that later appends start on a clean line
+                    logger.warning(f"Dropping incomplete record at the end of {self.path}")
+                    break
+                valid_bytes += len(line)
+                self.entries += 1
+                yield record
+        if valid_bytes < os.path.getsize(self.path):
+            os.truncate(self.path, valid_bytes)
+
+    def truncate(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        with open(self.path, "w", encoding="utf-8"):
+            pass
+        self.entries = 0
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __len__(self) -> int:
+        return self.entries
@@ -0,0 +1,7 @@
+import os
+
+# Settings are read at import time, provide dummy values so services can be imported offline
+os.environ.setdefault("GITHUB_TOKEN", "test-token")
+os.environ.setdefault("GEMINI_API_KEY", "test-key")
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
+os.environ.setdefault("OPENAI_API_BASE", "http://localhost")
@@ -0,0 +1,65 @@
+import pytest
+from backend.models.repository import Commit, CommitDiff, Repository
+from backend.services.commit_summarizer import LLMSummarizer, ModelBackend
+
+
+class RecordingBackend(ModelBackend):
+    def __init__(self):
+        self.calls = []
+
+    async def _generate_content(self, system_prompt: str, user_content: str) -> str:
+        self.calls.append((system_prompt, user_content))
+        return f"summary {len(self.calls)}"
+
+
+def make_summarizer(max_group_tokens: int) -> tuple[LLMSummarizer, RecordingBackend]:
+    summarizer = LLMSummarizer(max_group_tokens=max_group_tokens, backend="ollama")
+    backend = RecordingBackend()
+    summarizer.diff_backend = backend
+    summarizer.chunk_backend = backend
+    return summarizer, backend
+
+
+@pytest.mark.asyncio
+async def test_single_group_uses_one_call():
+    summarizer, backend = make_summarizer(max_group_tokens=8000)
+    diffs = [CommitDiff(file_path="a.py", diff_content="+a"), CommitDiff(file_path="b.py", diff_content="+b")]
+
+    await summarizer.summarize_commit(Commit(message="fix"), diffs, [], None, Repository(owner="o", name="r"))
+
+    assert len(backend.calls) == 1
+    assert "+a" in backend.calls[0][1] and "+b" in backend.calls[0][1]
+
+
+@pytest.mark.asyncio
+async def test_multiple_groups_use_map_reduce():
+    summarizer, backend = make_summarizer(max_group_tokens=2)
+    diffs = [CommitDiff(file_path="a.py", diff_content="+" * 8), CommitDiff(file_path="b.py", diff_content="-" * 8)]
+
+    await summarizer.summarize_commit(Commit(message="fix"), diffs, [], None, Repository(owner="o", name="r"))
+
+    assert len(backend.calls) == 3
+
+
+class ContextBackend(RecordingBackend):
+    supports_context = True
+
+    async def _generate_content(self, system_prompt: str, user_content: str, context: str = None) -> str:
+        self.calls.append((context, system_prompt))
+        return "summary"
+
+
+@pytest.mark.asyncio
+async def test_repository_block_is_sent_as_shared_context():
+    summarizer, _ = make_summarizer(max_group_tokens=2)
+    prefixed = RecordingBackend()
+    separate = ContextBackend()
+    summarizer.diff_backend, summarizer.chunk_backend = prefixed, separate
+    diffs = [CommitDiff(file_path="a.py", diff_content="+" * 8), CommitDiff(file_path="b.py", diff_content="-" * 8)]
+
+    await summarizer.summarize_commit(Commit(message="fix"), diffs, [], None, Repository(owner="o", name="r"))
+
+    # Backends without context support get it as the start of the system prompt
+    assert all(system_prompt.startswith("REPOSITORY CONTEXT:\nRepository name: o/r") for system_prompt, _ in prefixed.calls)
+    context, system_prompt = separate.calls[0]
+    assert context.startswith("REPOSITORY CONTEXT:") and "o/r" not in system_prompt
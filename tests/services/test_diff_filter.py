@@ -0,0 +1,61 @@
+import base64
+import os
+from backend.models.repository import CommitDiff
+from backend.services.diff_filter import DiffClassifier
+
+
+def make_diff(path: str, lines: list[str]) -> CommitDiff:
+    return CommitDiff(file_path=path, diff_content="@@ -0,0 +1 @@\n" + "\n".join(f"+{line}" for line in lines))
+
+
+def test_source_files_are_kept():
+    diff = make_diff("src/app.py", ["def main():", "    return 1"])
+
+    assert DiffClassifier(extra_patterns=[]).filter([diff]) == [diff]
+
+
+def test_generated_files_are_replaced_by_stub():
+    diffs = [
+        make_diff("frontend/package-lock.json", ["{"] * 3),
+        make_diff("api/service_pb2.py", ["x = 1"]),
+        make_diff("vendor/lib/a.go", ["package lib"]),
+        make_diff("static/app.js", ["var a=" + "1," * 400]),
+        make_diff("gen/models.go", ["// Code generated by sqlc. DO NOT EDIT.", "package gen"]),
+    ]
+
+    filtered = DiffClassifier(extra_patterns=[]).filter(diffs)
+
+    assert [d.diff_content for d in filtered] == [
+        "3 lines changed in generated file frontend/package-lock.json",
+        "1 lines changed in generated file api/service_pb2.py",
+        "1 lines changed in vendored file vendor/lib/a.go",
+        "1 lines changed in minified file static/app.js",
+        "2 lines changed in generated file gen/models.go",
+    ]
+
+
+def test_high_entropy_blobs_are_excluded():
+    blob = base64.b64encode(os.urandom(3000)).decode()
+    diff = make_diff("assets/data.txt", [blob[i:i + 76] for i in range(0, len(blob), 76)])
+
+    assert DiffClassifier(extra_patterns=[]).classify(diff).reason == "high-entropy"
+
+
+def test_gitattributes_overrides_heuristics():
+    gitattributes = "docs/api/** linguist-generated=true\n*.lock -linguist-generated\nlibs/** linguist-vendored\n"
+    classifier = DiffClassifier(gitattributes=gitattributes, extra_patterns=[])
+
+    assert classifier.classify(make_diff("docs/api/index.md", ["# API"])).reason == "linguist-generated"
+    assert classifier.classify(make_diff("libs/chart.py", ["x = 1"])).reason == "linguist-vendored"
+    assert not classifier.classify(make_diff("Cargo.lock", ["name = 'x'"])).excluded
+
+
+def test_long_lines_outside_scripts_and_stylesheets_are_kept():
+    paragraph = "A long Markdown paragraph that explains the change in a single line. " * 10
+    diffs = [
+        make_diff("README.md", [paragraph, "", "## Usage"]),
+        make_diff("src/query.py", ["import re", "PATTERN = re.compile(r'" + "[a-z]+|" * 100 + "')", "x = 1"]),
+        make_diff("src/app.js", ["const docs = '" + "x" * 600 + "';"] + ["const a = 1;"] * 10),
+    ]
+
+    assert not any(DiffClassifier(extra_patterns=[]).classify(diff).excluded for diff in diffs)
@@ -0,0 +1,82 @@
+import asyncio
+import pytest
+from backend.services.embeddings import EmbeddingBatcher, FakeEmbeddings, split_batches
+from backend.services.llm_resilience import RetryPolicy
+
+
+class FlakyEmbeddings(FakeEmbeddings):
+    def __init__(self, transient_failures: int = 0, poison: str = None):
+        super().__init__(dimension=8, latency=0)
+        self.transient_failures = transient_failures
+        self.poison = poison
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append(len(texts))
+        if self.transient_failures:
+            self.transient_failures -= 1
+            raise ConnectionError("connection reset")
+        if self.poison in texts:
+            raise ValueError("invalid input")
+        return super().embed_documents(texts)
+
+
+def make_batcher(embeddings, batch_size=100):
+    return EmbeddingBatcher(
+        embeddings, batch_size=batch_size, max_wait=0.01,
+        retry_policy=RetryPolicy(max_retries=2, base_delay=0, max_delay=0),
+    )
+
+
+def test_batches_respect_size_and_token_limits():
+    assert list(split_batches(["a"] * 5, batch_size=2, max_tokens=1000)) == [(0, 2), (2, 4), (4, 5)]
+    assert list(split_batches(["x" * 400, "x" * 400, "y"], batch_size=10, max_tokens=150)) == [(0, 1), (1, 3)]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_callers_share_requests():
+    embeddings = FlakyEmbeddings(transient_failures=1)
+    batcher = make_batcher(embeddings, batch_size=4)
+
+    vectors = await asyncio.gather(*(batcher.embed(f"summary {i}") for i in range(10)))
+
+    assert vectors[3] == embeddings.embed_query("summary 3")
+    # Three batches of at most four texts, the first one retried once
+    assert embeddings.batches[:4] == [4, 4, 4, 2]
+    assert batcher.requests == 4
+
+
+@pytest.mark.asyncio
+async def test_bad_input_only_fails_its_own_caller():
+    embeddings = FlakyEmbeddings(poison="bad")
+    batcher = make_batcher(embeddings)
+
+    results = await asyncio.gather(
+        *(batcher.embed(text) for text in ["a", "b", "bad", "c"]), return_exceptions=True
+    )
+
+    assert isinstance(results[2], ValueError)
+    assert all(isinstance(vector, list) for i, vector in enumerate(results) if i != 2)
+
+
+class UnavailableError(Exception):
+    status_code = 503
+
+
+class DownEmbeddings(FlakyEmbeddings):
+    def embed_documents(self, texts):
+        self.batches.append(len(texts))
+        raise UnavailableError("service unavailable")
+
+
+@pytest.mark.asyncio
+async def test_outages_fail_the_batch_without_splitting_it():
+    embeddings = DownEmbeddings()
+    batcher = make_batcher(embeddings)
+
+    results = await asyncio.gather(*(batcher.embed(f"summary {i}") for i in range(8)), return_exceptions=True)
+
+    assert all(isinstance(result, UnavailableError) for result in results)
+    # max_retries + 1 attempts of the whole batch
+    assert batcher.requests == 3
+    assert embeddings.batches == [8, 8, 8]
@@ -0,0 +1,60 @@
+import pytest
+from backend.config.settings import settings
+from backend.services import model_backends
+from backend.services.embeddings import FakeEmbeddings
+from backend.services.llm_resilience import ErrorKind, classify_error
+from backend.services.model_backends import FakeBackend, FakeBackendError, create_role_backend, create_summarizer_backends
+
+
+@pytest.mark.asyncio
+async def test_fake_backend_is_deterministic():
+    first = FakeBackend("fake-llm", latency=0, failure_rate=0)
+    second = FakeBackend("fake-llm", latency=0, failure_rate=0)
+
+    response = await first._generate_content("Summarize", "fix retry loop in parser")
+
+    assert response == await second._generate_content("Summarize", "fix retry loop in parser")
+    assert response != await second._generate_content("Summarize", "add cache")
+    assert first.count_tokens(response) >= first.output_tokens
+
+
+@pytest.mark.asyncio
+async def test_fake_backend_failures_are_retried_as_transient():
+    backend = FakeBackend("fake-llm", latency=0, failure_rate=1.0)
+
+    with pytest.raises(FakeBackendError) as exc_info:
+        await backend._generate_content("Summarize", "diff")
+    assert classify_error(exc_info.value) == ErrorKind.TRANSIENT
+
+
+def test_fake_provider_is_selectable():
+    assert isinstance(create_role_backend("diff", provider="fake"), FakeBackend)
+
+
+@pytest.mark.asyncio
+async def test_fake_provider_runs_in_batch_mode(monkeypatch, tmp_path):
+    monkeypatch.setattr(model_backends, "_batch_backends", {})
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "LLM_BATCH_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "LLM_BATCH_MAX_WAIT_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "LLM_BATCH_POLL_INTERVAL_SECONDS", 0)
+    monkeypatch.setattr(settings, "LLM_FAKE_LATENCY_SECONDS", 0)
+    monkeypatch.setattr(settings, "LLM_FAKE_FAILURE_RATE", 0)
+    diff_backend, _ = create_summarizer_backends("fake", batch=True)
+
+    response = await diff_backend.generate_content("Summarize", "fix retry loop in parser")
+
+    assert response == await FakeBackend(diff_backend.model_name)._generate_content("Summarize", "fix retry loop in parser")
+
+
+def test_fake_embeddings_are_normalized_and_similar_for_shared_words():
+    embeddings = FakeEmbeddings(dimension=64, latency=0)
+
+    query = embeddings.embed_query("retry parser timeout")
+    close, far = embeddings.embed_documents(["fix retry parser", "update docs"])
+
+    dot = lambda a, b: sum(x * y for x, y in zip(a, b))
+    assert len(query) == 64
+    assert dot(query, query) == pytest.approx(1.0)
+    assert dot(query, close) > dot(query, far)
+    assert embeddings.embed_query("retry parser timeout") == query
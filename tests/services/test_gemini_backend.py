@@ -0,0 +1,76 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+from backend.config.settings import settings
+from backend.services.llm_usage import call_cost, llm_usage, usage_target
+from backend.services.model_backends import GeminiBackend
+
+
+class FakeGeminiClient:
+    """Stands in for genai.Client, counting cache creations and the cache each request references"""
+
+    def __init__(self):
+        self.created = 0
+        self.cached_contents = []
+        self.aio = SimpleNamespace(
+            caches=SimpleNamespace(create=self.create_cache),
+            models=SimpleNamespace(generate_content=self.generate_content),
+        )
+
+    async def create_cache(self, model, config):
+        self.created += 1
+        await asyncio.sleep(0.01)
+        return SimpleNamespace(name=f"cachedContents/{self.created}")
+
+    async def generate_content(self, model, contents, config=None):
+        cached_content = config.cached_content if config else None
+        self.cached_contents.append(cached_content)
+        usage = SimpleNamespace(
+            prompt_token_count=1200, candidates_token_count=80, thoughts_token_count=None,
+            cached_content_token_count=1100 if cached_content else None,
+        )
+        return SimpleNamespace(text=f"summary of {contents}", usage_metadata=usage)
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    monkeypatch.setattr(GeminiBackend, "_context_caches", {})
+    monkeypatch.setattr(GeminiBackend, "_context_cache_jobs", {})
+    backend = GeminiBackend("gemini-2.0-flash")
+    backend.client = FakeGeminiClient()
+    return backend
+
+
+@pytest.mark.asyncio
+async def test_concurrent_calls_share_one_context_cache(gemini):
+    context = "repository context " * settings.LLM_GEMINI_CACHE_MIN_TOKENS
+
+    await asyncio.gather(*(gemini.generate_content("system", f"diff {i}", context=context) for i in range(5)))
+    await gemini.generate_content("system", "diff 5", context=context)
+
+    assert gemini.client.created == 1
+    assert gemini.client.cached_contents == ["cachedContents/1"] * 6
+
+
+@pytest.mark.asyncio
+async def test_small_contexts_are_sent_inline(gemini):
+    await gemini.generate_content("system", "diff", context="short context")
+
+    assert gemini.client.created == 0
+    assert gemini.client.cached_contents == [None]
+
+
+@pytest.mark.asyncio
+async def test_usage_is_recorded_from_the_response_metadata(gemini):
+    llm_usage._buffer.clear()
+    context = "repository context " * settings.LLM_GEMINI_CACHE_MIN_TOKENS
+
+    with usage_target("commit", 7) as target:
+        await gemini.generate_content("system", "diff", context=context)
+
+    call, = llm_usage._buffer
+    assert (call.prompt_tokens, call.completion_tokens, call.cached_tokens) == (1200, 80, 1100)
+    assert call.cost_usd == pytest.approx(call_cost("gemini-2.0-flash", 1200, 80, cached_tokens=1100))
+    assert call.cost_usd < call_cost("gemini-2.0-flash", 1200, 80)
+    assert target.tokens == 1280
+    llm_usage._buffer.clear()
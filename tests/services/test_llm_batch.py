@@ -0,0 +1,77 @@
+import asyncio
+import pytest
+from pathlib import Path
+from typing import Dict
+from backend.models.repository import Commit, CommitDiff, Repository
+from backend.services.commit_summarizer import LLMSummarizer
+from backend.services.llm_batch import BatchCollector, BatchProvider, BatchRequestError, read_batch_file
+from backend.services.model_backends import BatchBackend
+
+
+class FakeBatchProvider(BatchProvider):
+    """Completes every batch after two polls, echoing the prompt back"""
+
+    def __init__(self, fail_ids: set = None):
+        self.batches = {}
+        self.polls = {}
+        self.fail_ids = fail_ids or set()
+
+    async def submit(self, requests_path: Path, model_name: str) -> str:
+        batch_id = f"batch-{len(self.batches)}"
+        self.batches[batch_id] = read_batch_file(requests_path)
+        self.polls[batch_id] = 0
+        return batch_id
+
+    async def is_done(self, batch_id: str) -> bool:
+        self.polls[batch_id] += 1
+        return self.polls[batch_id] > 2
+
+    async def get_results(self, batch_id: str) -> Dict[str, str]:
+        return {
+            request.custom_id: f"summary of {request.user_content}"
+            for request in self.batches[batch_id]
+            if request.user_content not in self.fail_ids
+        }
+
+
+def make_collector(provider: BatchProvider, tmp_path, batch_size: int = 3) -> BatchCollector:
+    return BatchCollector(provider, "model", batch_size=batch_size, max_wait=0.01, poll_interval=0, batch_dir=str(tmp_path))
+
+
+@pytest.mark.asyncio
+async def test_prompts_are_collected_into_batches(tmp_path):
+    provider = FakeBatchProvider()
+    collector = make_collector(provider, tmp_path)
+
+    results = await asyncio.gather(*(collector.submit("system", f"diff {i}") for i in range(7)))
+
+    assert results == [f"summary of diff {i}" for i in range(7)]
+    assert [len(requests) for requests in provider.batches.values()] == [3, 3, 1]
+    assert len(list(tmp_path.glob("*.results.jsonl"))) == 3
+
+
+@pytest.mark.asyncio
+async def test_missing_results_fail_only_their_request(tmp_path):
+    collector = make_collector(FakeBatchProvider(fail_ids={"bad"}), tmp_path)
+
+    good, bad = await asyncio.gather(collector.submit("s", "good"), collector.submit("s", "bad"), return_exceptions=True)
+
+    assert good == "summary of good"
+    assert isinstance(bad, BatchRequestError)
+
+
+@pytest.mark.asyncio
+async def test_concurrent_commits_share_batches(tmp_path):
+    provider = FakeBatchProvider()
+    backend = BatchBackend("fake", "model", make_collector(provider, tmp_path, batch_size=100))
+
+    async def summarize(i: int) -> str:
+        summarizer = LLMSummarizer(backend="ollama")
+        summarizer.diff_backend = summarizer.chunk_backend = backend
+        diffs = [CommitDiff(file_path="a.py", diff_content=f"+change {i}")]
+        return await summarizer.summarize_commit(Commit(message="m"), diffs, [], None, Repository(owner="o", name="r"))
+
+    summaries = await asyncio.gather(*(summarize(i) for i in range(10)))
+
+    assert len(provider.batches) == 1
+    assert all(summary.startswith("summary of") for summary in summaries)
@@ -0,0 +1,61 @@
+import pytest
+from backend.services.llm_cache import LLMResponseCache
+from backend.services.model_backends import ModelBackend
+
+
+class CountingBackend(ModelBackend):
+    provider = "fake"
+    model_name = "fake-model"
+
+    def __init__(self, cache: LLMResponseCache):
+        self.cache = cache
+        self.calls = 0
+
+    async def _generate_content(self, system_prompt: str, user_content: str) -> str:
+        self.calls += 1
+        return f"{system_prompt}|{user_content}"
+
+
+@pytest.mark.asyncio
+async def test_identical_prompts_hit_cache(tmp_path):
+    cache = LLMResponseCache(path=str(tmp_path / "cache.sqlite3"), ttl_seconds=60, max_size_bytes=1024)
+    backend = CountingBackend(cache)
+
+    first = await backend.generate_content("system", "diff")
+    second = await backend.generate_content("system", "diff")
+    await backend.generate_content("system", "other diff")
+
+    assert first == second
+    assert backend.calls == 2
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+
+def test_evict_removes_least_recently_used(tmp_path):
+    cache = LLMResponseCache(path=str(tmp_path / "cache.sqlite3"), ttl_seconds=60, max_size_bytes=10)
+    cache.set("old", "x" * 6)
+    cache.set("new", "y" * 6)
+    cache.conn.execute("UPDATE llm_responses SET accessed_at = 0 WHERE key = 'old'")
+
+    assert cache.evict() == 1
+    assert cache.get("old") is None
+    assert cache.get("new") == "y" * 6
+
+
+def test_expired_entries_are_misses(tmp_path):
+    cache = LLMResponseCache(path=str(tmp_path / "cache.sqlite3"), ttl_seconds=60, max_size_bytes=1024)
+    cache.set("key", "value")
+    cache.conn.execute("UPDATE llm_responses SET created_at = 0")
+
+    assert cache.get("key") is None
+
+
+@pytest.mark.asyncio
+async def test_database_errors_do_not_fail_the_call(tmp_path):
+    cache = LLMResponseCache(path=str(tmp_path / "missing" / "cache.sqlite3"), ttl_seconds=60, max_size_bytes=1024)
+    backend = CountingBackend(cache)
+
+    assert await backend.generate_content("system", "diff") == "system|diff"
+    assert await backend.generate_content("system", "diff") == "system|diff"
+    assert backend.calls == 2
+    assert cache.misses == 2
@@ -0,0 +1,106 @@
+import asyncio
+import pytest
+from backend.services.llm_resilience import AdaptiveConcurrencyLimiter, ErrorKind, RetryPolicy, classify_error
+from backend.services.model_backends import ModelBackend
+
+
+class ProviderError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class ThrottlingBackend(ModelBackend):
+    """Fake provider that answers 429 whenever more than `capacity` requests are in flight"""
+    provider = "fake"
+    model_name = "throttled"
+
+    def __init__(self, capacity: int, limiter: AdaptiveConcurrencyLimiter):
+        self.capacity = capacity
+        self.limiter = limiter
+        self.retry_policy = RetryPolicy(max_retries=50, base_delay=0.001, max_delay=0.01)
+        self.in_flight = 0
+        self.throttled = 0
+
+    async def _generate_content(self, system_prompt: str, user_content: str) -> str:
+        self.in_flight += 1
+        try:
+            if self.in_flight > self.capacity:
+                self.throttled += 1
+                raise ProviderError(429)
+            await asyncio.sleep(0.002)
+            return user_content
+        finally:
+            self.in_flight -= 1
+
+
+class BadRequestBackend(ModelBackend):
+    provider = "fake"
+    model_name = "bad"
+
+    def __init__(self):
+        self.retry_policy = RetryPolicy(max_retries=3, base_delay=0.001, max_delay=0.01)
+        self.calls = 0
+
+    async def _generate_content(self, system_prompt: str, user_content: str) -> str:
+        self.calls += 1
+        raise ProviderError(400)
+
+
+def test_classify_error():
+    assert classify_error(ProviderError(429)) == ErrorKind.THROTTLED
+    assert classify_error(ProviderError(503)) == ErrorKind.TRANSIENT
+    assert classify_error(ProviderError(400)) == ErrorKind.PERMANENT
+    assert classify_error(Exception("429 RESOURCE_EXHAUSTED")) == ErrorKind.THROTTLED
+    assert classify_error(ConnectionError()) == ErrorKind.TRANSIENT
+
+
+@pytest.mark.asyncio
+async def test_limiter_backs_off_to_provider_capacity():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=16, max_limit=16)
+    backend = ThrottlingBackend(capacity=3, limiter=limiter)
+
+    results = await asyncio.gather(*(backend.generate_content("s", str(i)) for i in range(200)))
+
+    assert results == [str(i) for i in range(200)]
+    assert backend.throttled > 0
+    assert limiter.limit < 16
+    assert limiter.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_permanent_errors_are_not_retried():
+    backend = BadRequestBackend()
+
+    with pytest.raises(ProviderError):
+        await backend.generate_content("s", "u")
+    assert backend.calls == 1
+
+
+class HangingBackend(ModelBackend):
+    provider = "fake"
+    model_name = "hanging"
+
+    def __init__(self, limiter: AdaptiveConcurrencyLimiter):
+        self.limiter = limiter
+        self.started = asyncio.Event()
+
+    async def _generate_content(self, system_prompt: str, user_content: str) -> str:
+        self.started.set()
+        await asyncio.sleep(3600)
+
+
+@pytest.mark.asyncio
+async def test_cancelled_calls_release_their_slot():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_limit=1)
+    backend = HangingBackend(limiter)
+
+    task = asyncio.create_task(backend.generate_content("s", "u"))
+    await backend.started.wait()
+    assert limiter.in_flight == 1
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert limiter.in_flight == 0
+    assert limiter.limit == 1
@@ -0,0 +1,74 @@
+import pytest
+from backend.services.llm_cache import LLMResponseCache
+from backend.services.llm_resilience import RetryPolicy
+from backend.services.llm_usage import call_cost, llm_usage, usage_target
+from backend.services.model_backends import ModelBackend
+
+
+class PricedBackend(ModelBackend):
+    provider = "gemini"
+    model_name = "gemini-2.0-flash"
+
+    async def _generate_content(self, system_prompt: str, user_content: str) -> str:
+        return "a summary"
+
+
+class ProviderError(Exception):
+    def __init__(self, status_code: int):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+
+
+class FlakyBackend(PricedBackend):
+    """Answers after a rate limit and a server error"""
+
+    def __init__(self):
+        self.errors = [ProviderError(429), ProviderError(503)]
+        self.retry_policy = RetryPolicy(max_retries=2, base_delay=0.001, max_delay=0.001)
+
+    async def _generate_content(self, system_prompt: str, user_content: str) -> str:
+        if self.errors:
+            raise self.errors.pop(0)
+        return "a summary"
+
+
+@pytest.mark.asyncio
+async def test_calls_are_recorded_with_their_target(tmp_path):
+    llm_usage._buffer.clear()
+    backend = PricedBackend()
+    backend.cache = LLMResponseCache(path=str(tmp_path / "cache.sqlite3"), ttl_seconds=60, max_size_bytes=1024)
+
+    with usage_target("commit", 7, repository_id=3):
+        await backend.generate_content("system", "x" * 400)
+        await backend.generate_content("system", "x" * 400)
+    await backend.generate_content("system", "readme")
+
+    first, cached, untargeted = llm_usage._buffer
+    assert (first.target_type, first.target_id, first.repository_id) == ("commit", 7, 3)
+    assert first.prompt_tokens == 102 and first.completion_tokens == 3
+    assert first.cost_usd == pytest.approx(call_cost("gemini-2.0-flash", 102, 3))
+    assert cached.cache_hit and cached.cost_usd == 0.0
+    assert untargeted.target_type is None
+    llm_usage._buffer.clear()
+
+
+@pytest.mark.asyncio
+async def test_failed_attempts_are_recorded():
+    llm_usage._buffer.clear()
+
+    with usage_target("commit", 7) as target:
+        await FlakyBackend().generate_content("system", "x" * 400)
+
+    throttled, server_error, answered = llm_usage._buffer
+    assert throttled.failed and throttled.prompt_tokens == 0 and throttled.cost_usd == 0.0
+    # The server may have processed the prompt before failing
+    assert server_error.failed and server_error.prompt_tokens == 102 and server_error.cost_usd > 0
+    assert not answered.failed and answered.retries == 2
+    assert target.tokens == 102 + 102 + 3
+    assert (target.calls, target.prompt_tokens, target.completion_tokens) == (3, 204, 3)
+    llm_usage._buffer.clear()
+
+
+def test_unknown_models_are_free():
+    assert call_cost("deepseek-r1:8b", 1000, 1000) == 0.0
+    assert call_cost("gemini-2.0-flash", 1_000_000, 1_000_000) == pytest.approx(0.50)
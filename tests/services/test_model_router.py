@@ -0,0 +1,56 @@
+import pytest
+from backend.services.llm_resilience import BackendHealth
+from backend.services.model_backends import ModelBackend, Route, RoutedBackend
+
+
+class NamedBackend(ModelBackend):
+    def __init__(self, name: str, fail: bool = False):
+        self.provider = name
+        self.model_name = name
+        self.fail = fail
+        self.calls = 0
+
+    async def _generate_content(self, system_prompt: str, user_content: str) -> str:
+        self.calls += 1
+        if self.fail:
+            raise ConnectionError(f"{self.model_name} is down")
+        return self.model_name
+
+
+def make_router(local_fails: bool = False) -> tuple[RoutedBackend, BackendHealth]:
+    local_health = BackendHealth(failure_threshold=2, cooldown=60)
+    router = RoutedBackend([
+        Route(NamedBackend("local", fail=local_fails), max_tokens=100, health=local_health),
+        Route(NamedBackend("remote"), health=BackendHealth()),
+    ], latency_slo=10)
+    return router, local_health
+
+
+@pytest.mark.asyncio
+async def test_routes_by_prompt_size():
+    router, _ = make_router()
+
+    assert await router.generate_content("s", "small diff") == "local"
+    assert await router.generate_content("s", "x" * 1000) == "remote"
+
+
+@pytest.mark.asyncio
+async def test_fails_over_and_skips_a_down_backend():
+    router, local_health = make_router(local_fails=True)
+    local = router.routes[0].backend
+
+    assert await router.generate_content("s", "a") == "remote"
+    assert await router.generate_content("s", "b") == "remote"
+    assert not local_health.is_available()
+
+    # The circuit is open, so the local backend is only tried after the healthy ones
+    assert await router.generate_content("s", "c") == "remote"
+    assert local.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_slow_backend_is_deprioritized():
+    router, local_health = make_router()
+    local_health.record_success(latency=30)
+
+    assert await router.generate_content("s", "small diff") == "remote"
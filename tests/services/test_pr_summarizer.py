@@ -0,0 +1,100 @@
+import asyncio
+from datetime import datetime, timezone
+import pytest
+from backend.models.repository import Issue, IssueComment, PullRequestSummary, Repository
+from backend.services.model_backends import ModelBackend
+from backend.services.pr_summarizer import PullRequestDiscussionSummarizer
+from backend.services.summary_generator import is_new_comment
+
+
+class SlowBackend(ModelBackend):
+    def __init__(self):
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def _generate_content(self, system_prompt: str, user_content: str) -> str:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        self.calls.append(user_content)
+        return f"summary {len(self.calls)}"
+
+
+def make_summarizer(tree_reduce: bool) -> tuple[PullRequestDiscussionSummarizer, SlowBackend]:
+    summarizer = PullRequestDiscussionSummarizer(max_group_tokens=10, backend="ollama")
+    summarizer.tree_reduce_enabled = tree_reduce
+    summarizer.reduce_fan_in = 4
+    summarizer.max_concurrency = 3
+    backend = SlowBackend()
+    summarizer.content_backend = summarizer.final_backend = backend
+    return summarizer, backend
+
+
+def make_comments(count: int) -> list[IssueComment]:
+    return [IssueComment(author_login="dev", body="x" * 30) for _ in range(count)]
+
+
+@pytest.mark.asyncio
+async def test_tree_reduce_merges_groups_in_parallel():
+    summarizer, backend = make_summarizer(tree_reduce=True)
+
+    await summarizer.summarize_pull_request_discussion(
+        Issue(title="t", body="b"), make_comments(9), [], None, Repository(owner="o", name="r")
+    )
+
+    # 9 group summaries, 2 merges (4 + 4, the last group passes through), 1 final summary
+    assert len(backend.calls) == 12
+    assert sum(call.startswith("Merge these segment summaries") for call in backend.calls) == 2
+    assert backend.max_in_flight == 3
+
+
+@pytest.mark.asyncio
+async def test_sequential_mode_chains_groups():
+    summarizer, backend = make_summarizer(tree_reduce=False)
+
+    await summarizer.summarize_pull_request_discussion(
+        Issue(title="t", body="b"), make_comments(3), [], None, Repository(owner="o", name="r")
+    )
+
+    assert len(backend.calls) == 4
+    assert backend.max_in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_update_summarizes_only_new_comments():
+    summarizer, backend = make_summarizer(tree_reduce=True)
+
+    await summarizer.update_pull_request_discussion(
+        Issue(title="t", body="b"), "old summary", [IssueComment(author_login="dev", body="lgtm")],
+        [], None, Repository(owner="o", name="r")
+    )
+
+    assert backend.calls == ["Existing summary:\nold summary\n\nNew discussion:\ndev: lgtm"]
+
+
+@pytest.mark.asyncio
+async def test_update_in_sequential_mode_chains_new_groups():
+    summarizer, backend = make_summarizer(tree_reduce=False)
+
+    await summarizer.update_pull_request_discussion(
+        Issue(title="t", body="b"), "old summary", make_comments(3), [], None, Repository(owner="o", name="r")
+    )
+
+    # 3 chained group summaries, no merges, then the update
+    assert len(backend.calls) == 4
+    assert not any(call.startswith("Merge these segment summaries") for call in backend.calls)
+    assert backend.max_in_flight == 1
+    assert backend.calls[-1].startswith("Existing summary:\nold summary\n\nNew discussion:\nsummary 1\nsummary 2\nsummary 3")
+
+
+def test_summaries_without_last_comment_id_cover_older_comments():
+    updated_at = datetime(2024, 1, 2, tzinfo=timezone.utc)
+    old = IssueComment(id=5, created_at=datetime(2024, 1, 1, tzinfo=timezone.utc))
+    new = IssueComment(id=6, created_at=datetime(2024, 1, 3, tzinfo=timezone.utc))
+
+    # Summarized before last_comment_id existed
+    legacy = PullRequestSummary(last_comment_id=None, updated_at=updated_at)
+    assert [is_new_comment(legacy, c) for c in (old, new)] == [False, True]
+    assert [is_new_comment(PullRequestSummary(last_comment_id=5), c) for c in (old, new)] == [False, True]
@@ -0,0 +1,42 @@
+import pytest
+from backend.services.model_backends import ModelBackend
+from backend.services.readme_summarizer import ReadmeSummarizer
+
+
+class RecordingBackend(ModelBackend):
+    def __init__(self):
+        self.calls = []
+
+    async def _generate_content(self, system_prompt: str, user_content: str) -> str:
+        self.calls.append(user_content)
+        return f"<think>hmm</think>summary {len(self.calls)}"
+
+
+def make_summarizer(max_chunk_tokens: int) -> tuple[ReadmeSummarizer, RecordingBackend]:
+    summarizer = ReadmeSummarizer(max_chunk_tokens=max_chunk_tokens, backend="ollama")
+    summarizer.backend = RecordingBackend()
+    return summarizer, summarizer.backend
+
+
+@pytest.mark.asyncio
+async def test_small_readme_is_summarized_in_one_call():
+    summarizer, backend = make_summarizer(max_chunk_tokens=1000)
+
+    summary = await summarizer.summarize("# Project\nDoes things\n")
+
+    assert summary == "summary 1"
+    assert len(backend.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_large_readme_is_chunked_by_sections():
+    summarizer, backend = make_summarizer(max_chunk_tokens=20)
+    readme = "".join(f"## Section {i}\n{'text ' * 10}\n" for i in range(4))
+
+    chunks = summarizer.split_readme(readme)
+    await summarizer.summarize(readme)
+
+    assert len(chunks) == 4
+    assert all(chunk.startswith("## Section") for chunk in chunks)
+    assert len(backend.calls) == 5
+    assert backend.calls[-1].startswith("Combine these README analyses")
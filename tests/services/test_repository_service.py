@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta, timezone
+import pytest
+from backend.models.repository import Issue, Repository
+from backend.services import repository_service
+from backend.services.repository_service import RepositoryService
+
+START = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def comment(i: int) -> dict:
+    created = (START + timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    return {"body": f"comment {i}", "created_at": created, "updated_at": created, "user": {"login": "octocat"}}
+
+
+class FakeSession:
+    def __init__(self, stored_count: int, last_created_at: datetime):
+        self.row = (stored_count, last_created_at)
+
+    async def execute(self, statement):
+        row = self.row
+
+        class Result:
+            def one(self):
+                return row
+        return Result()
+
+
+@pytest.mark.asyncio
+async def test_new_comments_past_the_first_page_are_stored(monkeypatch):
+    comments = [comment(i) for i in range(250)]
+    requests = []
+
+    async def make_request(endpoint, method="GET", params=None):
+        requests.append(params)
+        since = datetime.fromisoformat(params["since"].rstrip("Z")).replace(tzinfo=timezone.utc)
+        matching = [c for c in comments if datetime.fromisoformat(c["updated_at"].rstrip("Z")).replace(tzinfo=timezone.utc) >= since]
+        start = (params["page"] - 1) * params["per_page"]
+        return matching[start:start + params["per_page"]]
+
+    saved = []
+
+    async def save_issue_comment(session, issue_comment):
+        saved.append(issue_comment.body)
+    monkeypatch.setattr(repository_service, "save_issue_comment", save_issue_comment)
+    service = RepositoryService()
+    monkeypatch.setattr(service.github, "_make_request", make_request)
+
+    # 40 comments stored, the issue now has 250
+    count = await service._process_new_comments(
+        FakeSession(40, START + timedelta(minutes=39)),
+        Issue(id=1, number=7), {"comments": 250}, Repository(owner="o", name="r"),
+    )
+
+    assert count == 210
+    assert saved[0] == "comment 40" and saved[-1] == "comment 249"
+    # Only comments from the last stored one on, two full pages and a short one
+    assert [params["page"] for params in requests] == [1, 2, 3]
+    assert requests[0]["since"] == "2024-01-01T00:39:00Z"
+
+
+@pytest.mark.asyncio
+async def test_deleted_gitattributes_are_cleared(monkeypatch):
+    updates = []
+
+    async def update_repository_attributes(session, repository_id, **kwargs):
+        updates.append(kwargs)
+    monkeypatch.setattr(repository_service, "update_repository_attributes", update_repository_attributes)
+    service = RepositoryService()
+
+    async def deleted(owner, repo, path):
+        return None
+    monkeypatch.setattr(service.github, "get_file_content", deleted)
+
+    await service._update_gitattributes(None, Repository(id=1, gitattributes_content="dist/* linguist-generated"))
+    await service._update_gitattributes(None, Repository(id=2, gitattributes_content=None))
+
+    assert updates == [{"gitattributes_content": None}]
@@ -0,0 +1,40 @@
+from datetime import datetime, timedelta, timezone
+from backend.services.summary_priority import (
+    LANE_DEFAULT, LANE_REQUESTED, PendingCommit, decayed_query_score, prioritize_commits
+)
+
+
+def pending(repository_id: int, count: int, start_id: int) -> list:
+    return [
+        PendingCommit(commit_id=start_id + rank, repository_id=repository_id, pr_id=None, pr_summarized=False, recency_rank=rank)
+        for rank in range(1, count + 1)
+    ]
+
+
+def test_busier_repository_gets_larger_share():
+    commits = pending(1, 10, 100) + pending(2, 10, 200)
+
+    picked = prioritize_commits(commits, {1: 4.0, 2: 1.0}, set(), limit=4)
+
+    assert [commit.repository_id for _, commit in picked] == [1, 1, 1, 2]
+    # Newest commits of each repository go first
+    assert [commit.commit_id for _, commit in picked][:3] == [101, 102, 103]
+
+
+def test_requested_repository_gets_its_own_lane():
+    commits = pending(1, 5, 100) + pending(2, 5, 200)
+
+    picked = prioritize_commits(commits, {}, {2}, limit=2, requested_limit=3, requested_window=3)
+
+    lanes = [(priority[0], commit.commit_id) for priority, commit in picked]
+    assert lanes == [
+        (LANE_REQUESTED, 201), (LANE_REQUESTED, 202), (LANE_REQUESTED, 203),
+        (LANE_DEFAULT, 101), (LANE_DEFAULT, 204),
+    ]
+
+
+def test_query_score_decays_by_half_life():
+    now = datetime.now(timezone.utc)
+
+    assert decayed_query_score(8.0, now - timedelta(hours=48), now) == 2.0
+    assert decayed_query_score(8.0, None, now) == 0.0
@@ -0,0 +1,42 @@
+import pytest
+from backend.services.summary_scheduler import SummaryJobScheduler
+
+
+def make_job(log: list, key, fail: bool = False):
+    async def run():
+        log.append(key)
+        if fail:
+            raise RuntimeError("LLM error")
+    return run
+
+
+@pytest.mark.asyncio
+async def test_jobs_run_after_their_dependencies():
+    log = []
+    scheduler = SummaryJobScheduler(max_concurrency=1)
+    scheduler.add_job(("commit", 1), make_job(log, ("commit", 1)), priority=(0,), depends_on=[("readme", 1), ("pr", 1)])
+    scheduler.add_job(("pr", 1), make_job(log, ("pr", 1)), priority=(1,), depends_on=[("readme", 1)])
+    scheduler.add_job(("readme", 1), make_job(log, ("readme", 1)), priority=(2,))
+    scheduler.add_job(("commit", 2), make_job(log, ("commit", 2)), priority=(3,), depends_on=[("pr", 99)])
+
+    result = await scheduler.run()
+
+    # ("pr", 99) is not pending so commit 2 is ready at once, but unblocked jobs with higher priority go first
+    assert log == [("readme", 1), ("pr", 1), ("commit", 1), ("commit", 2)]
+    assert result.completed == log
+
+
+@pytest.mark.asyncio
+async def test_failed_dependency_defers_dependents():
+    log = []
+    scheduler = SummaryJobScheduler(max_concurrency=2)
+    scheduler.add_job(("readme", 1), make_job(log, ("readme", 1), fail=True))
+    scheduler.add_job(("pr", 1), make_job(log, ("pr", 1)), depends_on=[("readme", 1)])
+    scheduler.add_job(("commit", 1), make_job(log, ("commit", 1)), depends_on=[("pr", 1)])
+    scheduler.add_job(("commit", 2), make_job(log, ("commit", 2)))
+
+    result = await scheduler.run()
+
+    assert result.failed == [("readme", 1)]
+    assert sorted(result.deferred) == [("commit", 1), ("pr", 1)]
+    assert result.completed == [("commit", 2)]
@@ -0,0 +1,136 @@
+import asyncio
+import pytest
+from backend.config.settings import settings
+from backend.services import summary_service as summary_service_module
+from backend.services.summary_generator import search_unsummarized_commits
+from backend.services.summary_service import SummaryService
+
+
+class FakeSession:
+    def __init__(self, rows=()):
+        self.rows = list(rows)
+        self.statements = []
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self, statement, params=None):
+        self.statements.append((str(statement), params))
+        rows = self.rows
+
+        class Result:
+            def all(self):
+                return rows
+        return Result()
+
+
+class SlowSummaries(SummaryService):
+    """Commit summaries that take `durations[commit_id]` seconds, negative ones fail. Records the commits summarized"""
+
+    def __init__(self, durations: dict):
+        super().__init__()
+        self.durations = durations
+        self.calls = []
+
+    async def _summarize_commit(self, commit_id, regenerate=False):
+        self.calls.append(commit_id)
+        await asyncio.sleep(self.durations[commit_id])
+        if self.durations[commit_id] < 0:
+            raise RuntimeError("LLM error")
+
+
+@pytest.fixture
+def matching_commits(monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_STORE_READ_ONLY", False)
+    monkeypatch.setattr(summary_service_module, "async_session", lambda: FakeSession())
+
+    def use(commit_ids):
+        async def search(session, repository_id, query, limit=3):
+            return commit_ids
+        monkeypatch.setattr(summary_service_module, "search_unsummarized_commits", search)
+    return use
+
+
+@pytest.mark.asyncio
+async def test_slow_summaries_continue_in_the_background(matching_commits):
+    matching_commits([1, 2])
+    service = SlowSummaries({1: 0, 2: 0.2})
+
+    assert await service.summarize_for_query(1, "parser", timeout=0.05) == 1
+    assert len(service._background_jobs) == 1
+
+    await asyncio.gather(*service._background_jobs)
+    assert service.calls == [1, 2]
+    assert not service._commit_jobs
+
+
+@pytest.mark.asyncio
+async def test_query_and_scheduler_share_a_commit_summary(matching_commits):
+    matching_commits([1, 2])
+    service = SlowSummaries({1: 0.05, 2: -1})
+
+    scheduled = asyncio.create_task(service._run_commit_job(1, 1))
+    await asyncio.sleep(0)
+    summarized = await service.summarize_for_query(1, "parser", timeout=1)
+    await scheduled
+
+    # Commit 1 was summarized once for both callers, commit 2 failed
+    assert service.calls == [1, 2]
+    assert summarized == 1
+
+
+@pytest.mark.asyncio
+async def test_unsummarized_commits_match_any_query_word():
+    session = FakeSession(rows=[(3,), (1,)])
+
+    assert await search_unsummarized_commits(session, 1, "fix the parser-cache!", limit=2) == [3, 1]
+    statement, params = session.statements[0]
+    assert "to_tsquery('english', :tsquery)" in statement
+    assert params == {"repository_id": 1, "tsquery": "fix | the | parser | cache", "limit": 2}
+
+    assert await search_unsummarized_commits(session, 1, "?!") == []
+    assert len(session.statements) == 1
+
+
+@pytest.mark.asyncio
+async def test_migration_runs_concurrently_within_the_token_budget(monkeypatch):
+    monkeypatch.setattr(settings, "summary_migration_daily_token_budget", 2500)
+    monkeypatch.setattr(settings, "summary_migration_per_run", 10)
+    monkeypatch.setattr(settings, "summary_max_concurrent_jobs", 2)
+    monkeypatch.setattr(settings, "LLM_BATCH_MODE", False)
+    monkeypatch.setattr(summary_service_module, "async_session", lambda: FakeSession())
+    monkeypatch.setattr(summary_service_module.llm_usage, "flush", lambda: asyncio.sleep(0))
+
+    async def spent(session, target_types, since):
+        return 0
+
+    async def outdated_commits(session, limit):
+        return [(commit_id, 1) for commit_id in range(1, 11)]
+
+    async def no_prs(session, limit):
+        return []
+    monkeypatch.setattr(summary_service_module, "get_tokens_spent", spent)
+    monkeypatch.setattr(summary_service_module, "get_outdated_commit_summaries", outdated_commits)
+    monkeypatch.setattr(summary_service_module, "get_outdated_pr_summaries", no_prs)
+
+    in_flight, max_in_flight, regenerated = 0, 0, []
+
+    async def summarize(commit_id, regenerate=False):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+        await asyncio.sleep(0.01)
+        summary_service_module.llm_usage.record("fake", "fake", 900, 100, 0.01)
+        in_flight -= 1
+        regenerated.append((commit_id, regenerate))
+    service = SummaryService()
+    monkeypatch.setattr(service, "_summarize_commit", summarize)
+    monkeypatch.setattr(summary_service_module.llm_usage, "_buffer", [])
+
+    # 1000 tokens per commit: two pairs fit into the budget, nothing starts once it is spent
+    assert await service.migrate_outdated_summaries() == 4
+    assert max_in_flight == 2
+    assert regenerated == [(1, True), (2, True), (3, True), (4, True)]
@@ -0,0 +1,23 @@
+from backend.config.settings import settings
+from backend.services import summary_versions
+from backend.services.summary_versions import commit_summary_version, pr_summary_version
+
+
+def test_versions_change_with_prompts_and_models(monkeypatch, tmp_path):
+    prompt, _ = commit_summary_version()
+    assert commit_summary_version()[0] == prompt
+    assert pr_summary_version()[0] != prompt
+
+    monkeypatch.setattr(settings, "LLM_USE", "gemini")
+    gemini_model = commit_summary_version()[1]
+    monkeypatch.setattr(settings, "LLM_GEMINI_DIFF_MODEL", "gemini-newer")
+    assert commit_summary_version()[1] != gemini_model
+
+    for name in summary_versions.COMMIT_PROMPTS:
+        (tmp_path / name).write_text("template")
+    monkeypatch.setattr(summary_versions, "PROMPTS_DIR", tmp_path)
+    summary_versions.prompt_version.cache_clear()
+    try:
+        assert commit_summary_version()[0] != prompt
+    finally:
+        summary_versions.prompt_version.cache_clear()
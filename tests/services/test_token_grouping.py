@@ -0,0 +1,50 @@
+from backend.models.repository import CommitDiff
+from backend.services.token_grouping import pack_diffs, pack_sequential, split_diff_at_hunks
+
+
+def chars(text: str) -> int:
+    return len(text)
+
+
+def test_pack_diffs_keeps_directories_together():
+    diffs = [
+        CommitDiff(file_path="api/a.py", diff_content="a" * 30),
+        CommitDiff(file_path="db/b.py", diff_content="b" * 40),
+        CommitDiff(file_path="api/c.py", diff_content="c" * 30),
+        CommitDiff(file_path="db/d.py", diff_content="d" * 40),
+    ]
+
+    groups = pack_diffs(diffs, max_tokens=100, tokenizer=chars)
+
+    assert [[d.file_path for d in group] for group in groups] == [["db/b.py", "db/d.py"], ["api/a.py", "api/c.py"]]
+
+
+def test_pack_diffs_first_fit_decreasing_fills_groups():
+    sizes = [50, 50, 30, 30, 20, 20]
+    diffs = [CommitDiff(file_path=f"f{i}/x.py", diff_content="x" * size) for i, size in enumerate(sizes)]
+
+    groups = pack_diffs(diffs, max_tokens=100, tokenizer=chars)
+
+    assert len(groups) == 2
+    assert all(sum(len(d.diff_content) for d in group) == 100 for group in groups)
+
+
+def test_oversized_diff_is_split_at_hunks():
+    hunk = "@@ -1,2 +1,2 @@\n" + "+line\n" * 5
+    diff = CommitDiff(file_path="big.py", diff_content=hunk * 4)
+
+    groups = pack_diffs([diff], max_tokens=len(hunk) * 2, tokenizer=chars)
+
+    assert len(groups) == 2
+    assert all(d.file_path == "big.py" for group in groups for d in group)
+    assert "".join(d.diff_content for group in groups for d in group) == hunk * 4
+
+
+def test_split_diff_at_hunks_falls_back_to_lines():
+    pieces = split_diff_at_hunks("@@ -1 +1 @@\n" + "+x\n" * 10, max_tokens=10, tokenizer=chars)
+
+    assert all(len(piece) <= 12 for piece in pieces)
+
+
+def test_pack_sequential_preserves_order():
+    assert pack_sequential(["a", "b", "c"], [6, 6, 3], max_tokens=10) == [["a"], ["b", "c"]]
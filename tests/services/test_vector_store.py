@@ -0,0 +1,262 @@
+import os
+import threading
+import pytest
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from backend.config.settings import settings
+from backend.services import vector_store as vector_store_module
+from backend.services.embeddings import FakeEmbeddings
+from backend.services.vector_index import index_encoding, index_type
+from backend.services.vector_store import VectorStore
+
+
+@pytest.fixture
+def commit_summaries(monkeypatch):
+    """Stands in for the commit_summaries table the vector store reads search results from"""
+    summaries = {}
+
+    async def fetch(commit_ids):
+        return {
+            commit_id: Document(page_content=summaries[commit_id], metadata={"commit_id": commit_id})
+            for commit_id in commit_ids if commit_id in summaries
+        }
+    monkeypatch.setattr(vector_store_module, "fetch_commit_documents", fetch)
+    return summaries
+
+
+@pytest.fixture
+def vector_store(monkeypatch, tmp_path, commit_summaries):
+    monkeypatch.setattr(settings, "LLM_USE", "fake")
+    monkeypatch.setattr(settings, "VECTOR_STORE_PATH", str(tmp_path / "vector_store"))
+    monkeypatch.setattr(VectorStore, "_instance", None)
+    return VectorStore()
+
+
+@pytest.mark.asyncio
+async def test_resummarized_commit_replaces_its_document(vector_store):
+    vector_store.add_summary("old parser summary", {"commit_id": 1, "repo_id": 1})
+    vector_store.add_summary("new cache summary", {"commit_id": 1, "repo_id": 1})
+
+    results = await vector_store.search_similar("summary", k=5, filter={"repo_id": 1})
+    assert [doc.page_content for doc in results] == ["new cache summary"]
+
+
+@pytest.mark.asyncio
+async def test_failed_embedding_keeps_the_old_document(vector_store, monkeypatch):
+    vector_store.add_summary("old parser summary", {"commit_id": 1, "repo_id": 1})
+
+    def fail(texts):
+        raise ConnectionError("embedding service down")
+    monkeypatch.setattr(vector_store.embeddings, "embed_documents", fail)
+    with pytest.raises(ConnectionError):
+        vector_store.add_summary("new summary", {"commit_id": 1, "repo_id": 1})
+
+    assert len(vector_store.shard(1)) == 1
+    assert (await vector_store.documents.get_many([1]))[1].page_content == "old parser summary"
+
+
+def reopen(monkeypatch) -> VectorStore:
+    """Simulate a restart: drop the in-memory store without a checkpoint"""
+    monkeypatch.setattr(VectorStore, "_instance", None)
+    return VectorStore()
+
+
+def test_inserts_are_recovered_from_the_log(vector_store, monkeypatch):
+    vector_store.add_summary("parser summary", {"commit_id": 1, "repo_id": 1})
+    vector_store.add_summary("cache summary", {"commit_id": 2, "repo_id": 1})
+    vector_store.add_summary("new parser summary", {"commit_id": 1, "repo_id": 1})
+    # A crash in the middle of the next append
+    with open(vector_store.shard(1).wal.path, "a") as f:
+        f.write('{"id": 3, "vec')
+
+    restored = reopen(monkeypatch)
+
+    assert sorted(restored.shard(1).ids.tolist()) == [1, 2]
+    assert restored.search("new parser summary", k=1, filter={"repo_id": 1})[0][0] == 1
+    restored.add_summary("retry summary", {"commit_id": 3, "repo_id": 1})
+    assert len(reopen(monkeypatch).shard(1)) == 3
+
+
+def test_checkpoint_writes_snapshot_and_truncates_log(vector_store, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_STORE_CHECKPOINT_EVERY", 2)
+    vector_store.add_summary("parser summary", {"commit_id": 1, "repo_id": 1})
+    assert len(vector_store.shard(1).wal) == 1
+
+    vector_store.add_summary("cache summary", {"commit_id": 2, "repo_id": 1})
+
+    assert len(vector_store.shard(1).wal) == 0
+    assert len(reopen(monkeypatch).shard(1)) == 2
+
+
+def test_search_only_touches_the_repository_shard(vector_store, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_STORE_MAX_LOADED_SHARDS", 2)
+    for repo_id in range(1, 4):
+        vector_store.add_summary(f"parser summary {repo_id}", {"commit_id": repo_id, "repo_id": repo_id})
+        vector_store.add_summary(f"unrelated docs {repo_id}", {"commit_id": 10 + repo_id, "repo_id": repo_id})
+    assert list(vector_store.shards) == ["repo-2", "repo-3"]
+
+    results = vector_store.search("parser summary", k=1, filter={"repo_id": 1})
+
+    assert [commit_id for commit_id, _ in results] == [1]
+    # The evicted shard was checkpointed and loaded back, repo 2 is now the least recently used
+    assert list(vector_store.shards) == ["repo-3", "repo-1"]
+    assert vector_store.search("parser", filter={"repo_id": 99}) == []
+
+
+def test_search_across_repositories_merges_shards(vector_store):
+    vector_store.add_summary("parser cache summary", {"commit_id": 1, "repo_id": 1})
+    vector_store.add_summary("unrelated docs", {"commit_id": 2, "repo_id": 1})
+    vector_store.add_summary("parser cache fix", {"commit_id": 3, "repo_id": 2})
+
+    results = vector_store.search("parser cache", k=2)
+
+    assert sorted(commit_id for commit_id, _ in results) == [1, 3]
+
+
+@pytest.mark.asyncio
+async def test_shard_switches_to_hnsw_and_drops_replaced_vectors(vector_store, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_STORE_HNSW_MIN_VECTORS", 20)
+    monkeypatch.setattr(settings, "VECTOR_STORE_REBUILD_MIN_DEAD", 5)
+    vector_store.add_summaries([
+        (f"summary {i} parser" if i == 7 else f"summary {i}", {"commit_id": i, "repo_id": 1}) for i in range(30)
+    ])
+    shard = vector_store.shard(1)
+    shard.wait_for_rebuild()
+    assert index_type(shard.index) == "hnsw"
+
+    vector_store.add_summaries([
+        (f"summary {i} v2 parser" if i == 7 else f"summary {i} v2", {"commit_id": i, "repo_id": 1}) for i in range(10)
+    ])
+    assert shard.index.ntotal == 40
+    shard.wait_for_rebuild()
+
+    assert shard.index.ntotal == len(shard) == 30
+    results = await vector_store.search_similar("parser", k=3, filter={"repo_id": 1}, ef_search=16)
+    assert results[0].page_content == "summary 7 v2 parser"
+    assert len(reopen(monkeypatch).shard(1)) == 30
+
+
+def test_float32_shards_keep_no_vector_copy(vector_store, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_STORE_HNSW_MIN_VECTORS", 20)
+    vector_store.add_summaries([(f"summary {i}", {"commit_id": i, "repo_id": 1}) for i in range(30)])
+    shard = vector_store.shard(1)
+    shard.wait_for_rebuild()
+    shard.checkpoint()
+
+    assert index_type(shard.index) == "hnsw" and shard.full_vectors is None
+    assert not [entry for entry in os.listdir(os.path.dirname(shard.path)) if ".vectors." in entry]
+
+
+def test_compact_encoding_reranks_with_vectors_on_disk(vector_store, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_STORE_ENCODING", "float16")
+    monkeypatch.setattr(settings, "VECTOR_STORE_HNSW_MIN_VECTORS", 20)
+    vector_store = reopen(monkeypatch)
+    vector_store.add_summaries([
+        (f"summary {i} parser" if i == 7 else f"summary {i}", {"commit_id": i, "repo_id": 1}) for i in range(30)
+    ])
+    shard = vector_store.shard(1)
+    shard.wait_for_rebuild()
+    assert index_encoding(shard.index) == "float16"
+    assert index_type(shard.index) == "hnsw"
+
+    shard.checkpoint()
+    files = os.listdir(os.path.dirname(shard.path))
+    assert "repo-1.vectors.1" in files and "repo-1.vectors.0" not in files
+
+    results = reopen(monkeypatch).shard(1).search(vector_store.embeddings.embed_query("summary 7 parser"), k=2)
+    assert results[0][0] == 7
+    assert results[0][1] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_opening_the_store_needs_no_embedding_request(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "LLM_USE", "fake")
+    monkeypatch.setattr(settings, "LLM_FAKE_EMBEDDING_DIM", 32)
+    monkeypatch.setattr(settings, "VECTOR_STORE_PATH", str(tmp_path / "vector_store"))
+    monkeypatch.setattr(VectorStore, "_instance", None)
+
+    def offline(self, text):
+        raise AssertionError("embedding request while opening the store")
+    monkeypatch.setattr(FakeEmbeddings, "embed_query", offline)
+    VectorStore().add_summary("parser summary", {"commit_id": 1, "repo_id": 1})
+    VectorStore().checkpoint()
+
+    assert reopen(monkeypatch).dimension == 32
+    assert not reopen(monkeypatch).shards
+
+
+def test_changed_embedding_dimension_fails_fast(vector_store, monkeypatch):
+    vector_store.add_summary("parser summary", {"commit_id": 1, "repo_id": 1})
+    vector_store.checkpoint()
+    monkeypatch.setattr(settings, "LLM_FAKE_EMBEDDING_DIM", vector_store.dimension * 2)
+
+    with pytest.raises(ValueError, match="re-embed"):
+        reopen(monkeypatch)
+
+
+@pytest.mark.asyncio
+async def test_read_only_workers_serve_published_snapshots(vector_store, monkeypatch, commit_summaries):
+    commit_summaries.update({1: "parser summary", 2: "cache summary"})
+    vector_store.add_summary("parser summary", {"commit_id": 1, "repo_id": 1})
+    vector_store.checkpoint()
+    vector_store.add_summary("cache summary", {"commit_id": 2, "repo_id": 1})
+    assert sorted(os.listdir(vector_store.shard(1).path)) == ["ids.npy", "index.faiss", "snapshot.json"]
+
+    monkeypatch.setattr(settings, "VECTOR_STORE_READ_ONLY", True)
+    reader = reopen(monkeypatch)
+    results = await reader.search_similar("summary", filter={"repo_id": 1})
+    assert [doc.page_content for doc in results] == ["parser summary"]
+    with pytest.raises(RuntimeError):
+        reader.add_summary("other summary", {"commit_id": 3, "repo_id": 1})
+
+    vector_store.checkpoint()
+    assert len(await reader.search_similar("summary", filter={"repo_id": 1})) == 2
+
+
+def test_pickled_docstore_snapshots_are_converted(monkeypatch, tmp_path, commit_summaries):
+    monkeypatch.setattr(settings, "LLM_USE", "fake")
+    monkeypatch.setattr(settings, "VECTOR_STORE_PATH", str(tmp_path / "vector_store"))
+    FAISS.from_texts(
+        ["parser summary", "cache summary"], FakeEmbeddings(),
+        metadatas=[{"commit_id": 1, "repo_id": 1}, {"commit_id": 2, "repo_id": 1}], ids=["commit-1", "commit-2"],
+    ).save_local(str(tmp_path / "vector_store" / "repo-1"))
+
+    vector_store = reopen(monkeypatch)
+    assert vector_store.search("cache summary", k=1, filter={"repo_id": 1})[0][0] == 2
+    vector_store.checkpoint()
+
+    assert sorted(os.listdir(vector_store.shard(1).path)) == ["ids.npy", "index.faiss", "snapshot.json"]
+    assert reopen(monkeypatch).shard(1).ids.tolist() == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_summaries_are_stored_off_the_event_loop(vector_store, monkeypatch):
+    threads = []
+    apply = vector_store._apply
+
+    def record_thread(*args):
+        threads.append(threading.get_ident())
+        apply(*args)
+    monkeypatch.setattr(vector_store, "_apply", record_thread)
+
+    await vector_store.aadd_summary("parser summary", {"commit_id": 1, "repo_id": 1})
+
+    assert threads and threads[0] != threading.get_ident()
+    assert len(vector_store.shard(1)) == 1
+
+
+def test_shards_in_use_are_not_evicted(vector_store, monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_STORE_MAX_LOADED_SHARDS", 1)
+    vector_store.add_summary("parser summary", {"commit_id": 1, "repo_id": 1})
+
+    with vector_store._pinned("repo-1") as shard:
+        vector_store.add_summary("cache summary", {"commit_id": 2, "repo_id": 2})
+        # Still the only object for repo-1, the insert into repo-2 could not evict it
+        assert vector_store.shards["repo-1"] is shard
+        shard.apply([3], [vector_store.embeddings.embed_query("lexer summary")])
+
+    # repo-2 was checkpointed and closed as soon as its insert was done
+    assert list(vector_store.shards) == ["repo-1"]
+    vector_store.checkpoint()
+    restored = reopen(monkeypatch)
+    assert sorted(restored.shard(1).ids.tolist()) == [1, 3]
+    assert restored.shard(2).ids.tolist() == [2]